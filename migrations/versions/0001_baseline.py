@@ -0,0 +1,97 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    Tables as created by init_db() before migrations existed. Databases that
+    already have them should be stamped instead: `alembic stamp 0001`.
+    """
+    op.create_table(
+        'users',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('occupation', sa.String(), nullable=True),
+        sa.Column('monthly_income', sa.Float(), nullable=True),
+        sa.Column('monthly_spending', sa.Float(), nullable=True),
+        sa.Column('savings', sa.Float(), nullable=True),
+        sa.Column('account_balance', sa.Float(), nullable=True),
+        sa.Column('loan_status', sa.String(), nullable=True),
+        sa.Column('credit_score', sa.Integer(), nullable=True),
+        sa.Column('transaction_count', sa.Integer(), nullable=True),
+        sa.Column('date_joined', sa.DateTime(), nullable=True),
+        sa.Column('spending_ratio', sa.Float(), nullable=True),
+        sa.Column('avg_transaction', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index('ix_users_user_id', 'users', ['user_id'], unique=False)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_table(
+        'recommendations',
+        sa.Column('rec_id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('request_type', sa.String(), nullable=True),
+        sa.Column('prompt', sa.Text(), nullable=True),
+        sa.Column('response', sa.Text(), nullable=True),
+        sa.Column('model', sa.String(), nullable=True),
+        sa.Column('note', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('rec_id'),
+    )
+    op.create_table(
+        'transactions',
+        sa.Column('transaction_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('date', sa.Date(), nullable=True),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('amount', sa.Float(), nullable=True),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('merchant', sa.String(), nullable=True),
+        sa.Column('location', sa.String(), nullable=True),
+        sa.Column('balance_after', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('transaction_id'),
+    )
+    op.create_table(
+        'loans',
+        sa.Column('loan_id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('loan_amount', sa.Float(), nullable=True),
+        sa.Column('interest_rate', sa.Float(), nullable=True),
+        sa.Column('tenure_months', sa.Integer(), nullable=True),
+        sa.Column('monthly_repayment', sa.Float(), nullable=True),
+        sa.Column('loan_status', sa.String(), nullable=True),
+        sa.Column('start_date', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('loan_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('loans')
+    op.drop_table('transactions')
+    op.drop_table('recommendations')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_users_user_id', table_name='users')
+    op.drop_table('users')
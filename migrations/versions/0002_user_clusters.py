@@ -0,0 +1,41 @@
+"""user_clusters table for cluster assignments
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_clusters',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('cluster_id', sa.Integer(), nullable=False),
+        sa.Column('distance', sa.Float(), nullable=True),
+        sa.Column('model_version', sa.String(), nullable=False),
+        sa.Column('scored_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index('ix_user_clusters_cluster_id', 'user_clusters', ['cluster_id'], unique=False)
+    # earlier runs wrote 'cluster:N' over the real loan status; those values are not loan data
+    op.execute("UPDATE users SET loan_status = NULL WHERE loan_status LIKE 'cluster:%'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_clusters_cluster_id', table_name='user_clusters')
+    op.drop_table('user_clusters')
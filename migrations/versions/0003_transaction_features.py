@@ -0,0 +1,60 @@
+"""user_transaction_features feature store and refresh watermark
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_transaction_features',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.Date(), nullable=False),
+        sa.Column('transaction_count', sa.Integer(), nullable=False),
+        sa.Column('avg_transaction', sa.Float(), nullable=True),
+        sa.Column('debit_total', sa.Float(), nullable=True),
+        sa.Column('credit_total', sa.Float(), nullable=True),
+        sa.Column('spend_30d', sa.Float(), nullable=True),
+        sa.Column('spend_90d', sa.Float(), nullable=True),
+        sa.Column('avg_daily_spend_30d', sa.Float(), nullable=True),
+        sa.Column('avg_daily_spend_90d', sa.Float(), nullable=True),
+        sa.Column('spend_volatility_90d', sa.Float(), nullable=True),
+        sa.Column('category_spend_90d', sa.Text(), nullable=True),
+        sa.Column('last_transaction_date', sa.Date(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_table(
+        'feature_refresh_state',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('watermark', sa.Date(), nullable=True),
+        sa.Column('as_of', sa.Date(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    # the refresh job selects by user and by date
+    op.create_index('ix_transactions_user_id', 'transactions', ['user_id'], unique=False)
+    op.create_index('ix_transactions_date', 'transactions', ['date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_date', table_name='transactions')
+    op.drop_index('ix_transactions_user_id', table_name='transactions')
+    op.drop_table('feature_refresh_state')
+    op.drop_table('user_transaction_features')
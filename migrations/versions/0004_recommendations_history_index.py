@@ -0,0 +1,30 @@
+"""composite index for per-user recommendation history
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_recommendations_user_id_created_at', 'recommendations',
+        ['user_id', 'created_at', 'rec_id'], unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_recommendations_user_id_created_at', table_name='recommendations')
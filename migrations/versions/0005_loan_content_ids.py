@@ -0,0 +1,33 @@
+"""64-bit loan ids (derived from a hash of the loan's content)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite's INTEGER PRIMARY KEY is already 64-bit
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column('loans', 'loan_id', existing_type=sa.Integer(), type_=sa.BigInteger(),
+                        existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column('loans', 'loan_id', existing_type=sa.BigInteger(), type_=sa.Integer(),
+                        existing_nullable=False)
@@ -0,0 +1,34 @@
+"""transactions.loaded_at as the feature refresh's high-water mark
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('transactions', sa.Column('loaded_at', sa.DateTime(), nullable=True))
+    # existing rows count as loaded now; the first refresh afterwards recomputes every user
+    op.execute(sa.text("UPDATE transactions SET loaded_at = CURRENT_TIMESTAMP"))
+    op.create_index('ix_transactions_loaded_at', 'transactions', ['loaded_at'], unique=False)
+    op.add_column('feature_refresh_state', sa.Column('loaded_through', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('feature_refresh_state', 'loaded_through')
+    op.drop_index('ix_transactions_loaded_at', table_name='transactions')
+    op.drop_column('transactions', 'loaded_at')
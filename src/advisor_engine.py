@@ -1,7 +1,13 @@
 # src/advisor_engine.py
-from dataclasses import dataclass
-from typing import Dict, Any
+from dataclasses import dataclass, replace
+from typing import Dict, Any, Optional
+import hashlib
 import json
+import math
+import os
+import re
+import string
+import textwrap
 
 
 # ============================================================
@@ -19,6 +25,14 @@ class UserProfile:
     credit_score: int
     active_loans: int
     financial_goals: str
+    monthly_loan_repayment: float = 0.0   # total repayment across active loans
+    cluster_id: Optional[int] = None      # behavioural cluster, when a model is loaded
+    cluster_distance: Optional[float] = None
+    # recent activity from the transaction feature store (None when not computed)
+    spend_30d: Optional[float] = None
+    spend_90d: Optional[float] = None
+    spend_volatility: Optional[float] = None
+    top_categories: str = ""
 
 
 # ============================================================
@@ -55,6 +69,13 @@ class RuleEngine:
             "credit_score": profile.credit_score,
             "goals": profile.financial_goals,
             "active_loans": profile.active_loans,
+            "loan_repayment": profile.monthly_loan_repayment,
+            "cluster_id": profile.cluster_id,
+            "cluster_distance": profile.cluster_distance,
+            "spend_30d": profile.spend_30d,
+            "spend_90d": profile.spend_90d,
+            "spend_volatility": profile.spend_volatility,
+            "top_categories": profile.top_categories,
         }
 
 
@@ -96,6 +117,7 @@ class PromptTemplates:
     - Monthly income: {monthly_income}
     - Spending: {monthly_spending}
     - Active loans: {active_loans}
+    - Monthly loan repayments: {monthly_loan_repayment}
     - Credit score: {credit_score}
     - Loan purpose: {loan_purpose}
 
@@ -116,6 +138,212 @@ class PromptTemplates:
     3. Suitable SME loan or credit line recommendation
     """
 
+    # Appended to any template when transaction features are available
+    ACTIVITY_TEMPLATE = """
+    Recent transaction activity:
+    - Spending, last 30 days: {spend_30d}
+    - Spending, last 90 days: {spend_90d}
+    - Daily spending volatility (90 days): {spend_volatility}
+    - Top spending categories: {top_categories}
+    """
+
+
+# ============================================================
+# PROMPT REGISTRY (PRECOMPILED TEMPLATES + TOKEN BUDGET)
+# ============================================================
+
+# Prompts longer than this (estimated) lose their lowest-priority sections; 0 disables
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4   # rough average for English text; good enough for budgeting
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer call)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def normalise_whitespace(text: str) -> str:
+    """Dedent, strip trailing spaces and collapse runs of blank lines."""
+    lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+class CompiledTemplate:
+    """A template parsed once into literal/field parts, with a content-derived version."""
+
+    def __init__(self, template_id: str, text: str, priority: int = 100):
+        self.id = template_id
+        self.text = normalise_whitespace(text)
+        self.version = hashlib.sha1(self.text.encode("utf-8")).hexdigest()[:8]
+        self.priority = priority
+        self.parts = [
+            (literal, field, spec, conversion)
+            for literal, field, spec, conversion in string.Formatter().parse(self.text)
+        ]
+        self.fields = {field for _, field, _, _ in self.parts if field}
+
+    def render(self, values: Dict[str, Any]) -> str:
+        out = []
+        for literal, field, spec, conversion in self.parts:
+            out.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            out.append(format(value, spec or ""))
+        return "".join(out)
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    """Prompt text plus the template it came from, for cache and metrics labels."""
+    text: str
+    template_id: str
+    template_version: str
+    tokens: int                 # estimate
+    trimmed: tuple = ()         # names of sections dropped to fit the budget
+
+    @property
+    def tag(self) -> str:
+        return f"{self.template_id}@{self.template_version}"
+
+
+class PromptRegistry:
+    """Compiled templates by id."""
+
+    def __init__(self):
+        self._templates: Dict[str, CompiledTemplate] = {}
+
+    def register(self, template_id: str, text: str, priority: int = 100) -> CompiledTemplate:
+        compiled = CompiledTemplate(template_id, text, priority)
+        self._templates[template_id] = compiled
+        return compiled
+
+    def get(self, template_id: str) -> CompiledTemplate:
+        return self._templates[template_id]
+
+    def versions(self) -> Dict[str, str]:
+        return {template_id: t.version for template_id, t in self._templates.items()}
+
+    @classmethod
+    def default(cls) -> "PromptRegistry":
+        registry = cls()
+        registry.register("savings", PromptTemplates.SAVINGS_TEMPLATE)
+        registry.register("investment", PromptTemplates.INVESTMENT_TEMPLATE)
+        registry.register("loan", PromptTemplates.LOAN_TEMPLATE)
+        registry.register("sme", PromptTemplates.SME_TEMPLATE)
+        # optional sections: lower priority is trimmed first
+        registry.register("activity", PromptTemplates.ACTIVITY_TEMPLATE, priority=10)
+        return registry
+
+
+# ============================================================
+# PROFILE BUCKETING (NEAR-DUPLICATE ADVICE REUSE)
+# ============================================================
+
+class ProfileBucketer:
+    """
+    Snaps the numeric fields of a UserProfile onto bucket centres so that
+    near-identical users render the same prompt and share cached advice.
+
+    Widths are given per field as either an absolute step ("credit_score=25")
+    or a relative one ("monthly_income=10%", geometric buckets). Fields that
+    are not listed are left as they are.
+    """
+
+    DEFAULT_SPEC = (
+        "monthly_income=10%,monthly_spending=10%,savings_balance=10%,"
+        "credit_score=25,active_loans=1,"
+        "spend_30d=10%,spend_90d=10%,spend_volatility=25%"
+    )
+
+    def __init__(self, widths: Dict[str, str]):
+        self.widths = {}
+        for field_name, width in widths.items():
+            width = str(width).strip()
+            if width.endswith("%"):
+                self.widths[field_name] = ("rel", 1 + float(width[:-1]) / 100)
+            else:
+                self.widths[field_name] = ("abs", float(width))
+
+    @classmethod
+    def from_spec(cls, spec: str = None) -> "ProfileBucketer":
+        """Parse a 'field=width,field=width' spec string."""
+        spec = spec or cls.DEFAULT_SPEC
+        pairs = (item.split("=", 1) for item in spec.split(",") if item.strip())
+        return cls({k.strip(): v for k, v in pairs})
+
+    def bucket_value(self, field_name: str, value):
+        """Return (bucket index, bucket centre) for one field value."""
+        kind, width = self.widths[field_name]
+        value = value or 0
+        if kind == "abs":
+            index = math.floor(value / width)
+            centre = index * width + (width / 2 if width > 1 else 0)
+        else:
+            if value <= 0:
+                return 0, 0
+            index = math.floor(math.log(value) / math.log(width))
+            centre = width ** (index + 0.5)
+            # keep centres readable: three significant figures
+            digits = max(0, int(math.floor(math.log10(centre))) - 2)
+            centre = round(centre, -digits)
+        if isinstance(value, int) or float(centre).is_integer():
+            # 336000 and 336000.0 must render the same prompt
+            centre = int(centre)
+        return index, centre
+
+    def bucket(self, profile: UserProfile):
+        """Return (bucketed profile, bucket vector) for a profile."""
+        values, vector = {}, []
+        for field_name in sorted(self.widths):
+            if getattr(profile, field_name) is None:
+                vector.append(None)
+                continue
+            index, centre = self.bucket_value(field_name, getattr(profile, field_name))
+            values[field_name] = centre
+            vector.append(index)
+        return replace(profile, **values), tuple(vector)
+
+
+_NUMBER_RE = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?")
+
+
+def personalise_response(text: str, bucketed: UserProfile, exact: UserProfile) -> str:
+    """
+    Write the user's exact figures back into advice generated for their bucket.
+    Only numbers that equal a bucket centre are replaced; derived amounts the
+    model computed itself are left untouched.
+    """
+    mapping = {}
+    ambiguous = set()
+    for field_name in ("monthly_income", "monthly_spending", "savings_balance", "credit_score"):
+        centre, actual = getattr(bucketed, field_name), getattr(exact, field_name)
+        if centre == actual:
+            continue
+        key = float(centre)
+        if key in mapping and mapping[key] != actual:
+            ambiguous.add(key)
+        mapping[key] = actual
+    for key in ambiguous:
+        del mapping[key]
+    if not mapping:
+        return text
+
+    def _swap(match):
+        token = match.group(0)
+        actual = mapping.get(float(token.replace(",", "")))
+        if actual is None:
+            return token
+        decimals = len(token.split(".")[1]) if "." in token else 0
+        formatted = f"{actual:,.{decimals}f}" if "," in token else f"{actual:.{decimals}f}"
+        return formatted
+
+    return _NUMBER_RE.sub(_swap, text)
+
 
 # ============================================================
 # MAIN ADVISORY ENGINE
@@ -124,58 +352,86 @@ class PromptTemplates:
 class AdvisorEngine:
     """Combines rule engine and templates to build dynamic LLM prompts."""
 
-    def __init__(self):
+    MAIN_TEMPLATES = ("savings", "investment", "loan", "sme")
+
+    def __init__(self, registry: PromptRegistry = None, token_budget: int = PROMPT_TOKEN_BUDGET):
         self.rules = RuleEngine()
-        self.templates = PromptTemplates()
+        self.registry = registry or PromptRegistry.default()
+        self.token_budget = token_budget
 
-    def create_prompt(self, profile: UserProfile, request_type: str = "auto") -> str:
-        """
-        Dynamically generate a prompt based on user profile and context.
-        request_type can be: 'savings', 'investment', 'loan', or 'auto'
-        """
+    def resolve_request_type(self, profile: UserProfile, request_type: str = "auto") -> str:
+        """Map 'auto' to a concrete template name based on the user's segment."""
+        if request_type != "auto":
+            return request_type
 
-        context = self.rules.generate_context(profile)
-        segment = context["user_segment"]
+        segment = self.rules.classify_user(profile)
 
         # AUTO-SELECTION logic
-        if request_type == "auto":
-            if segment == "low_income":
-                request_type = "savings"
-            elif segment == "mid_income":
-                request_type = "savings"
-            elif segment == "high_income":
-                request_type = "investment"
-            elif segment == "student":
-                request_type = "savings"
-            elif segment == "sme_owner":
-                request_type = "sme"
-
-        # Select the template
-        if request_type == "savings":
-            template = self.templates.SAVINGS_TEMPLATE
-        elif request_type == "investment":
-            template = self.templates.INVESTMENT_TEMPLATE
-        elif request_type == "loan":
-            template = self.templates.LOAN_TEMPLATE
-        elif request_type == "sme":
-            template = self.templates.SME_TEMPLATE
-        else:
+        if segment == "low_income":
+            return "savings"
+        elif segment == "mid_income":
+            return "savings"
+        elif segment == "high_income":
+            return "investment"
+        elif segment == "student":
+            return "savings"
+        elif segment == "sme_owner":
+            return "sme"
+        return request_type
+
+    def render(self, profile: UserProfile, request_type: str = "auto", sections: tuple = ()) -> RenderedPrompt:
+        """
+        Render the main template for the profile plus optional sections, each
+        a (name, text, priority) tuple. When the estimate exceeds the token
+        budget, optional sections are dropped lowest priority first; the
+        main template is never trimmed.
+        """
+        request_type = self.resolve_request_type(profile, request_type)
+        if request_type not in self.MAIN_TEMPLATES:
             raise ValueError(f"Unknown request_type: {request_type}")
+        template = self.registry.get(request_type)
 
-        # Format prompt
-        prompt = template.format(
-            monthly_income=profile.monthly_income,
-            monthly_spending=profile.monthly_spending,
-            savings_balance=profile.savings_balance,
-            savings_ratio=round(profile.savings_balance / profile.monthly_income, 2)
+        body = template.render({
+            "monthly_income": profile.monthly_income,
+            "monthly_spending": profile.monthly_spending,
+            "savings_balance": profile.savings_balance,
+            "savings_ratio": round(profile.savings_balance / profile.monthly_income, 2)
             if profile.monthly_income else 0,
-            financial_goals=profile.financial_goals,
-            credit_score=profile.credit_score,
-            active_loans=profile.active_loans,
-            loan_purpose="personal development"
-        )
+            "financial_goals": profile.financial_goals,
+            "credit_score": profile.credit_score,
+            "active_loans": profile.active_loans,
+            "monthly_loan_repayment": profile.monthly_loan_repayment,
+            "loan_purpose": "personal development",
+        })
+        optional = list(sections)
+        if profile.spend_90d is not None:
+            activity = self.registry.get("activity")
+            optional.append(("activity", activity.render({
+                "spend_30d": profile.spend_30d,
+                "spend_90d": profile.spend_90d,
+                "spend_volatility": profile.spend_volatility,
+                "top_categories": profile.top_categories or "n/a",
+            }), activity.priority))
+
+        # keep the caller's order in the prompt, trim by priority
+        kept = [section for section in optional if section[1]]
+        trimmed = []
+        text = "\n\n".join([body] + [section[1] for section in kept])
+        for section in sorted(kept, key=lambda item: item[2]):
+            if not self.token_budget or estimate_tokens(text) <= self.token_budget:
+                break
+            kept.remove(section)
+            trimmed.append(section[0])
+            text = "\n\n".join([body] + [item[1] for item in kept])
+
+        return RenderedPrompt(text, template.id, template.version, estimate_tokens(text), tuple(trimmed))
 
-        return prompt
+    def create_prompt(self, profile: UserProfile, request_type: str = "auto") -> str:
+        """
+        Dynamically generate a prompt based on user profile and context.
+        request_type can be: 'savings', 'investment', 'loan', or 'auto'
+        """
+        return self.render(profile, request_type).text
 
 
 # ============================================================
@@ -1,44 +1,32 @@
 # src/advisor_integration.py
 from src.db import SessionLocal
-from src.models import User, Loan
-from advisor_engine import AdvisorEngine, UserProfile
-from gemini_service import query_gemini
+from src.advisor_engine import UserProfile
+from src.ai_wrapper import advisor
+from src.llm_service import FALLBACK_RESPONSE, query_llm
+from src.resilience import LLMUnavailable
+from src.repository import get_profile_sync
 
 
 def fetch_user_profile(user_id: int) -> UserProfile:
-    session = SessionLocal()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if not user:
+    with SessionLocal() as session:
+        profile = get_profile_sync(session, user_id, "Improve financial stability")
+    if not profile:
         raise ValueError(f"User with ID {user_id} not found.")
-    
-    active_loans = session.query(Loan).filter(Loan.user_id == user_id).count()
-
-    profile = UserProfile(
-        user_id=user.user_id,
-        name=user.name,
-        user_type=user.user_type,
-        monthly_income=user.monthly_income,
-        monthly_spending=user.monthly_spending,
-        savings_balance=user.savings_balance,
-        credit_score=user.credit_score or 650,
-        active_loans=active_loans,
-        financial_goals=user.financial_goals or "Improve financial stability"
-    )
-
-    session.close()
     return profile
 
 
 def generate_user_advice(user_id: int, request_type: str = "auto"):
     profile = fetch_user_profile(user_id)
-    advisor = AdvisorEngine()
     prompt = advisor.create_prompt(profile, request_type=request_type)
 
     print(f"🧠 Generated advisory prompt for {profile.name}:\n")
     print(prompt)
 
-    print("\n💬 Generating Gemini Response...\n")
-    advice = query_gemini(prompt)
+    print("\n💬 Generating LLM Response...\n")
+    try:
+        advice = query_llm(prompt)
+    except LLMUnavailable:
+        advice = FALLBACK_RESPONSE
     print(f"💡 AI Advisor Recommendation:\n{advice}")
 
     return advice
@@ -1,25 +1,144 @@
-from .advisor_engine import AdvisorEngine, UserProfile
-from .gemini_service import query_gemini
+from .advisor_engine import (AdvisorEngine, UserProfile, ProfileBucketer, RenderedPrompt, CHARS_PER_TOKEN, estimate_tokens,
+                             personalise_response)
+from .llm_service import FALLBACK_RESPONSE, query_llm, query_llm_async, query_llm_stream
+from .resilience import LLM_ON_UNAVAILABLE, LLMUnavailable
+from . import metrics, profiling
+from dotenv import load_dotenv
 import html
 import os
+import time
+
+load_dotenv()
+
+# Near-duplicate reuse: render prompts from bucketed profiles so users with
+# almost the same numbers share one cached LLM answer.
+ADVICE_BUCKETING = os.getenv("ADVICE_BUCKETING", "0") == "1"
+bucketer = ProfileBucketer.from_spec(os.getenv("ADVICE_BUCKETS"))
+
+# One engine (and compiled template registry) shared by every request
+advisor = AdvisorEngine()
+TRANSACTIONS_PRIORITY = 50   # above the profile activity block (10)
 
 def sanitize_text_for_storage(text: str) -> str:
     # remove or mask sensitive items (NA example) — adapt as needed
     return text.replace("\n", " ").strip()
 
-def analyze_user(profile: UserProfile, transactions: list = None) -> dict:
-    engine = AdvisorEngine()
-    prompt = engine.create_prompt(profile, request_type="savings")  # or auto
-    # optionally append transaction summary
+def _render(profile: UserProfile, request_type: str, sections: tuple = ()):
+    """
+    Return (RenderedPrompt, prompt profile, stored prompt). In bucketing mode the
+    prompt is built from the bucket centres, so it depends only on the template,
+    bucket vector and goals, and the response cache serves every user in the
+    bucket. The stored prompt (Recommendation.prompt) is always rendered from
+    the real profile, matching the personalised advice the user receives.
+    """
+    started, prompt_profile = time.perf_counter(), profile
+    if ADVICE_BUCKETING:
+        # pick the template from the exact profile so bucketing never changes the segment
+        request_type = advisor.resolve_request_type(profile, request_type)
+        prompt_profile, _ = bucketer.bucket(profile)
+    rendered = advisor.render(prompt_profile, request_type, sections)
+    stored = rendered.text
+    if prompt_profile is not profile:
+        stored = advisor.render(profile, request_type, sections).text
+    metrics.set_template(rendered.tag)
+    profiling.record_prompt(rendered)
+    metrics.observe_stage("prompt_build", time.perf_counter() - started)
+    return rendered, prompt_profile, stored
+
+def _personalise(raw: str, prompt_profile: UserProfile, profile: UserProfile) -> str:
+    if prompt_profile is profile:
+        return raw
+    return personalise_response(raw, prompt_profile, profile)
+
+def _analysis_prompt(profile: UserProfile, transactions: list = None):
+    # optionally add a fixed-size transaction summary (trimmed after the activity block)
+    sections = ()
     if transactions:
-        tx_summary = f"\nRecent {len(transactions)} transactions. First sample: {transactions[:3]}"
-        prompt += tx_summary
+        from .transaction_summary import summarise_transactions   # pulls in pandas; only needed here
+        sections = (("transactions", summarise_transactions(transactions), TRANSACTIONS_PRIORITY),)
+    return _render(profile, "savings", sections)  # or auto
+
+def _result(rendered: RenderedPrompt, stored: str, raw: str, fallback: str = None) -> dict:
+    """fallback is the LLMUnavailable reason when raw is the canned FALLBACK_RESPONSE."""
+    return {"prompt": stored, "response": raw, "template": rendered.tag, "fallback": fallback}
+
+def _unavailable(e: LLMUnavailable):
+    # fail mode: let the API answer 503; fallback mode: canned answer, flagged
+    if LLM_ON_UNAVAILABLE == "fail":
+        raise e
+    return FALLBACK_RESPONSE, e.reason
+
+def _ask(rendered: RenderedPrompt, prompt_profile: UserProfile, profile: UserProfile):
+    try:
+        with metrics.stage("llm_call"):
+            raw = query_llm(rendered.text)
+    except LLMUnavailable as e:
+        metrics.observe_tokens(rendered.tokens)
+        return _unavailable(e)
+    metrics.observe_tokens(rendered.tokens, estimate_tokens(raw))
+    return _personalise(raw, prompt_profile, profile), None
 
-    raw = query_gemini(prompt)  # your gemini wrapper returns text
-    return {"prompt": prompt, "response": raw, "summary": raw[:1000]}
+async def _ask_async(rendered: RenderedPrompt, prompt_profile: UserProfile, profile: UserProfile):
+    try:
+        with metrics.stage("llm_call"):
+            raw = await query_llm_async(rendered.text)
+    except LLMUnavailable as e:
+        metrics.observe_tokens(rendered.tokens)
+        return _unavailable(e)
+    metrics.observe_tokens(rendered.tokens, estimate_tokens(raw))
+    return _personalise(raw, prompt_profile, profile), None
+
+def analyze_user(profile: UserProfile, transactions: list = None) -> dict:
+    rendered, prompt_profile, stored = _analysis_prompt(profile, transactions)
+    raw, fallback = _ask(rendered, prompt_profile, profile)  # the LLM wrapper returns text
+    return {**_result(rendered, stored, raw, fallback), "summary": raw[:1000]}
 
 def recommend_products(profile: UserProfile) -> dict:
-    engine = AdvisorEngine()
-    prompt = engine.create_prompt(profile, request_type="investment")
-    raw = query_gemini(prompt)
-    return {"prompt": prompt, "response": raw}
\ No newline at end of file
+    rendered, prompt_profile, stored = _render(profile, "investment")
+    return _result(rendered, stored, *_ask(rendered, prompt_profile, profile))
+
+async def analyze_user_async(profile: UserProfile, transactions: list = None) -> dict:
+    rendered, prompt_profile, stored = _analysis_prompt(profile, transactions)
+    raw, fallback = await _ask_async(rendered, prompt_profile, profile)
+    return {**_result(rendered, stored, raw, fallback), "summary": raw[:1000]}
+
+async def recommend_products_async(profile: UserProfile) -> dict:
+    rendered, prompt_profile, stored = _render(profile, "investment")
+    return _result(rendered, stored, *await _ask_async(rendered, prompt_profile, profile))
+
+async def _timed_stream(rendered: RenderedPrompt):
+    """query_llm_stream, recording the whole stream as the llm_call stage."""
+    started, length = time.perf_counter(), 0
+    try:
+        async for chunk in query_llm_stream(rendered.text):
+            length += len(chunk)
+            yield chunk
+    finally:
+        metrics.observe_stage("llm_call", time.perf_counter() - started)
+        metrics.observe_tokens(rendered.tokens, -(-length // CHARS_PER_TOKEN) if length else None)
+
+async def _personalise_stream(chunks, prompt_profile: UserProfile, profile: UserProfile):
+    if prompt_profile is profile:
+        async for chunk in chunks:
+            yield chunk
+        return
+    # hold back the trailing partial word so numbers split across chunks are swapped whole
+    tail = ""
+    async for chunk in chunks:
+        text = tail + chunk
+        cut = max(text.rfind(" "), text.rfind("\n")) + 1
+        ready, tail = text[:cut], text[cut:]
+        if ready:
+            yield personalise_response(ready, prompt_profile, profile)
+    if tail:
+        yield personalise_response(tail, prompt_profile, profile)
+
+def analyze_user_stream(profile: UserProfile, transactions: list = None):
+    """Return (prompt, async iterator of response text pieces)."""
+    rendered, prompt_profile, stored = _analysis_prompt(profile, transactions)
+    return stored, _personalise_stream(_timed_stream(rendered), prompt_profile, profile)
+
+def recommend_products_stream(profile: UserProfile):
+    """Return (prompt, async iterator of response text pieces)."""
+    rendered, prompt_profile, stored = _render(profile, "investment")
+    return stored, _personalise_stream(_timed_stream(rendered), prompt_profile, profile)
@@ -1,66 +1,232 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+# start timing before anything else is imported so startup can report the cold-start budget
+from .import_timing import import_timer
+import_timer.start()
+
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+import asyncio
+import json
+import os
 from .deps import get_db
-from .schemas import AnalyzeRequest, AnalyzeResponse, RecommendRequest, RecommendResponse
-from .ai_wrapper import analyze_user, recommend_products
-from .crud import save_recommendation
+from .schemas import AnalyzeRequest, AnalyzeResponse, RecommendRequest, RecommendResponse, BatchAdviceRequest
+from .ai_wrapper import analyze_user_async, recommend_products_async, analyze_user_stream, recommend_products_stream
+from .advisor_engine import UserProfile
+from .write_behind import recommendation_writer
 from .security import basic_auth
-from .models import User
+from .repository import get_profile, get_profiles
 from .main_routes import router as main_router
-from .db import init_db
+from .db import DB_MIGRATE_ON_STARTUP, init_db, check_schema, async_engine, pool_status
+from .llm_service import FALLBACK_RESPONSE, init_llm, model_name
+from .ml.scoring import load_scorer
+from .resilience import LLM_ON_UNAVAILABLE, LLM_BREAKER_RESET, LLMUnavailable
+from . import metrics, profiling
+
+load_dotenv()
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))    # max LLM calls in flight per batch
+BATCH_MAX_USERS = int(os.getenv("BATCH_MAX_USERS", "10000"))
 
 
 app = FastAPI(title="AI Advisor API")
+app.add_middleware(metrics.MetricsMiddleware)
+profiling.install(app, async_engine.sync_engine)
 
 @app.on_event("startup")
-def startup_event():
-    print(" Initializing database...")
-    init_db()
+async def startup_event():
+    # schema changes belong to `alembic upgrade head` at deploy time, not to every worker
+    if DB_MIGRATE_ON_STARTUP:
+        await run_in_threadpool(init_db)
+    else:
+        await check_schema()
+    await run_in_threadpool(load_scorer)
+    await init_llm()
+    recommendation_writer.start()
+    import_timer.stop()
+    import_timer.report()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await recommendation_writer.stop()
+    await async_engine.dispose()
+    profiling.shutdown()
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # a full pool is an overload signal, not a server bug: say so and let clients retry
+    print(f"⚠️ DB pool exhausted on {request.url.path}: {pool_status()}")
+    return JSONResponse(status_code=503, content={"detail": "Database busy, retry shortly"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailable):
+    # only reached with LLM_ON_UNAVAILABLE=fail; otherwise callers get a flagged fallback
+    retry_after = int(LLM_BREAKER_RESET) if exc.reason == "circuit_open" else 1
+    return JSONResponse(status_code=503, content={"detail": f"Advisor temporarily unavailable ({exc.reason})"},
+                        headers={"Retry-After": str(retry_after)})
 
 app.include_router(main_router)
+app.include_router(profiling.router)
 
-@app.post("/analyze", response_model=AnalyzeResponse, dependencies=[Depends(basic_auth)])
-def analyze(payload: AnalyzeRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.user_id == payload.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def _note(result: dict):
+    """Recommendation.note for a result: marks canned fallback answers."""
+    return f"fallback:{result['fallback']}" if result.get("fallback") else None
+
+
+async def _load_profile(db: AsyncSession, user_id: int, financial_goals: str):
+    with metrics.stage("profile_query"):
+        profile = await get_profile(db, user_id, financial_goals)
+    # hand the connection back to the pool before the caller waits on the LLM
+    await db.close()
+    return profile
+
+
+async def _queue_save(user_id: int, prompt: str, response: str, request_type: str, note: str = None):
+    with metrics.stage("save_enqueue"):
+        await recommendation_writer.submit(user_id, prompt, response, request_type, model_name(), note)
+
+
+async def _stream_batch(payload: BatchAdviceRequest, db: AsyncSession, generate, request_type: str, to_result):
+    """
+    Fan out LLM calls for a batch of users under a concurrency limit and
+    stream one NDJSON line per user as soon as it completes. Recommendations
+    go to the write-behind queue.
+    """
+    user_ids = list(dict.fromkeys(payload.user_ids))
+    if len(user_ids) > BATCH_MAX_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_USERS} user_ids per batch")
+    with metrics.stage("profile_query"):
+        profiles = await get_profiles(db, user_ids, "Improve savings" if request_type == "analyze" else "")
+    await db.close()
+    limit = min(payload.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run_one(profile: UserProfile):
+        async with semaphore:
+            try:
+                return profile, await generate(profile), None
+            except Exception as e:
+                return profile, None, e
+
+    async def lines():
+        for uid in user_ids:
+            if uid not in profiles:
+                yield json.dumps({"user_id": uid, "status": "not_found"}) + "\n"
+
+        tasks = [asyncio.ensure_future(run_one(p)) for p in profiles.values()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                profile, result, error = await finished
+                if error is not None:
+                    yield json.dumps({"user_id": profile.user_id, "status": "error", "detail": str(error)}) + "\n"
+                    continue
+                metrics.set_template(result["template"])
+                await _queue_save(profile.user_id, result["prompt"], result["response"], request_type, _note(result))
+                status = "fallback" if result.get("fallback") else "ok"
+                yield json.dumps({"user_id": profile.user_id, "status": status, **to_result(result)}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
 
-    from .advisor_engine import UserProfile
-    profile = UserProfile(
-        user_id=user.user_id,
-        name=user.name,
-        user_type=user.occupation or "salary_earner",
-        monthly_income=user.monthly_income or 0,
-        monthly_spending=user.monthly_spending or 0,
-        savings_balance=user.savings or 0,
-        credit_score=user.credit_score or 650,
-        active_loans=0,
-        financial_goals="Improve savings"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _sse_event(data: dict, event: str = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+def _stream_advice(user_id: int, prompt: str, chunks, request_type: str) -> StreamingResponse:
+    """
+    Forward response text to the client as server-sent events while it is
+    generated, then queue the complete response for saving once the stream ends.
+    """
+    async def events():
+        parts, note = [], None
+        try:
+            async for piece in chunks:
+                parts.append(piece)
+                yield _sse_event({"delta": piece})
+        except LLMUnavailable as e:
+            if parts:
+                note = f"truncated:{e.reason}"
+            elif LLM_ON_UNAVAILABLE == "fail":
+                yield _sse_event({"detail": f"Advisor temporarily unavailable ({e.reason})"}, event="error")
+                return
+            else:
+                note = f"fallback:{e.reason}"
+                parts.append(FALLBACK_RESPONSE)
+                yield _sse_event({"delta": FALLBACK_RESPONSE})
+        response = "".join(parts).strip()
+        await _queue_save(user_id, prompt, response, request_type, note)
+        yield _sse_event({"length": len(response), "note": note}, event="done")
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    result = analyze_user(profile)
-    save_recommendation(db, user.user_id, result["prompt"], result["response"], "analyze")
+
+@app.post("/analyze", response_model=AnalyzeResponse, dependencies=[Depends(basic_auth)])
+async def analyze(payload: AnalyzeRequest, db: AsyncSession = Depends(get_db)):
+    profile = await _load_profile(db, payload.user_id, "Improve savings")
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    result = await analyze_user_async(profile, payload.transactions)
+    await _queue_save(profile.user_id, result["prompt"], result["response"], "analyze", _note(result))
 
     return AnalyzeResponse(summary=result["summary"], recommendations=[result["response"][:500]])
 
 @app.post("/recommend", response_model=RecommendResponse, dependencies=[Depends(basic_auth)])
-def recommend(payload: RecommendRequest, db: Session = Depends(get_db)):
+async def recommend(payload: RecommendRequest, db: AsyncSession = Depends(get_db)):
     # build profile similar to above
-    if payload.user_id:
-        user = db.query(User).filter(User.user_id == payload.user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        from .advisor_engine import UserProfile
-        profile = UserProfile(
-            user_id=user.user_id, name=user.name, user_type=user.occupation or "salary_earner",
-            monthly_income=user.monthly_income or 0, monthly_spending=user.monthly_spending or 0,
-            savings_balance=user.savings or 0, credit_score=user.credit_score or 650,
-            active_loans=len(user.loans) if hasattr(user,'loans') else 0, financial_goals=""
-        )
-    else:
+    if not payload.user_id:
         raise HTTPException(status_code=400, detail="Provide user_id")
+    profile = await _load_profile(db, payload.user_id, "")
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    result = recommend_products(profile)
-    save_recommendation(db, user_id=profile.user_id, prompt=result["prompt"], response=result["response"], request_type="recommend", model="gemini")
+    result = await recommend_products_async(profile)
+    await _queue_save(profile.user_id, result["prompt"], result["response"], "recommend", _note(result))
     # parse free text into product suggestions is optional; return raw for MVP
-    return RecommendResponse(products=[{"name": "AI suggestion", "rationale": result["response"][:800]}])
\ No newline at end of file
+    return RecommendResponse(products=[{"name": "AI suggestion", "rationale": result["response"][:800]}])
+
+@app.post("/analyze/batch", dependencies=[Depends(basic_auth)])
+async def analyze_batch(payload: BatchAdviceRequest, db: AsyncSession = Depends(get_db)):
+    return await _stream_batch(
+        payload, db, analyze_user_async, "analyze",
+        lambda r: {"summary": r["summary"], "recommendations": [r["response"][:500]]},
+    )
+
+@app.post("/recommend/batch", dependencies=[Depends(basic_auth)])
+async def recommend_batch(payload: BatchAdviceRequest, db: AsyncSession = Depends(get_db)):
+    return await _stream_batch(
+        payload, db, recommend_products_async, "recommend",
+        lambda r: {"products": [{"name": "AI suggestion", "rationale": r["response"][:800]}]},
+    )
+
+@app.post("/analyze/stream", dependencies=[Depends(basic_auth)])
+async def analyze_stream(payload: AnalyzeRequest, db: AsyncSession = Depends(get_db)):
+    profile = await _load_profile(db, payload.user_id, "Improve savings")
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    prompt, chunks = analyze_user_stream(profile, payload.transactions)
+    return _stream_advice(profile.user_id, prompt, chunks, "analyze")
+
+@app.post("/recommend/stream", dependencies=[Depends(basic_auth)])
+async def recommend_stream(payload: RecommendRequest, db: AsyncSession = Depends(get_db)):
+    if not payload.user_id:
+        raise HTTPException(status_code=400, detail="Provide user_id")
+    profile = await _load_profile(db, payload.user_id, "")
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    prompt, chunks = recommend_products_stream(profile)
+    return _stream_advice(profile.user_id, prompt, chunks, "recommend")
@@ -1,7 +1,9 @@
-from sqlalchemy.orm import Session
+import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
 
-def create_user(db: Session, user: schemas.UserCreate):
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
     
     db_user = models.User(
         name=user.name,
@@ -9,14 +11,15 @@ def create_user(db: Session, user: schemas.UserCreate):
         occupation=user.occupation
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email).limit(1))
+    return result.scalars().first()
 
-def save_recommendation(db: Session, user_id: int, prompt: str, response: str, request_type: str = "analyze", model: str = "gemini"):
+async def save_recommendation(db: AsyncSession, user_id: int, prompt: str, response: str, request_type: str = "analyze", model: str = "gemini"):
     rec = models.Recommendation(
         user_id=user_id,
         prompt=prompt[:4000],
@@ -25,6 +28,26 @@ def save_recommendation(db: Session, user_id: int, prompt: str, response: str, r
         model=model
     )
     db.add(rec)
-    db.commit()
-    db.refresh(rec)
-    return rec
\ No newline at end of file
+    await db.commit()
+    await db.refresh(rec)
+    return rec
+
+async def save_recommendations_bulk(db: AsyncSession, rows: list):
+    """Insert many recommendations in one executemany round trip.
+    Each row is a dict with the save_recommendation arguments."""
+    if not rows:
+        return 0
+    await db.execute(insert(models.Recommendation), [
+        {
+            "user_id": r["user_id"],
+            "prompt": r["prompt"][:4000],
+            "response": r["response"][:8000],
+            "request_type": r.get("request_type", "analyze"),
+            "model": r.get("model", "gemini"),
+            "note": r.get("note"),
+            "created_at": r.get("created_at") or datetime.datetime.utcnow(),
+        }
+        for r in rows
+    ])
+    await db.commit()
+    return len(rows)
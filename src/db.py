@@ -1,6 +1,10 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-import sys, os
+import sys, os, re
+import threading
 from dotenv import load_dotenv
 
 # Ensure this folder is treated as a package
@@ -10,23 +14,243 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Connection pool settings (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))      # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))      # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# Schema is owned by Alembic (migrations/); workers only check the revision at startup
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "0") == "1"   # single-process dev only
+
+
+def async_database_url(url: str) -> str:
+    """
+    Map a sync DATABASE_URL onto its async driver: asyncpg for Postgres,
+    aiosqlite for SQLite. libpq-only query options are translated or dropped.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend in ("postgresql", "postgres"):
+        query = dict(parsed.query)
+        sslmode = query.pop("sslmode", None)
+        query.pop("channel_binding", None)
+        if sslmode and "ssl" not in query:
+            query["ssl"] = sslmode
+        parsed = parsed.set(drivername="postgresql+asyncpg", query=query)
+        return parsed.render_as_string(hide_password=False)
+    return url
+
+
+def _engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+
+# QueuePool's own default, in effect where _engine_options leaves it unset (SQLite)
+_DEFAULT_MAX_OVERFLOW = 10
+
+
+def _max_overflow(url) -> int:
+    return _engine_options(url).get("max_overflow", _DEFAULT_MAX_OVERFLOW)
+
+
+def _watch_pool(engine):
+    """Warn when every pooled connection is checked out, so exhaustion is visible."""
+    pool = engine.pool
+    if not hasattr(pool, "size"):
+        return
+    capacity = pool.size() + _max_overflow(engine.url)
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        if pool.checkedout() >= capacity:
+            print(f"⚠️ DB pool saturated: {pool.status()}")
+
+
+def _create_engines(url: str) -> dict:
+    if not url:
+        raise RuntimeError("DATABASE_URL is not set")
+    # Sync engine: scripts, migrations and offline jobs
+    engine = create_engine(url, **_engine_options(url))
+    # Async engine: request handlers
+    async_engine = create_async_engine(async_database_url(url), **_engine_options(url))
+    _watch_pool(async_engine.sync_engine)
+    return {
+        "engine": engine,
+        "SessionLocal": sessionmaker(bind=engine, autocommit=False, autoflush=False),
+        "async_engine": async_engine,
+        "AsyncSessionLocal": async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False,
+                                                expire_on_commit=False),
+    }
+
+
+# engine, SessionLocal, async_engine and AsyncSessionLocal are built from
+# DATABASE_URL on first use, so tools that only work on another database
+# (data_cleaner's target) can import models and init_db without it
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _get(name: str):
+    if name not in _engines:
+        with _engines_lock:
+            if not _engines:
+                _engines.update(_create_engines(DATABASE_URL))
+    return _engines[name]
+
+
+def __getattr__(name: str):
+    if name in ("engine", "SessionLocal", "async_engine", "AsyncSessionLocal"):
+        return _get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 Base = declarative_base()
 
 
-def init_db():
-    """Create all tables in the PostgreSQL database."""
-    # Import models from the same folder
-    from src.models import Base
-    print("🚀 Initializing database...")
-    Base.metadata.create_all(bind=engine)
-    print("✅ Tables created successfully.")
+def pool_status() -> dict:
+    """Current usage of the request-path connection pool."""
+    async_engine = _get("async_engine")
+    pool = async_engine.sync_engine.pool
+    if not hasattr(pool, "size"):
+        return {"status": pool.status()}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": _max_overflow(async_engine.url),
+    }
+
+
+def upsert_rows(conn, table, rows: list, key: str):
+    """
+    One executemany INSERT ... ON CONFLICT (key) DO UPDATE of every other
+    column in the rows. Works on Postgres and SQLite.
+    """
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={c: stmt.excluded[c] for c in rows[0] if c != key},
+    )
+    conn.execute(stmt, rows)
+
 
+def migration_head() -> str:
+    """
+    Head revision of migrations/versions, read from the files directly
+    (importing Alembic costs about as much as the rest of the app).
+    """
+    versions = os.path.join(MIGRATIONS_DIR, "versions")
+    revisions, parents = set(), set()
+    for name in os.listdir(versions):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(versions, name), "r", encoding="utf-8") as f:
+            source = f.read()
+        revision = re.search(r"^revision\b[^=]*=\s*['\"]([^'\"]+)", source, re.M)
+        down = re.search(r"^down_revision\b[^=]*=(.*)$", source, re.M)
+        if revision:
+            revisions.add(revision.group(1))
+        if down:
+            parents.update(re.findall(r"['\"]([^'\"]+)['\"]", down.group(1)))
+    return ",".join(sorted(revisions - parents))
 
-def get_db():
-    db = SessionLocal()
+
+async def check_schema() -> bool:
+    """Warn (instead of creating tables) when the database is not at the code's migration head."""
+    head = migration_head()
     try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+        async with _get("async_engine").connect() as conn:
+            current = (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalars().all()
+    except DBAPIError:
+        current = []
+    if ",".join(sorted(current)) == head:
+        print(f"✅ Database schema at revision {head}.")
+        return True
+    print(f"⚠️ Database schema is at {', '.join(current) or 'no revision'}, code expects {head}: "
+          f"run `alembic upgrade head`")
+    return False
+
+
+def _has_index(inspector, table: str, index: str) -> bool:
+    return index in {i["name"] for i in inspector.get_indexes(table)}
+
+
+def _has_column(inspector, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspector.get_columns(table)}
+
+
+def _has_bigint_loan_id(inspector) -> bool:
+    if inspector.bind.dialect.name == "sqlite":
+        return True     # INTEGER PRIMARY KEY is 64-bit there
+    column = next(c for c in inspector.get_columns("loans") if c["name"] == "loan_id")
+    return "BIGINT" in str(column["type"]).upper()
+
+
+# What each revision adds, newest last: tells how far a database built by
+# create_all() (tables but no alembic_version) already goes
+_REVISION_MARKERS = (
+    ("0001", lambda inspector, tables: "users" in tables),
+    ("0002", lambda inspector, tables: "user_clusters" in tables),
+    ("0003", lambda inspector, tables: "user_transaction_features" in tables),
+    ("0004", lambda inspector, tables: _has_index(inspector, "recommendations", "ix_recommendations_user_id_created_at")),
+    ("0005", lambda inspector, tables: _has_bigint_loan_id(inspector)),
+    ("0006", lambda inspector, tables: _has_column(inspector, "transactions", "loaded_at")),
+)
+
+
+def _unversioned_revision(conn) -> str:
+    """Latest revision whose tables, indexes and column types all exist, or None for an empty database."""
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    if "alembic_version" in tables:
+        return None
+    found = None
+    for revision, present in _REVISION_MARKERS:
+        if not present(inspector, tables):
+            break
+        found = revision
+    return found
+
+
+def init_db(bind=None):
+    """
+    Upgrade the schema of bind (default: DATABASE_URL) to the latest Alembic
+    revision. Databases created by create_all() are first stamped with the
+    revision their tables already match.
+    Used by scripts and DB_MIGRATE_ON_STARTUP; deployments run `alembic upgrade head`.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    # no ini file: env.py then leaves logging alone and migrates the connection passed here
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    print("🚀 Migrating database schema...")
+    with (bind or _get("engine")).begin() as conn:
+        config.attributes["connection"] = conn
+        revision = _unversioned_revision(conn)
+        if revision:
+            print(f"   existing tables without a revision: stamping {revision}")
+            command.stamp(config, revision)
+        command.upgrade(config, "head")
+    print("✅ Database schema up to date.")
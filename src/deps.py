@@ -1,10 +1,6 @@
-from .db import SessionLocal  # your existing db.py
-from fastapi import Depends
-from sqlalchemy.orm import Session
+from .db import AsyncSessionLocal  # your existing db.py
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Request-scoped async session; the one DB dependency every router uses."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,391 @@
+"""
+End-to-end load and latency benchmark for the advisor API.
+
+Seeds a local database with the vectorized synthetic generator, starts the
+FastAPI app in-process (startup/shutdown hooks included) against the fake
+LLM backend, and drives a weighted mix of requests at each concurrency level
+with a closed loop of workers: every worker sends its next request as soon
+as the previous one returns. For every level and endpoint the report has
+throughput, latency percentiles, status counts and the number of SQL
+statements each request ran. Statements run by background tasks (the
+write-behind flusher) are counted separately.
+
+The JSON report can be compared with a saved baseline; the run exits with
+status 1 when p99 latency, throughput or queries per request regress by more
+than the tolerance.
+
+Run with:
+    python -m src.dev.benchmark --users 2000 --concurrency 1,8,32 --duration 15 \
+        --mix analyze=5,recommend=4,register=1 --report bench.json [--baseline old.json]
+
+The default database is a SQLite file under --work-dir, re-seeded when its
+user count doesn't match --users. Configuration is passed to the app through
+environment variables, so src modules are imported only after they are set.
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BENCH_AUTH = (os.getenv("API_USER", "admin"), os.getenv("API_PASS", "changeme"))
+SEED_CHUNK_USERS = 25_000
+PERCENTILES = (50, 90, 95, 99)
+
+# SQL statements issued while handling the current request ([count]), None outside requests
+_request_queries = contextvars.ContextVar("benchmark_request_queries", default=None)
+
+
+# ---------------------------------------------------------------
+# Workload
+# ---------------------------------------------------------------
+def _analyze(rng, ctx):
+    return "POST", "/analyze", {"json": {"user_id": rng.randint(1, ctx["users"])}, "auth": BENCH_AUTH}
+
+
+def _recommend(rng, ctx):
+    return "POST", "/recommend", {"json": {"user_id": rng.randint(1, ctx["users"])}, "auth": BENCH_AUTH}
+
+
+def _register(rng, ctx):
+    ctx["registered"] += 1
+    email = f"bench-{ctx['run_id']}-{ctx['registered']}@example.com"
+    return "POST", "/register", {"json": {"name": "Bench User", "email": email, "occupation": "student"}}
+
+
+def _cluster(rng, ctx):
+    return "GET", f"/user/{rng.randint(1, ctx['users'])}/cluster", {"auth": BENCH_AUTH}
+
+
+def _history(rng, ctx):
+    return "GET", f"/user/{rng.randint(1, ctx['users'])}/recommendations", {"params": {"limit": 20}, "auth": BENCH_AUTH}
+
+
+ENDPOINTS = {
+    "analyze": _analyze,
+    "recommend": _recommend,
+    "register": _register,
+    "cluster": _cluster,
+    "history": _history,
+}
+
+
+def parse_mix(spec: str) -> dict:
+    """'analyze=5,recommend=4' -> {'analyze': 5.0, 'recommend': 4.0}"""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# ---------------------------------------------------------------
+# Database
+# ---------------------------------------------------------------
+def seed_database(users: int, transactions_per_user: int, seed: int, reseed: bool = False):
+    """Generate and load the synthetic dataset unless the database already has exactly `users` users."""
+    from sqlalchemy import func, select, text
+    from ..db import engine, init_db
+    from ..feature_store import refresh_features
+    from ..models import Base, Loan, Transaction, User
+    from .generate_data import (
+        build_pools, generate_loans_vectorized, generate_transactions_vectorized, generate_users_vectorized,
+    )
+    from .load_data import load_table
+
+    init_db()
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(User)).scalar()
+    if existing == users and not reseed:
+        print(f"♻️ Reusing benchmark database ({existing:,} users)")
+        return
+
+    print(f"🌱 Seeding {users:,} users x {transactions_per_user} transactions...")
+    started = time.perf_counter()
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    init_db()
+    as_of, pools, loans = datetime.date.today(), build_pools(seed), []
+
+    def parts():
+        for part, first in enumerate(range(0, users, SEED_CHUNK_USERS)):
+            rng = np.random.default_rng([seed, part])
+            chunk = generate_users_vectorized(rng, first + 1, min(SEED_CHUNK_USERS, users - first), pools, as_of)
+            yield chunk, generate_transactions_vectorized(rng, chunk, transactions_per_user, pools, as_of)
+            loans.append(generate_loans_vectorized(rng, chunk, as_of))
+
+    for user_df, tx_df in parts():
+        load_table(User.__table__, None, "user_id", chunks=[user_df])
+        load_table(Transaction.__table__, None, "transaction_id", chunks=[tx_df])
+    # loans go last: generate_loans_vectorized runs as parts() is consumed
+    load_table(Loan.__table__, None, "loan_id", chunks=loans)
+    refresh_features(full=True)
+    print(f"✅ Benchmark database seeded in {time.perf_counter() - started:.1f}s")
+
+
+def ensure_scoring_artifacts():
+    """The API no longer exports them at startup; do it here so /cluster is measured, not 503."""
+    from ..ml.scoring import ClusterScorer
+    if ClusterScorer.load() is not None:
+        return
+    from ..ml.cluster import load_model_and_scaler, run_export_scoring
+    if load_model_and_scaler()[0] is None:
+        print("⚠️ No trained cluster model: /user/{id}/cluster will answer 503")
+        return
+    run_export_scoring()
+
+
+def install_query_counter(engine, background: list):
+    """Count every statement against the current request, or against `background` outside one."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        box = _request_queries.get()
+        (box if box is not None else background)[0] += 1
+
+
+# ---------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------
+async def run_level(client, mix: dict, ctx: dict, concurrency: int, duration: float, warmup: float, seed: int) -> list:
+    """Closed-loop workers for warmup + duration seconds; returns (endpoint, status, seconds, queries) samples."""
+    names, weights = list(mix), list(mix.values())
+    loop = asyncio.get_running_loop()
+    record_from = loop.time() + warmup
+    stop_at = record_from + duration
+    samples = []
+
+    async def worker(index: int):
+        rng = random.Random(seed * 1_000_003 + concurrency * 1_009 + index)
+        while loop.time() < stop_at:
+            name = rng.choices(names, weights)[0]
+            method, path, kwargs = ENDPOINTS[name](rng, ctx)
+            box = [0]
+            token = _request_queries.set(box)
+            began = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                status = response.status_code
+            except Exception as e:
+                print(f"⚠️ {name} request failed: {e}")
+                status = 0
+            finally:
+                _request_queries.reset(token)
+            elapsed = time.perf_counter() - began
+            if loop.time() >= record_from:
+                samples.append((name, status, elapsed, box[0]))
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples
+
+
+def summarise(samples: list, duration: float) -> dict:
+    """Throughput, latency percentiles (ms), status counts and queries per request."""
+    if not samples:
+        return {"requests": 0}
+    latency = np.array([s[2] for s in samples]) * 1000
+    queries = np.array([s[3] for s in samples])
+    statuses = {}
+    for s in samples:
+        statuses[str(s[1])] = statuses.get(str(s[1]), 0) + 1
+    errors = sum(count for code, count in statuses.items() if code == "0" or code.startswith("5"))
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / duration, 2),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4),
+        "status": statuses,
+        "latency_ms": {
+            "mean": round(float(latency.mean()), 2),
+            **{f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(latency, PERCENTILES))},
+            "max": round(float(latency.max()), 2),
+        },
+        "queries_per_request": {"mean": round(float(queries.mean()), 2), "max": int(queries.max())},
+    }
+
+
+async def run_benchmark(args) -> dict:
+    import httpx
+    from ..app import app
+    from ..db import async_engine
+    from ..llm_service import get_backend
+
+    background = [0]
+    install_query_counter(async_engine.sync_engine, background)
+    ctx = {"users": args.users, "registered": 0, "run_id": f"{int(time.time())}-{os.getpid()}"}
+    backend = get_backend()
+    levels = []
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.request_timeout) as client:
+            for concurrency in args.concurrency:
+                print(f"🏃 concurrency={concurrency} for {args.duration:g}s (+{args.warmup:g}s warm-up)...")
+                background[0] = 0
+                samples = await run_level(client, args.mix, ctx, concurrency, args.duration, args.warmup, args.seed)
+                level = {
+                    "concurrency": concurrency,
+                    "overall": summarise(samples, args.duration),
+                    "endpoints": {
+                        name: summarise([s for s in samples if s[0] == name], args.duration) for name in args.mix
+                    },
+                    "background_queries": background[0],
+                }
+                levels.append(level)
+                print_level(level)
+    finally:
+        await app.router.shutdown()
+
+    return {
+        "meta": {
+            "started_at": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"].split("://")[0],
+            "dataset": {"users": args.users, "transactions_per_user": args.transactions_per_user, "seed": args.seed},
+            "llm": {"backend": backend.name, "model": backend.model_name,
+                    "latency": os.getenv("FAKE_LLM_LATENCY"), "token_rate": os.getenv("FAKE_LLM_TOKEN_RATE"),
+                    "error_rate": os.getenv("FAKE_LLM_ERROR_RATE"),
+                    "cache": os.getenv("LLM_CACHE_ENABLED")},
+            "mix": args.mix,
+            "duration": args.duration,
+            "warmup": args.warmup,
+        },
+        "levels": levels,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(level: dict):
+    print(f"   {'endpoint':<10} {'req':>7} {'rps':>8} {'p50':>8} {'p99':>8} {'err':>6} {'q/req':>6}")
+    for name, stats in [("ALL", level["overall"]), *level["endpoints"].items()]:
+        if not stats.get("requests"):
+            continue
+        ms = stats["latency_ms"]
+        print(f"   {name:<10} {stats['requests']:>7} {stats['rps']:>8.1f} {ms['p50']:>7.1f}ms {ms['p99']:>7.1f}ms "
+              f"{stats['errors']:>6} {stats['queries_per_request']['mean']:>6.1f}")
+
+
+# ---------------------------------------------------------------
+# Regression check
+# ---------------------------------------------------------------
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of p99 latency, throughput or queries per request versus the baseline, as messages."""
+    problems = []
+    base_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in report["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        pairs = [("ALL", level["overall"], base["overall"])]
+        pairs += [(name, stats, base["endpoints"].get(name, {})) for name, stats in level["endpoints"].items()]
+        for name, now, then in pairs:
+            if not now.get("requests") or not then.get("requests"):
+                continue
+            where = f"c={level['concurrency']} {name}"
+            if now["latency_ms"]["p99"] > then["latency_ms"]["p99"] * (1 + tolerance):
+                problems.append(f"{where}: p99 {then['latency_ms']['p99']}ms -> {now['latency_ms']['p99']}ms")
+            if name == "ALL" and now["rps"] < then["rps"] * (1 - tolerance):
+                problems.append(f"{where}: throughput {then['rps']} -> {now['rps']} req/s")
+            if now["queries_per_request"]["mean"] > then["queries_per_request"]["mean"] + 0.5:
+                problems.append(f"{where}: queries/request {then['queries_per_request']['mean']} -> "
+                                f"{now['queries_per_request']['mean']}")
+    return problems
+
+
+# ---------------------------------------------------------------
+# MAIN EXECUTION
+# ---------------------------------------------------------------
+def _int_list(spec: str) -> list:
+    return [int(x) for x in spec.split(",") if x.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for the advisor API.")
+    parser.add_argument("--users", type=int, default=2000, help="users in the seeded database")
+    parser.add_argument("--transactions-per-user", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reseed", action="store_true", help="regenerate the database even if it matches")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32], help="comma-separated worker counts")
+    parser.add_argument("--duration", type=float, default=15, help="measured seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2, help="unrecorded seconds before each level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("analyze=5,recommend=4,register=1"))
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--work-dir", default=".cache/benchmark")
+    parser.add_argument("--database-url", default=None, help="defaults to a SQLite file in --work-dir")
+    parser.add_argument("--backend", default="fake", help="LLM_BACKEND for the run")
+    parser.add_argument("--llm-latency", default="lognormal:0.8,0.5", help="FAKE_LLM_LATENCY distribution")
+    parser.add_argument("--llm-token-rate", type=float, default=60)
+    parser.add_argument("--llm-error-rate", type=float, default=0)
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache on")
+    parser.add_argument("--report", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    """Point the app at the benchmark database, work dir and LLM settings (before src is imported)."""
+    os.makedirs(args.work_dir, exist_ok=True)
+    database_url = args.database_url or f"sqlite:///{os.path.abspath(os.path.join(args.work_dir, 'bench.db'))}"
+    os.environ.update({
+        "DATABASE_URL": database_url,
+        "LLM_BACKEND": args.backend,
+        "FAKE_LLM_LATENCY": args.llm_latency,
+        "FAKE_LLM_TOKEN_RATE": str(args.llm_token_rate),
+        "FAKE_LLM_ERROR_RATE": str(args.llm_error_rate),
+        "FAKE_LLM_SEED": str(args.seed),
+        "LLM_CACHE_ENABLED": "1" if args.llm_cache else "0",
+        "LLM_CACHE_PATH": os.path.join(args.work_dir, "llm_cache.sqlite3"),
+        "WRITE_SPILL_PATH": os.path.join(args.work_dir, "recommendations_spill.jsonl"),
+    })
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    seed_database(args.users, args.transactions_per_user, args.seed, args.reseed)
+    ensure_scoring_artifacts()
+    report = asyncio.run(run_benchmark(args))
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = problems
+        for problem in problems:
+            print(f"❌ Regression: {problem}")
+        if not problems:
+            print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        status = 1 if problems else 0
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.report}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
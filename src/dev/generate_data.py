@@ -3,10 +3,12 @@
 # ==============================================================
 
 from faker import Faker
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
+import argparse
 import random
-from datetime import datetime, timedelta
+from datetime import date
 import os
 
 # --------------------------------------------------------------
@@ -162,12 +164,232 @@ def generate_loans(users_df):
     return loans_df
 
 
+# --------------------------------------------------------------
+# VECTORIZED GENERATION (LOAD-TEST SCALE)
+# --------------------------------------------------------------
+# Same schema as the functions above, but every column is drawn as a NumPy
+# array and free-text fields come from pre-sampled Faker pools. Each chunk of
+# users gets its own generator seeded from (seed, chunk index), so output is
+# identical for a given seed and as_of date no matter how many workers run.
+
+USER_TYPES = np.array(["salary_earner", "sme_owner", "student"])
+INCOME_RANGE = {"low": np.array([200_000, 800_000, 20_000]), "high": np.array([600_000, 2_500_000, 70_000])}
+SPEND_RATIO = {"low": np.array([0.6, 0.7, 0.8]), "high": np.array([0.7, 0.8, 0.9])}
+LOAN_STATUSES = np.array(["none", "active", "repaid"])
+TENURES = np.array([6, 12, 18, 24, 36])
+CREDIT_DESCRIPTIONS = np.array([
+    "Salary Payment", "POS Inflow", "Business Income",
+    "Transfer from Friend", "Refund", "Loan Disbursement"
+])
+SPENDING_CATEGORIES = {
+    "Food": ["Groceries", "Restaurant", "Snacks", "Supermarket"],
+    "Transport": ["Fuel Refill", "Public Transport", "Ride Hailing", "Car Maintenance"],
+    "Utilities": ["Electricity Bill", "Water Bill", "Internet Subscription"],
+    "Entertainment": ["Cinema", "Music Streaming", "Gaming", "Event Ticket"],
+    "Shopping": ["Online Shopping", "Clothing", "Accessories", "Electronics"],
+    "Education": ["School Fees", "Books", "Course Subscription"],
+    "Health": ["Pharmacy", "Clinic Visit", "Health Insurance"],
+    "Others": ["Airtime Purchase", "Transfer to Friend", "Miscellaneous"]
+}
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+
+def build_pools(seed: int = 42, size: int = 5_000) -> dict:
+    """Pre-sample names, merchants and cities once instead of calling Faker per row."""
+    pool_fake = Faker()
+    pool_fake.seed_instance(seed)
+    # unique values so the pools can serve directly as categorical dictionaries
+    return {
+        "names": np.unique([pool_fake.name() for _ in range(size)]),
+        "merchants": np.unique([pool_fake.company() for _ in range(size)]),
+        "cities": np.unique([pool_fake.city() for _ in range(size)]),
+        "domains": np.unique([pool_fake.free_email_domain() for _ in range(50)]),
+    }
+
+
+def _uuid4_array(raw: np.ndarray) -> np.ndarray:
+    """Format an (n, 16) uint8 array as version-4 UUID strings without a Python loop."""
+    raw = raw.copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    n = len(raw)
+    hexed = np.empty((n, 32), dtype=np.uint8)
+    hexed[:, 0::2] = HEX_DIGITS[raw >> 4]
+    hexed[:, 1::2] = HEX_DIGITS[raw & 0x0F]
+    out = np.full((n, 36), ord("-"), dtype=np.uint8)
+    out[:, 0:8], out[:, 9:13], out[:, 14:18] = hexed[:, 0:8], hexed[:, 8:12], hexed[:, 12:16]
+    out[:, 19:23], out[:, 24:36] = hexed[:, 16:20], hexed[:, 20:32]
+    return out.view("S36").ravel().astype(str).astype(object)
+
+
+def _days_before(as_of: date, days: np.ndarray) -> np.ndarray:
+    return (np.datetime64(as_of, "D") - days.astype("timedelta64[D]")).astype(str)
+
+
+def _dates_categorical(as_of: date, days: np.ndarray, span: int) -> pd.Categorical:
+    """Dates as codes into a small dictionary of day strings."""
+    return pd.Categorical.from_codes(days, categories=_days_before(as_of, np.arange(span)))
+
+
+def generate_users_vectorized(rng, first_id: int, n: int, pools: dict, as_of: date) -> pd.DataFrame:
+    kind = rng.integers(0, 3, n)
+    low, high = INCOME_RANGE["low"][kind], INCOME_RANGE["high"][kind]
+    income = low + (rng.random(n) * (high - low)).astype(np.int64)
+    spending = np.round(income * rng.uniform(SPEND_RATIO["low"][kind], SPEND_RATIO["high"][kind])).astype(np.int64)
+    user_id = np.arange(first_id, first_id + n)
+    names = pools["names"][rng.integers(0, len(pools["names"]), n)]
+    # user_id in the local part keeps emails unique at any scale
+    local = np.char.replace(np.char.lower(names), " ", ".")
+    domains = pools["domains"][rng.integers(0, len(pools["domains"]), n)]
+    emails = np.char.add(np.char.add(np.char.add(local, user_id.astype(str)), "@"), domains)
+    return pd.DataFrame({
+        "user_id": user_id,
+        "name": names,
+        "email": emails,
+        "occupation": USER_TYPES[kind],
+        "monthly_income": income,
+        "monthly_spending": spending,
+        "savings": income - spending,
+        "account_balance": np.round(rng.uniform(10_000, 500_000, n), 2),
+        "loan_status": LOAN_STATUSES[rng.integers(0, 3, n)],
+        "credit_score": rng.integers(500, 850, n),
+        "transaction_count": rng.integers(20, 100, n),
+        "date_joined": _days_before(as_of, rng.integers(0, 731, n)),
+    })
+
+
+def generate_transactions_vectorized(rng, users: pd.DataFrame, per_user: int, pools: dict, as_of: date) -> pd.DataFrame:
+    n = len(users) * per_user
+    owner = np.repeat(np.arange(len(users)), per_user)
+    is_credit = rng.random(n) < 0.4
+
+    categories = list(SPENDING_CATEGORIES)
+    desc_count = np.array([len(SPENDING_CATEGORIES[c]) for c in categories])
+    desc_offset = np.concatenate([[0], np.cumsum(desc_count)[:-1]])
+    cat = rng.integers(0, len(categories), n)
+    desc = desc_offset[cat] + (rng.random(n) * desc_count[cat]).astype(np.int64)
+    credit_desc = rng.integers(0, len(CREDIT_DESCRIPTIONS), n)
+    credit_amount = rng.integers(20_000, 300_000, n)
+    debit_amount = rng.integers(1_000, 80_000, n)
+    days = rng.integers(0, 91, n)
+    merchant = rng.integers(0, len(pools["merchants"]), n)
+    city = rng.integers(0, len(pools["cities"]), n)
+    noise = rng.uniform(-5000, 5000, n)
+    ids = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16)
+
+    # order by (user, date) on the integer columns, before any strings exist
+    order = np.lexsort((-days, owner))
+    owner, is_credit, cat, desc, credit_desc = owner[order], is_credit[order], cat[order], desc[order], credit_desc[order]
+    days, merchant, city, noise, ids = days[order], merchant[order], city[order], noise[order], ids[order]
+
+    # repeated strings are categoricals: a code per row plus one small dictionary
+    descriptions = [d for c in categories for d in SPENDING_CATEGORIES[c]] + list(CREDIT_DESCRIPTIONS)
+    return pd.DataFrame({
+        "transaction_id": _uuid4_array(ids),
+        "user_id": users["user_id"].to_numpy()[owner],
+        "date": _dates_categorical(as_of, days, 91),
+        "type": pd.Categorical.from_codes(is_credit.astype(np.int8), ["debit", "credit"]),
+        "amount": np.where(is_credit, credit_amount[order], debit_amount[order]),
+        "category": pd.Categorical.from_codes(np.where(is_credit, len(categories), cat), categories + ["Income"]),
+        "description": pd.Categorical.from_codes(
+            np.where(is_credit, len(descriptions) - len(CREDIT_DESCRIPTIONS) + credit_desc, desc), descriptions
+        ),
+        "merchant": pd.Categorical.from_codes(merchant, pools["merchants"]),
+        "location": pd.Categorical.from_codes(city, pools["cities"]),
+        "balance_after": users["account_balance"].to_numpy()[owner] + noise,
+    })
+
+
+def generate_loans_vectorized(rng, users: pd.DataFrame, as_of: date) -> pd.DataFrame:
+    borrowers = users[users["loan_status"] != "none"]
+    n = len(borrowers)
+    income = borrowers["monthly_income"].to_numpy()
+    principal = 100_000 + (rng.random(n) * (income * 6 - 100_000)).astype(np.int64)
+    interest_rate = np.round(rng.uniform(10.0, 18.0, n), 2)
+    tenure = TENURES[rng.integers(0, len(TENURES), n)]
+    r = interest_rate / 100 / 12
+    growth = (1 + r) ** tenure
+    repayment = principal * (r * growth) / (growth - 1)
+    return pd.DataFrame({
+        "user_id": borrowers["user_id"].to_numpy(),
+        "loan_amount": principal.astype(float),
+        "interest_rate": interest_rate,
+        "tenure_months": tenure,
+        "monthly_repayment": np.round(repayment, 2),
+        "loan_status": borrowers["loan_status"].to_numpy(),
+        "start_date": _days_before(as_of, rng.integers(30, 366, n)),
+    })
+
+
+def _write(df: pd.DataFrame, out_dir: str, name: str, part: int, fmt: str) -> str:
+    path = os.path.join(out_dir, f"{name}_part_{part:05d}.{fmt}")
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def _generate_chunk(args) -> tuple:
+    part, first_id, n, per_user, seed, pools, as_of, out_dir, fmt = args
+    rng = np.random.default_rng([seed, part])
+    users = generate_users_vectorized(rng, first_id, n, pools, as_of)
+    tx = generate_transactions_vectorized(rng, users, per_user, pools, as_of)
+    loans = generate_loans_vectorized(rng, users, as_of)
+    _write(users, out_dir, "users", part, fmt)
+    _write(tx, out_dir, "transactions", part, fmt)
+    _write(loans, out_dir, "loans", part, fmt)
+    return len(users), len(tx), len(loans)
+
+
+def generate_vectorized(n_users: int, transactions_per_user: int = 40, seed: int = 42,
+                        out_dir: str = "data", chunk_users: int = 25_000, workers: int = 1,
+                        fmt: str = "csv", as_of: date = None) -> tuple:
+    """
+    Generate users, transactions and loans into chunked files
+    (<name>_part_NNNNN.<fmt>), using a process pool when workers > 1.
+    Returns (users, transactions, loans) row counts.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    as_of = as_of or date.today()
+    pools = build_pools(seed)
+    jobs = [
+        (part, first + 1, min(chunk_users, n_users - first), transactions_per_user, seed, pools, as_of, out_dir, fmt)
+        for part, first in enumerate(range(0, n_users, chunk_users))
+    ]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = list(pool.map(_generate_chunk, jobs))
+    else:
+        counts = [_generate_chunk(job) for job in jobs]
+    totals = tuple(int(sum(c[i] for c in counts)) for i in range(3))
+    print(f"✅ Generated {totals[0]:,} users, {totals[1]:,} transactions, {totals[2]:,} loans "
+          f"-> {out_dir}/ ({len(jobs)} parts)")
+    return totals
+
+
 # --------------------------------------------------------------
 # MAIN EXECUTION
 # --------------------------------------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic financial data.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--transactions-per-user", type=int, default=40)
+    parser.add_argument("--vectorized", action="store_true", help="NumPy generation into chunked files")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-users", type=int, default=25_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, help="anchor date for relative dates")
+    parser.add_argument("--out-dir", default="data")
+    args = parser.parse_args()
+
     print("\n🚀 Generating Synthetic Financial Data with Spending Categories...\n")
-    users_df = generate_user_profiles(50)
-    tx_df = generate_transactions(users_df, 40)
-    loans_df = generate_loans(users_df)
+    if args.vectorized:
+        generate_vectorized(args.users, args.transactions_per_user, args.seed, args.out_dir,
+                            args.chunk_users, args.workers, args.format, args.as_of)
+    else:
+        users_df = generate_user_profiles(args.users)
+        tx_df = generate_transactions(users_df, args.transactions_per_user)
+        loans_df = generate_loans(users_df)
     print("\n🎉 Data generation complete! Files are ready in the /data folder.")
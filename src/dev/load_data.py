@@ -1,86 +1,148 @@
+"""
+Bulk, streaming loader for the cleaned data files (Parquet from the cleaning
+pipeline, or CSV).
+
+Files are read in chunks so memory stays bounded by LOAD_CHUNK_SIZE, and each
+chunk is written as one set-based upsert: COPY into a temp table followed by
+INSERT ... ON CONFLICT on Postgres, an executemany upsert elsewhere. Re-running
+the loader on the same files leaves the data unchanged.
+
+Every transaction row written is stamped with loaded_at, which the feature
+store's incremental refresh uses to find users whose history changed,
+whatever dates the transactions carry.
+
+Loans have no key in the files, so each gets a loan_id hashed from its
+content: reloading a file, or loading a second one, only ever matches the
+same loan again instead of overwriting unrelated rows.
+
+Run with: python -m src.dev.load_data
+"""
+import datetime
+import io
+import os
+import sys
+import time
+
 import pandas as pd
-from ..db import SessionLocal, init_db
+from .. import db
+from ..db import init_db, upsert_rows
+from ..feature_store import refresh_features
 from ..models import User, Loan, Transaction
-import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-def load_users():
-    df = pd.read_csv("data/clean_users.csv")
-    session = SessionLocal()
-
-    for _, row in df.iterrows():
-        user = User(
-            user_id=int(row["user_id"]),
-            name=row["name"],
-            email=row["email"],
-            occupation=row["occupation"],
-            monthly_income=float(row["monthly_income"]),
-            monthly_spending=float(row["monthly_spending"]),
-            savings=float(row["savings"]),
-            account_balance=float(row["account_balance"]),
-            loan_status=row["loan_status"],
-            credit_score=int(row["credit_score"]),
-            transaction_count=int(row["transaction_count"]),
-            date_joined=row["date_joined"],
-            spending_ratio=float(row["spending_ratio"]),
-            avg_transaction=float(row["avg_transaction"]),
-        )
-        session.merge(user)  # avoids duplicates if rerun
-
-    session.commit()
-    session.close()
-    print("✅ Users loaded successfully.")
-
-
-def load_transactions():
-    df = pd.read_csv("data/clean_transactions.csv")
-    session = SessionLocal()
-
-    for _, row in df.iterrows():
-        txn = Transaction(
-            transaction_id=row["transaction_id"],  # ✅ No int() here
-            user_id=int(row["user_id"]),
-            date=row["date"],
-            type=row["type"],
-            amount=float(row["amount"]),
-            category=row["category"],
-            description=row["description"],
-            merchant=row["merchant"],
-            location=row["location"],
-            balance_after=float(row["balance_after"]),
+LOAD_CHUNK_SIZE = int(os.getenv("LOAD_CHUNK_SIZE", "50000"))
+
+DATETIME_COLUMNS = {"users": ["date_joined"]}
+DATE_COLUMNS = {"transactions": ["date"]}
+
+
+def iter_chunks(path: str, table, chunk_size: int = LOAD_CHUNK_SIZE):
+    """Yield DataFrames of at most chunk_size rows, keeping only the table's columns."""
+    columns = set(table.columns.keys())
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        wanted = [c for c in parquet.schema_arrow.names if c in columns]
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=wanted):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=lambda c: c in columns)
+
+
+def prepare_chunk(df: pd.DataFrame, table) -> pd.DataFrame:
+    """Coerce dates and turn NaN into None so the driver writes NULL."""
+    for col in DATETIME_COLUMNS.get(table.name, []):
+        if col in df:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    for col in DATE_COLUMNS.get(table.name, []):
+        if col in df:
+            df[col] = pd.to_datetime(df[col], errors="coerce").dt.date
+    df = df.astype(object).where(df.notna(), None)
+    return df
+
+
+def _copy_upsert(conn, table, df: pd.DataFrame, key: str):
+    """Postgres: COPY the chunk into a temp table, then merge it in one statement."""
+    cols = list(df.columns)
+    col_list = ", ".join(cols)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols if c != key)
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TEMP TABLE tmp_{table.name} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP"
         )
-        session.merge(txn)
-
-    session.commit()
-    session.close()
-    print("✅ Transactions loaded successfully.")
-
-
-def load_loans():
-    df = pd.read_csv("data/clean_loans.csv")
-    session = SessionLocal()
-
-    for _, row in df.iterrows():
-        loan = Loan(
-            user_id=int(row["user_id"]),
-            loan_amount=float(row["loan_amount"]),
-            interest_rate=float(row["interest_rate"]),
-            tenure_months=int(row["tenure_months"]),
-            monthly_repayment=float(row["monthly_repayment"]),
-            loan_status=row["loan_status"],
-            start_date=row["start_date"],
+        cursor.copy_expert(f"COPY tmp_{table.name} ({col_list}) FROM STDIN WITH (FORMAT csv)", buf)
+        cursor.execute(
+            f"INSERT INTO {table.name} ({col_list}) SELECT {col_list} FROM tmp_{table.name} "
+            f"ON CONFLICT ({key}) DO UPDATE SET {updates}"
         )
-        session.add(loan)
+    finally:
+        cursor.close()
+
+
+def _executemany_upsert(conn, table, df: pd.DataFrame, key: str):
+    """Any other dialect: one executemany INSERT ... ON CONFLICT DO UPDATE."""
+    upsert_rows(conn, table, df.to_dict("records"), key)
+
+
+def upsert_chunk(conn, table, df: pd.DataFrame, key: str):
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2":
+        _copy_upsert(conn, table, df, key)
+    else:
+        _executemany_upsert(conn, table, df, key)
+
+
+def load_table(table, path: str, key: str, chunk_size: int = LOAD_CHUNK_SIZE, chunks=None, bind=None) -> int:
+    """
+    Stream one file into a table, committing per chunk and reporting progress.
+    Returns the number of rows written.
+    """
+    bind = bind if bind is not None else db.engine
+    if chunks is None:
+        chunks = iter_chunks(path, table, chunk_size)
+    total, started = 0, time.perf_counter()
+    for df in chunks:
+        if key not in df:
+            # loans have no natural key in the files: identify each by a hash of its values
+            from .data_cleaner import content_hash
+            columns = [c.name for c in table.columns if c.name in df]
+            df.insert(0, key, content_hash(df, columns))
+            df = df.drop_duplicates(subset=[key])   # one ON CONFLICT statement may not touch a row twice
+        if "loaded_at" in table.columns:
+            # set on update too, so the feature refresh sees amended rows as well as new ones
+            df["loaded_at"] = datetime.datetime.utcnow()
+        df = prepare_chunk(df, table)
+        with bind.begin() as conn:
+            upsert_chunk(conn, table, df, key)
+        total += len(df)
+        rate = total / max(time.perf_counter() - started, 1e-9)
+        print(f"   {table.name}: {total:,} rows ({rate:,.0f} rows/s)")
+    return total
+
+
+def load_users(path: str = "data/clean_users.parquet", chunk_size: int = LOAD_CHUNK_SIZE):
+    total = load_table(User.__table__, path, "user_id", chunk_size)
+    print(f"✅ {total:,} users loaded successfully.")
+
+
+def load_transactions(path: str = "data/clean_transactions.parquet", chunk_size: int = LOAD_CHUNK_SIZE):
+    total = load_table(Transaction.__table__, path, "transaction_id", chunk_size)
+    print(f"✅ {total:,} transactions loaded successfully.")
+
 
-    session.commit()
-    session.close()
-    print("✅ Loans loaded successfully.")
+def load_loans(path: str = "data/clean_loans.parquet", chunk_size: int = LOAD_CHUNK_SIZE):
+    total = load_table(Loan.__table__, path, "loan_id", chunk_size)
+    print(f"✅ {total:,} loans loaded successfully.")
 
 
 if __name__ == "__main__":
-    print("🚀 Initializing database...")
     init_db()
     load_users()
     load_transactions()
     load_loans()
-    print("🎉 All data loaded successfully!")
\ No newline at end of file
+    refresh_features(full=True)
+    print("🎉 All data loaded successfully!")
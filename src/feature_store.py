@@ -0,0 +1,176 @@
+"""
+Materialized per-user transaction features (user_transaction_features).
+
+The refresh job only recomputes users whose windows can have changed since
+the last run: users with transactions written since then (loaded_at past the
+stored high-water mark, so late-arriving and back-dated rows count too), and
+users with transactions that have since slid out of the 30/90-day windows.
+Their history is read in batches of FEATURE_BATCH_USERS users and aggregated
+with vectorized pandas groupbys, then upserted in one statement per batch.
+
+Profiles (prompts) and clustering read from this table, falling back to the
+columns written by the cleaning pipeline for users it does not cover yet.
+
+Run with: python -m src.feature_store [--full] [--as-of YYYY-MM-DD]
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+from typing import TYPE_CHECKING
+
+from sqlalchemy import and_, func, or_, select
+
+from . import db
+from .db import upsert_rows
+from .models import FeatureRefreshState, Transaction, User, UserTransactionFeatures
+
+if TYPE_CHECKING:
+    import pandas as pd     # imported lazily at run time to keep it out of API startup
+
+FEATURE_BATCH_USERS = int(os.getenv("FEATURE_BATCH_USERS", "5000"))
+WINDOWS = (30, 90)
+STATE_NAME = "transactions"
+
+# Clustering features that the store supersedes on User
+_STORE_COLUMNS = {"avg_transaction": "avg_transaction", "transaction_count": "transaction_count"}
+
+
+def user_feature_column(name: str, default=0):
+    """
+    Feature column for User-level queries joined to the store: the store's
+    value when present, else the User column, else default.
+    """
+    user_col = getattr(User, name)
+    if name in _STORE_COLUMNS:
+        store_col = getattr(UserTransactionFeatures, _STORE_COLUMNS[name])
+        return func.coalesce(store_col, user_col, default).label(name)
+    return func.coalesce(user_col, default).label(name)
+
+
+def top_categories(category_spend: str, n: int = 3) -> str:
+    """'Food, Transport, Shopping' from a category_spend_90d JSON value."""
+    if not category_spend:
+        return ""
+    spend = json.loads(category_spend)
+    return ", ".join(sorted(spend, key=spend.get, reverse=True)[:n])
+
+
+# ---------------------------------------------------------------
+# Aggregation
+# ---------------------------------------------------------------
+def compute_features(df: pd.DataFrame, as_of: datetime.date) -> pd.DataFrame:
+    """
+    Aggregate transaction rows (user_id, date, type, amount, category) into
+    one feature row per user. Windows are the 30/90 days ending on as_of.
+    """
+    # numpy/pandas are imported here so the API (which only needs the column helpers) starts without them
+    import numpy as np
+    import pandas as pd
+
+    df = df.assign(date=pd.to_datetime(df["date"]), amount=df["amount"].fillna(0.0))
+    age = (pd.Timestamp(as_of) - df["date"]).dt.days
+    debit = df["type"].eq("debit").to_numpy()
+    amount = df["amount"].to_numpy()
+    user_ids = df["user_id"]
+
+    by_user = df.groupby("user_id")
+    out = pd.DataFrame({
+        "transaction_count": by_user.size(),
+        "avg_transaction": by_user["amount"].mean(),
+        "debit_total": pd.Series(np.where(debit, amount, 0.0)).groupby(user_ids.to_numpy()).sum(),
+        "credit_total": pd.Series(np.where(debit, 0.0, amount)).groupby(user_ids.to_numpy()).sum(),
+        "last_transaction_date": by_user["date"].max().dt.date,
+    })
+    for days in WINDOWS:
+        in_window = debit & (age >= 0).to_numpy() & (age < days).to_numpy()
+        spend = pd.Series(np.where(in_window, amount, 0.0)).groupby(user_ids.to_numpy()).sum()
+        out[f"spend_{days}d"] = spend
+        out[f"avg_daily_spend_{days}d"] = spend / days
+
+    # volatility: std dev of daily spend over the 90-day window, zero-spend days included
+    recent = df[debit & (age >= 0).to_numpy() & (age < 90).to_numpy()]
+    daily = recent.groupby(["user_id", "date"])["amount"].sum()
+    sum_sq = (daily ** 2).groupby(level="user_id").sum().reindex(out.index, fill_value=0.0)
+    mean = out["avg_daily_spend_90d"]
+    out["spend_volatility_90d"] = np.sqrt(np.maximum(sum_sq / 90 - mean ** 2, 0.0))
+
+    categories = recent.groupby(["user_id", "category"])["amount"].sum().round(2)
+    per_user = {uid: json.dumps(group.droplevel(0).to_dict(), sort_keys=True)
+                for uid, group in categories.groupby(level="user_id")}
+    out["category_spend_90d"] = pd.Series(per_user, dtype=object).reindex(out.index)
+
+    out["as_of"] = as_of
+    return out.reset_index(names="user_id")
+
+
+# ---------------------------------------------------------------
+# Refresh job
+# ---------------------------------------------------------------
+def _affected_users_query(state, as_of: datetime.date, full: bool):
+    """user_ids whose features may differ from what is stored."""
+    query = select(Transaction.user_id).distinct().order_by(Transaction.user_id)
+    if full or state is None or state.loaded_through is None or as_of < state.as_of:
+        return query
+    # by load time, not transaction date: a row dated before the last refresh may arrive after it
+    changed = [Transaction.loaded_at > state.loaded_through]
+    for days in WINDOWS:
+        # transactions that were inside the window at the last refresh but are not now
+        changed.append(and_(Transaction.date > state.as_of - datetime.timedelta(days=days),
+                            Transaction.date <= as_of - datetime.timedelta(days=days)))
+    return query.where(or_(*changed))
+
+
+def refresh_features(as_of: datetime.date = None, full: bool = False,
+                     batch_users: int = FEATURE_BATCH_USERS, bind=None) -> int:
+    """
+    Bring user_transaction_features up to date as of the given day (default
+    today). Returns the number of users recomputed.
+    """
+    import pandas as pd
+
+    bind = bind if bind is not None else db.engine
+    as_of = as_of or datetime.date.today()
+    with bind.connect() as conn:
+        state = conn.execute(
+            select(FeatureRefreshState).where(FeatureRefreshState.name == STATE_NAME)
+        ).first()
+        watermark = conn.scalar(select(func.max(Transaction.date)))
+        loaded_through = conn.scalar(select(func.max(Transaction.loaded_at)))
+        user_ids = conn.scalars(_affected_users_query(state, as_of, full)).all()
+    if watermark is None:
+        print("No transactions to aggregate.")
+        return 0
+
+    table = UserTransactionFeatures.__table__
+    columns = [Transaction.user_id, Transaction.date, Transaction.type, Transaction.amount, Transaction.category]
+    refreshed_at = datetime.datetime.utcnow()
+    for start in range(0, len(user_ids), batch_users):
+        batch = user_ids[start:start + batch_users]
+        with bind.connect() as conn:
+            df = pd.read_sql(select(*columns).where(Transaction.user_id.in_(batch)), conn)
+        features = compute_features(df, as_of)
+        features["refreshed_at"] = refreshed_at
+        rows = features.astype(object).where(features.notna(), None).to_dict("records")
+        with bind.begin() as conn:
+            upsert_rows(conn, table, rows, "user_id")
+        print(f"   features: {min(start + batch_users, len(user_ids)):,}/{len(user_ids):,} users")
+
+    with bind.begin() as conn:
+        upsert_rows(conn, FeatureRefreshState.__table__, [{
+            "name": STATE_NAME, "watermark": watermark, "loaded_through": loaded_through, "as_of": as_of,
+            "refreshed_at": refreshed_at,
+        }], "name")
+    print(f"✅ Transaction features refreshed for {len(user_ids):,} users (watermark {watermark}).")
+    return len(user_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the per-user transaction feature store")
+    parser.add_argument("--full", action="store_true", help="recompute every user, ignoring the high-water mark")
+    parser.add_argument("--as-of", type=datetime.date.fromisoformat, default=None,
+                        help="window end date (default: today)")
+    args = parser.parse_args()
+    refresh_features(args.as_of, full=args.full)
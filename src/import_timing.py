@@ -0,0 +1,104 @@
+"""
+Per-module import timing for the cold-start budget.
+
+app.py starts the timer before any of its own imports, and the startup hook
+stops it and prints the cold-start time (module load until startup done),
+the time spent importing, and the slowest modules. Lazy imports made by the
+startup hook itself are included. The wrapped
+builtins.__import__ only times first-time imports; it is removed at startup,
+so requests never pay for it. Times are cumulative (a module includes what
+it imports) as well as self (its own code only), like `python -X importtime`.
+
+IMPORT_TIME_BUDGET_MS prints a warning when import time goes over budget.
+"""
+import builtins
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+IMPORT_TIME_REPORT = os.getenv("IMPORT_TIME_REPORT", "1") == "1"
+IMPORT_TIME_TOP = int(os.getenv("IMPORT_TIME_TOP", "10"))
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "0"))   # 0 = no budget
+
+
+class ImportTimer:
+    def __init__(self):
+        self.timings = {}       # module -> [cumulative seconds, self seconds]
+        self.started = None
+        self.import_seconds = 0.0
+        self.cold_start = None
+        self._local = threading.local()   # per-thread stack of child import time
+        self._original = None
+
+    def _new_modules(self, name, globals_, fromlist, level) -> list:
+        if level:
+            package = (globals_ or {}).get("__package__") or ""
+            try:
+                name = importlib.util.resolve_name("." * level + name, package) if name else package
+            except (ImportError, ValueError):
+                return []
+        candidates = [name] + [f"{name}.{item}" for item in fromlist or () if item != "*"]
+        return [module for module in candidates if module and module not in sys.modules]
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        new = self._new_modules(name, globals, fromlist, level)
+        if not new:
+            return self._original(name, globals, locals, fromlist, level)
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        began = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - began
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            else:
+                self.import_seconds += elapsed
+            loaded = [module for module in new if module in sys.modules]
+            if loaded:
+                self.timings[", ".join(loaded)] = [elapsed, elapsed - children]
+
+    def start(self):
+        if not IMPORT_TIME_REPORT or self._original is not None:
+            return
+        self.started = time.perf_counter()
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original is None:
+            return
+        builtins.__import__ = self._original
+        self._original = None
+        self.cold_start = time.perf_counter() - self.started
+
+    def slowest(self, n: int = IMPORT_TIME_TOP, key: str = "self") -> list:
+        """[(module, cumulative ms, self ms), ...] ordered by self or cumulative time."""
+        index = 1 if key == "self" else 0
+        rows = sorted(self.timings.items(), key=lambda item: item[1][index], reverse=True)[:n]
+        return [(module, round(cum * 1000, 1), round(own * 1000, 1)) for module, (cum, own) in rows]
+
+    def report(self):
+        if self.cold_start is None:
+            return
+        import_ms = self.import_seconds * 1000
+        print(f"⏱️ Cold start {self.cold_start * 1000:.0f}ms, of which imports {import_ms:.0f}ms "
+              f"({len(self.timings)} modules); slowest by own time:")
+        for module, cum, own in self.slowest():
+            print(f"   {own:>8.1f}ms self {cum:>8.1f}ms total  {module}")
+        if IMPORT_TIME_BUDGET_MS and import_ms > IMPORT_TIME_BUDGET_MS:
+            print(f"⚠️ Import time {import_ms:.0f}ms is over the {IMPORT_TIME_BUDGET_MS:g}ms budget")
+
+    def status(self) -> dict:
+        return {
+            "cold_start_ms": round(self.cold_start * 1000, 1) if self.cold_start is not None else None,
+            "import_ms": round(self.import_seconds * 1000, 1),
+            "slowest": [{"module": m, "total_ms": cum, "self_ms": own} for m, cum, own in self.slowest()],
+        }
+
+
+import_timer = ImportTimer()
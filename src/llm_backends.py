@@ -0,0 +1,225 @@
+"""
+LLM backends behind one interface, selected with LLM_BACKEND.
+
+- gemini: Google Gemini via google.generativeai (imported and configured on
+  first use, not at import time).
+- fake: a local stand-in with no network. Answers are deterministic per
+  prompt; latency, streaming speed and failures are drawn from configurable
+  distributions so the full request path can be load-tested offline.
+
+Every backend goes through the same cache, coalescing and Guard in
+llm_service, so backends are compared on equal terms.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+
+# Fake backend knobs
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:0.8,0.5")   # time to first token, seconds
+FAKE_LLM_TOKEN_RATE = float(os.getenv("FAKE_LLM_TOKEN_RATE", "60"))     # streamed tokens per second
+FAKE_LLM_RESPONSE_TOKENS = int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "120"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))      # share of calls that raise
+FAKE_LLM_HANG_RATE = float(os.getenv("FAKE_LLM_HANG_RATE", "0"))        # share of calls that never answer
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED")
+
+
+class LLMBackend:
+    """Interface every backend implements. Methods raise on failure; retries and deadlines live in the Guard."""
+
+    name = "base"
+    model_name = "base"
+
+    def generate(self, prompt: str, temperature: float, timeout: float = None) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, temperature: float) -> str:
+        raise NotImplementedError
+
+    async def open_stream(self, prompt: str, temperature: float):
+        """Start a streamed generation; returns an async iterator of text pieces."""
+        raise NotImplementedError
+
+    async def warmup(self):
+        pass
+
+
+# ---------------------------------------------------------------
+# Gemini
+# ---------------------------------------------------------------
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL, api_key: str = None):
+        self.model_name = model_name
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self._model = None
+
+    @property
+    def model(self):
+        """The shared GenerativeModel, created on first use."""
+        if self._model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt: str, temperature: float, timeout: float = None) -> str:
+        options = {"timeout": timeout} if timeout else None
+        response = self.model.generate_content(
+            prompt, generation_config={"temperature": temperature}, request_options=options
+        )
+        return response.text
+
+    async def agenerate(self, prompt: str, temperature: float) -> str:
+        response = await self.model.generate_content_async(prompt, generation_config={"temperature": temperature})
+        return response.text
+
+    async def open_stream(self, prompt: str, temperature: float):
+        response = await self.model.generate_content_async(
+            prompt, generation_config={"temperature": temperature}, stream=True
+        )
+
+        async def pieces():
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        return pieces()
+
+    async def warmup(self):
+        # opens the async channel so the first user request doesn't pay for connection setup
+        await self.model.count_tokens_async("ping")
+
+
+# ---------------------------------------------------------------
+# Fake
+# ---------------------------------------------------------------
+class FakeBackendError(RuntimeError):
+    pass
+
+
+class FakeDeadlineExceeded(FakeBackendError):
+    """Raised by an injected hang once the caller's deadline has passed."""
+
+
+def parse_distribution(spec: str):
+    """
+    Build a sampler from 'fixed:S', 'uniform:LO,HI', 'normal:MEAN,STD' or
+    'lognormal:MEDIAN,SIGMA' (all in seconds, never negative).
+    """
+    kind, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",") if x.strip()]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        import math
+        mu = math.log(params[0]) if params[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+_FAKE_SENTENCES = (
+    "Set aside a fixed share of income on payday before any discretionary spending.",
+    "Build an emergency fund covering three to six months of essential expenses.",
+    "Review recurring subscriptions and cancel the ones you rarely use.",
+    "Keep loan repayments below a third of monthly income to protect your credit score.",
+    "Split savings between a high-yield account and low-cost diversified funds.",
+    "Track spending by category each week and cap the two largest categories.",
+    "Automate transfers so saving happens without a decision every month.",
+    "Pay down the highest-interest debt first while making minimum payments on the rest.",
+)
+
+
+class FakeBackend(LLMBackend):
+    name = "fake"
+    model_name = "fake-llm"
+
+    def __init__(self, latency: str = FAKE_LLM_LATENCY, token_rate: float = FAKE_LLM_TOKEN_RATE,
+                 response_tokens: int = FAKE_LLM_RESPONSE_TOKENS, error_rate: float = FAKE_LLM_ERROR_RATE,
+                 hang_rate: float = FAKE_LLM_HANG_RATE, seed=FAKE_LLM_SEED):
+        self.latency_spec = latency
+        self.sample_latency = parse_distribution(latency)
+        self.token_rate = token_rate
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.rng = random.Random(None if seed is None else int(seed))
+        self.calls = 0
+
+    def text_for(self, prompt: str) -> str:
+        """Deterministic answer for a prompt, about response_tokens words long."""
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        words, i = [], 0
+        while len(words) < self.response_tokens:
+            words.extend(_FAKE_SENTENCES[(digest >> (3 * i)) % len(_FAKE_SENTENCES)].split())
+            i += 1
+        return " ".join(words[:self.response_tokens])
+
+    def _plan(self):
+        """(time to first token, outcome) for the next call; outcome is 'ok', 'error' or 'hang'."""
+        self.calls += 1
+        roll = self.rng.random()
+        outcome = "error" if roll < self.error_rate else "hang" if roll < self.error_rate + self.hang_rate else "ok"
+        return self.sample_latency(self.rng), outcome
+
+    def _token_delay(self) -> float:
+        return 1 / self.token_rate if self.token_rate > 0 else 0.0
+
+    def generate(self, prompt: str, temperature: float, timeout: float = None) -> str:
+        delay, outcome = self._plan()
+        if outcome == "hang":
+            time.sleep(timeout if timeout else 3600)
+            raise FakeDeadlineExceeded("injected hang")
+        time.sleep(delay + self.response_tokens * self._token_delay())
+        if outcome == "error":
+            raise FakeBackendError("500 injected error")
+        return self.text_for(prompt)
+
+    async def agenerate(self, prompt: str, temperature: float) -> str:
+        delay, outcome = self._plan()
+        if outcome == "hang":
+            await asyncio.Event().wait()
+        await asyncio.sleep(delay + self.response_tokens * self._token_delay())
+        if outcome == "error":
+            raise FakeBackendError("500 injected error")
+        return self.text_for(prompt)
+
+    async def open_stream(self, prompt: str, temperature: float):
+        delay, outcome = self._plan()
+        if outcome == "hang":
+            await asyncio.Event().wait()
+        await asyncio.sleep(delay)
+        if outcome == "error":
+            raise FakeBackendError("500 injected error")
+        words = self.text_for(prompt).split(" ")
+        pause = self._token_delay()
+
+        async def pieces():
+            for i, word in enumerate(words):
+                if i and pause:
+                    await asyncio.sleep(pause)
+                yield word if i == len(words) - 1 else word + " "
+        return pieces()
+
+
+BACKENDS = {"gemini": GeminiBackend, "fake": FakeBackend}
+
+
+def create_backend(name: str = LLM_BACKEND) -> LLMBackend:
+    try:
+        return BACKENDS[name.strip().lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown LLM_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}") from None
@@ -0,0 +1,215 @@
+# src/llm_cache.py
+"""
+Two-tier cache for LLM responses.
+
+Tier 1 is a bounded in-process LRU with TTL eviction. Tier 2 is a SQLite
+file that every uvicorn worker on the host opens, so an answer generated by
+one worker is served by all of them.
+"""
+from collections import OrderedDict
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+
+
+def make_key(prompt: str, model: str, temperature: float) -> str:
+    """Stable cache key for a (prompt, model, temperature) triple."""
+    raw = f"{model}\x00{temperature:.3f}\x00{prompt}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """SQLite-backed cache shared by all processes on the host."""
+
+    PURGE_EVERY = 500  # sets between sweeps of expired rows
+
+    def __init__(self, path: str, ttl: float = 3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._sets = 0
+        self.expirations = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; WAL lets readers in other workers proceed during writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self.expirations += 1
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+        self._sets += 1
+        if self._sets % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+        return cur.rowcount
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM llm_cache")
+
+
+class TieredCache:
+    """Memory LRU in front of the shared disk store, with hit/miss counters."""
+
+    def __init__(self, memory: LRUCache, disk: DiskCache = None):
+        self.memory = memory
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "TieredCache":
+        memory = LRUCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL)
+        disk = None
+        if LLM_CACHE_PATH:
+            try:
+                disk = DiskCache(LLM_CACHE_PATH, LLM_CACHE_TTL)
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM disk cache disabled: {e}")
+        return cls(memory, disk)
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM disk cache read failed: {e}")
+                value = None
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self._disk_set(key, value)
+
+    def _disk_set(self, key: str, value: str):
+        try:
+            self.disk.set(key, value)
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM disk cache write failed: {e}")
+
+    async def aget(self, key: str):
+        """Like get, but the disk lookup runs off the event loop."""
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is None:
+            self.misses += 1
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations + (self.disk.expirations if self.disk else 0),
+            "memory_entries": len(self.memory),
+        }
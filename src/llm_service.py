@@ -0,0 +1,155 @@
+# src/llm_service.py
+from dotenv import load_dotenv
+import os
+
+from .llm_backends import LLMBackend, create_backend
+from .llm_cache import LLM_CACHE_ENABLED, TieredCache, make_key
+from .resilience import Guard, LLMUnavailable
+from .singleflight import AsyncSingleFlight, SingleFlight
+
+# Load environment variables
+load_dotenv()
+
+FALLBACK_RESPONSE = "Sorry, I couldn't generate a response at this time."
+
+# Shared backend (LLM_BACKEND=gemini|fake), created once and reused by every request
+_backend = None
+
+# Response cache keyed on (prompt, model, temperature)
+response_cache = TieredCache.from_env() if LLM_CACHE_ENABLED else None
+
+# Concurrent identical requests (same cache key) share one upstream call
+LLM_COALESCE_ENABLED = os.getenv("LLM_COALESCE_ENABLED", "1") == "1"
+_inflight = SingleFlight()
+_inflight_async = AsyncSingleFlight()
+
+# Adaptive concurrency limit, per-call deadline and circuit breaker for upstream calls
+guard = Guard()
+
+
+def get_backend() -> LLMBackend:
+    """Return the shared backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: LLMBackend):
+    """Swap the backend (benchmarks and scripts); cached answers are keyed per model."""
+    global _backend
+    _backend = backend
+
+
+def model_name() -> str:
+    """Model recorded on recommendation rows."""
+    return get_backend().model_name
+
+
+async def init_llm(warmup: bool = True):
+    """Create the shared backend at startup and optionally warm it up."""
+    backend = get_backend()
+    if not warmup or os.getenv("LLM_WARMUP", os.getenv("GEMINI_WARMUP", "1")) != "1":
+        return
+    try:
+        await backend.warmup()
+        print(f"✅ LLM backend ready ({backend.name}: {backend.model_name}).")
+    except Exception as e:
+        print(f"⚠️ LLM warm-up failed ({backend.name}): {e}")
+
+
+def query_llm(prompt: str, temperature: float = 0.6) -> str:
+    """
+    Send a prompt to the configured backend and return the advisory response.
+    Identical requests are answered from the response cache. Raises
+    LLMUnavailable when the call is rejected, times out or fails.
+    """
+    backend = get_backend()
+    key = make_key(prompt, backend.model_name, temperature)
+    if response_cache is not None:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+    try:
+        if LLM_COALESCE_ENABLED:
+            return _inflight.do(key, _generate, backend, key, prompt, temperature)
+        return _generate(backend, key, prompt, temperature)
+    except LLMUnavailable as e:
+        print(f"❌ LLM API Error ({backend.name}): {e}")
+        raise
+
+
+def _generate(backend: LLMBackend, key: str, prompt: str, temperature: float) -> str:
+    text = guard.call(backend.generate, prompt, temperature).strip()
+    if response_cache is not None:
+        response_cache.set(key, text)
+    return text
+
+
+async def query_llm_async(prompt: str, temperature: float = 0.6) -> str:
+    """
+    Async variant of query_llm. Awaiting the response doesn't hold a
+    worker thread, so many requests can wait on the model concurrently.
+    """
+    backend = get_backend()
+    key = make_key(prompt, backend.model_name, temperature)
+    if response_cache is not None:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            return cached
+    try:
+        if LLM_COALESCE_ENABLED:
+            return await _inflight_async.do(key, _generate_async, backend, key, prompt, temperature)
+        return await _generate_async(backend, key, prompt, temperature)
+    except LLMUnavailable as e:
+        print(f"❌ LLM API Error ({backend.name}): {e}")
+        raise
+
+
+async def _generate_async(backend: LLMBackend, key: str, prompt: str, temperature: float) -> str:
+    text = (await guard.call_async(backend.agenerate, prompt, temperature)).strip()
+    if response_cache is not None:
+        await response_cache.aset(key, text)
+    return text
+
+
+async def query_llm_stream(prompt: str, temperature: float = 0.6):
+    """
+    Async generator yielding response text as the model produces it.
+    A cached answer is yielded in one piece; a fresh one is cached once the
+    stream completes. Raises LLMUnavailable if the stream cannot start or breaks.
+    """
+    backend = get_backend()
+    key = make_key(prompt, backend.model_name, temperature)
+    if response_cache is not None:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    try:
+        async for piece in guard.stream(backend.open_stream, prompt, temperature):
+            if piece:
+                parts.append(piece)
+                yield piece
+    except LLMUnavailable as e:
+        print(f"❌ LLM API Error ({backend.name}): {e}")
+        raise
+    text = "".join(parts).strip()
+    if response_cache is not None and text:
+        await response_cache.aset(key, text)
+
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters of the response cache."""
+    return response_cache.stats() if response_cache is not None else {}
+
+
+def guard_stats() -> dict:
+    """Current concurrency limit and circuit breaker state."""
+    return guard.status()
+
+
+def coalescing_stats() -> dict:
+    """Upstream calls made and requests coalesced onto them, per code path."""
+    return {"sync": _inflight.stats(), "async": _inflight_async.stats()}
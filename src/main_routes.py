@@ -1,24 +1,110 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from . import db, schemas, crud
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Optional
+import json
+import os
+from . import schemas, crud
+from .db import AsyncSessionLocal
+from .deps import get_db
+from .security import basic_auth
+from .repository import (
+    HISTORY_FIELDS, InvalidCursor, get_profile, get_recommendation_page, history_item, history_query, user_exists,
+)
+from .ml.scoring import get_scorer
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))   # rows fetched per round trip
 
 router = APIRouter()
 
 @router.post("/register", response_model=schemas.UserResponse)
-def register_user(user: schemas.UserCreate, database: Session = Depends(db.get_db)):
-    existing_user = crud.get_user_by_email(database, user.email)
+async def register_user(user: schemas.UserCreate, database: AsyncSession = Depends(get_db)):
+    existing_user = await crud.get_user_by_email(database, user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(database, user)
+    return await crud.create_user(database, user)
 
 @router.post("/login")
-def login(user: schemas.UserLogin, database: Session = Depends(db.get_db)):
-    db_user = crud.get_user_by_email(database, user.email)
+async def login(user: schemas.UserLogin, database: AsyncSession = Depends(get_db)):
+    db_user = await crud.get_user_by_email(database, user.email)
     
 
 @router.get("/user/me", response_model=schemas.UserResponse)
-def get_current_user(token: str, database: Session = Depends(db.get_db)):
-    user = crud.get_user_by_email(database, token)
+async def get_current_user(token: str, database: AsyncSession = Depends(get_db)):
+    user = await crud.get_user_by_email(database, token)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
\ No newline at end of file
+    return user
+
+@router.get("/user/{user_id}/cluster", response_model=schemas.ClusterResponse, dependencies=[Depends(basic_auth)])
+async def get_user_cluster(user_id: int, database: AsyncSession = Depends(get_db)):
+    scorer = get_scorer()
+    if scorer is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="No cluster model loaded")
+    profile = await get_profile(database, user_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    return schemas.ClusterResponse(
+        user_id=user_id, cluster_id=profile.cluster_id,
+        distance=profile.cluster_distance, model_version=scorer.version,
+    )
+
+
+def _history_fields(fields: Optional[str]) -> tuple:
+    if not fields:
+        return HISTORY_FIELDS
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = set(requested) - set(HISTORY_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+@router.get("/user/{user_id}/recommendations", response_model=schemas.RecommendationPage,
+            dependencies=[Depends(basic_auth)])
+async def list_recommendations(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    request_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description=f"comma-separated subset of {','.join(HISTORY_FIELDS)}"),
+    database: AsyncSession = Depends(get_db),
+):
+    """Newest-first history; pass next_cursor back as cursor for the following page."""
+    selected = _history_fields(fields)
+    if not await user_exists(database, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        return await get_recommendation_page(
+            database, user_id, limit, selected,
+            request_type=request_type, since=since, until=until, cursor=cursor,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/user/{user_id}/recommendations/export", dependencies=[Depends(basic_auth)])
+async def export_recommendations(
+    user_id: int,
+    request_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    database: AsyncSession = Depends(get_db),
+):
+    """Whole history as NDJSON, streamed from a server-side cursor EXPORT_CHUNK_SIZE rows at a time."""
+    selected = _history_fields(fields)
+    if not await user_exists(database, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    await database.close()
+    query = history_query(user_id, selected, request_type=request_type, since=since, until=until)
+
+    async def lines():
+        # the request-scoped session is closed once streaming starts
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+            async for rows in result.partitions():
+                yield "".join(json.dumps(history_item(row, selected)) + "\n" for row in rows)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,311 @@
+"""
+Prometheus metrics for the advice pipeline, rendered in the text exposition
+format on /metrics (no client library needed).
+
+- advisor_request_duration_seconds{endpoint,method,status}: whole request,
+  including the streamed body.
+- advisor_stage_duration_seconds{endpoint,stage,template,model}: profile_query,
+  prompt_build, llm_call and save_enqueue inside a request, and
+  recommendation_commit for the write-behind flusher (endpoint "background").
+- advisor_llm_prompt_tokens / advisor_llm_response_tokens{endpoint,template,model}:
+  estimated token counts per LLM call.
+- Gauges and counters read at scrape time from the components that already
+  keep them: DB pool usage, LLM cache hits, coalescing, concurrency limit and
+  breaker, write-behind queue, cold-start and import time.
+
+Labels come from a per-request context (set by MetricsMiddleware): endpoint is
+the route template (/user/{user_id}/cluster, not the raw path) and template is
+the RenderedPrompt tag once a prompt has been built, so label sets stay small.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from .llm_service import model_name
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (50, 100, 250, 500, 750, 1000, 1500, 2000, 4000, 8000)
+INF_BUCKET = 'le="+Inf"'
+
+# {"scope": ASGI scope, "template": tag or None} for the request being handled
+_context = contextvars.ContextVar("metrics_context", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, INF_BUCKET)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self.histograms.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        Register fn() -> [(name, type, help, [(labels dict, value), ...]), ...],
+        called on every scrape. Used as a decorator.
+        """
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.histograms:
+            lines.extend(metric.render())
+        for fn in self.collectors:
+            try:
+                families = fn()
+            except Exception as e:
+                print(f"⚠️ Metrics collector {fn.__name__} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    "advisor_request_duration_seconds", "HTTP request duration including the streamed body.",
+    ("endpoint", "method", "status"),
+)
+stage_duration = registry.histogram(
+    "advisor_stage_duration_seconds", "Time spent in each stage of the advice pipeline.",
+    ("endpoint", "stage", "template", "model"),
+)
+prompt_tokens = registry.histogram(
+    "advisor_llm_prompt_tokens", "Estimated prompt tokens per LLM call.",
+    ("endpoint", "template", "model"), TOKEN_BUCKETS,
+)
+response_tokens = registry.histogram(
+    "advisor_llm_response_tokens", "Estimated response tokens per LLM call.",
+    ("endpoint", "template", "model"), TOKEN_BUCKETS,
+)
+
+
+# ---------------------------------------------------------------
+# Request context
+# ---------------------------------------------------------------
+def _endpoint() -> str:
+    context = _context.get()
+    if context is None:
+        return "background"
+    route = context["scope"].get("route")
+    return getattr(route, "path", "unmatched")
+
+
+def _template() -> str:
+    context = _context.get()
+    return (context or {}).get("template") or "none"
+
+
+def _model() -> str:
+    return model_name()
+
+
+def set_template(tag: str):
+    """Label later stages of the current request (or batch task) with the prompt template."""
+    context = _context.get()
+    if METRICS_ENABLED and context is not None:
+        _context.set({**context, "template": tag})
+
+
+def observe_stage(stage: str, seconds: float):
+    if METRICS_ENABLED:
+        stage_duration.observe(seconds, _endpoint(), stage, _template(), _model())
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one pipeline stage of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def observe_tokens(prompt: int, response: int = None):
+    if not METRICS_ENABLED:
+        return
+    labels = (_endpoint(), _template(), _model())
+    prompt_tokens.observe(prompt, *labels)
+    if response is not None:
+        response_tokens.observe(response, *labels)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request until its last body chunk is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        started, status = time.perf_counter(), [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        token = _context.set({"scope": scope, "template": None})
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _context.reset(token)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            request_duration.observe(time.perf_counter() - started, endpoint, scope["method"], str(status[0]))
+
+
+# ---------------------------------------------------------------
+# Scrape-time collectors (imports are deferred: these modules record metrics themselves)
+# ---------------------------------------------------------------
+@registry.collector
+def _pool_metrics():
+    from .db import pool_status
+    status = pool_status()
+    if "size" not in status:
+        return []
+    return [
+        ("advisor_db_pool_size", "gauge", "Configured connection pool size.", [({}, status["size"])]),
+        ("advisor_db_pool_checked_out", "gauge", "Connections in use.", [({}, status["checked_out"])]),
+        ("advisor_db_pool_overflow", "gauge", "Connections opened beyond the pool size.", [({}, max(status["overflow"], 0))]),
+    ]
+
+
+@registry.collector
+def _llm_metrics():
+    from .llm_service import cache_stats, coalescing_stats, guard_stats
+    families = []
+    cache = cache_stats()
+    if cache:
+        families.append(("advisor_llm_cache_lookups_total", "counter", "LLM response cache lookups by result.", [
+            ({"result": "memory_hit"}, cache["memory_hits"]),
+            ({"result": "disk_hit"}, cache["disk_hits"]),
+            ({"result": "miss"}, cache["misses"]),
+        ]))
+        families.append(("advisor_llm_cache_entries", "gauge", "Entries in the in-memory LLM cache.",
+                         [({}, cache["memory_entries"])]))
+    coalescing = coalescing_stats()
+    families.append(("advisor_llm_upstream_calls_total", "counter", "LLM calls made after coalescing.",
+                     [({"path": path}, stats["calls"]) for path, stats in coalescing.items()]))
+    families.append(("advisor_llm_coalesced_total", "counter", "Requests that shared another request's LLM call.",
+                     [({"path": path}, stats["coalesced"]) for path, stats in coalescing.items()]))
+    guard = guard_stats()
+    families.append(("advisor_llm_concurrency_limit", "gauge", "Current adaptive LLM concurrency limit.",
+                     [({}, guard["limiter"]["limit"])]))
+    families.append(("advisor_llm_in_flight", "gauge", "LLM calls in flight.", [({}, guard["limiter"]["in_flight"])]))
+    if guard["limiter"]["target_latency"] is not None:
+        families.append(("advisor_llm_target_latency_seconds", "gauge", "Latency above which LLM calls shrink the limit.",
+                         [({}, guard["limiter"]["target_latency"])]))
+    families.append(("advisor_llm_breaker_open", "gauge", "1 while the LLM circuit breaker is not closed.",
+                     [({}, int(guard["breaker"]["state"] != "closed"))]))
+    families.append(("advisor_llm_breaker_rejected_total", "counter", "Calls rejected by the open breaker.",
+                     [({}, guard["breaker"]["rejected"])]))
+    return families
+
+
+@registry.collector
+def _writer_metrics():
+    from .write_behind import recommendation_writer
+    status = recommendation_writer.status()
+    return [
+        ("advisor_writes_queued", "gauge", "Recommendations waiting in the write-behind queue.", [({}, status["queued"])]),
+        ("advisor_writes_spill_bytes", "gauge", "Size of this worker's write-behind spill file.", [({}, status["spill_bytes"])]),
+        ("advisor_writes_total", "counter", "Recommendation rows by write-behind outcome.", [
+            ({"outcome": outcome}, status[outcome])
+            for outcome in ("submitted", "written", "spilled", "dead_lettered")
+        ]),
+        ("advisor_write_failures_total", "counter", "Failed write-behind batch inserts.", [({}, status["failures"])]),
+    ]
+
+
+@registry.collector
+def _startup_metrics():
+    from .import_timing import import_timer
+    status = import_timer.status()
+    if status["cold_start_ms"] is None:
+        return []
+    return [
+        ("advisor_cold_start_seconds", "gauge", "Time from module load to the end of startup.",
+         [({}, status["cold_start_ms"] / 1000)]),
+        ("advisor_startup_import_seconds", "gauge", "Time spent importing modules during startup.",
+         [({}, status["import_ms"] / 1000)]),
+    ]
+
+
+def render() -> str:
+    return registry.render()
@@ -1,24 +1,74 @@
 """
-Cluster users by behavior and optionally persist cluster labels back to DB.
-Run with: python -m src.ml.cluster
+Cluster users by behavior and optionally persist cluster labels back to DB
+(user_clusters table, bulk upserted per chunk).
+
+Two training modes:
+- in memory (default): KMeans on the full feature matrix;
+- incremental (--incremental): feature rows are streamed from the DB in
+  CLUSTER_TRAIN_CHUNK_SIZE chunks, the scaler and a MiniBatchKMeans are
+  updated with partial_fit, and progress is checkpointed after every chunk
+  so an interrupted run resumes where it stopped.
+
+Training also exports the NumPy scoring artifacts the API loads; for a
+model trained elsewhere, `--export-scoring` writes them without retraining.
+
+Run with: python -m src.ml.cluster [--incremental] [--clusters N] [--chunk-size N] [--export-scoring]
 """
 
 from __future__ import annotations
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sqlalchemy import select
+import argparse
+import datetime
+import hashlib
 import joblib
+import json
 import pandas as pd
 import numpy as np
 import os
 
 # relative imports inside package
-from ..db import SessionLocal
-from ..models import User
+from ..db import engine, upsert_rows
+from ..feature_store import user_feature_column
+from ..models import User, UserCluster, UserTransactionFeatures
+from .scoring import FEATURE_COLS, FEATURE_DEFAULTS
 
 MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
 os.makedirs(MODEL_DIR, exist_ok=True)
 MODEL_PATH = os.path.join(MODEL_DIR, "kmeans_user_clusters.joblib")
 SCALER_PATH = os.path.join(MODEL_DIR, "scaler.joblib")
+WRITE_CHUNK_SIZE = int(os.getenv("CLUSTER_WRITE_CHUNK_SIZE", "10000"))
+TRAIN_CHUNK_SIZE = int(os.getenv("CLUSTER_TRAIN_CHUNK_SIZE", "50000"))
+CHECKPOINT_PATH = os.getenv("CLUSTER_CHECKPOINT_PATH", os.path.join(MODEL_DIR, "training_checkpoint.joblib"))
+
+
+def feature_query(after_user_id: int = 0):
+    """
+    Column-only SELECT of user_id + FEATURE_COLS, NULLs defaulted, ordered by
+    user_id. Transaction features come from the feature store when present.
+    """
+    columns = [user_feature_column(c, FEATURE_DEFAULTS.get(c, 0)) for c in FEATURE_COLS]
+    return (
+        select(User.user_id, *columns)
+        .outerjoin(UserTransactionFeatures, UserTransactionFeatures.user_id == User.user_id)
+        .where(User.user_id > after_user_id)
+        .order_by(User.user_id)
+    )
+
+
+def iter_user_features(chunk_size: int = TRAIN_CHUNK_SIZE, after_user_id: int = 0):
+    """
+    Yield feature DataFrames of at most chunk_size users, in user_id order,
+    starting after after_user_id. Rows are streamed with yield_per, so only
+    one chunk is held in memory.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(feature_query(after_user_id))
+        for rows in result.partitions():
+            df = pd.DataFrame(rows, columns=["user_id"] + FEATURE_COLS)
+            df[FEATURE_COLS] = df[FEATURE_COLS].astype(float)
+            yield df
 
 
 def get_user_features_df() -> pd.DataFrame:
@@ -26,27 +76,20 @@ def get_user_features_df() -> pd.DataFrame:
     Query users from DB and return feature dataframe.
     Must return a DataFrame with one row per user_id.
     """
-    session = SessionLocal()
-    users = session.query(User).all()
-    session.close()
-
-    rows = []
-    for u in users:
-        rows.append({
-            "user_id": u.user_id,
-            "monthly_income": float(u.monthly_income or 0),
-            "monthly_spending": float(u.monthly_spending or 0),
-            "savings": float(u.savings or 0),
-            "credit_score": float(u.credit_score or 650),
-            "spending_ratio": float(u.spending_ratio or 0),
-            "avg_transaction": float(u.avg_transaction or 0),
-            "transaction_count": int(u.transaction_count or 0),
-            "account_balance": float(u.account_balance or 0)
-        })
-
-    df = pd.DataFrame(rows)
-    if df.empty:
+    chunks = list(iter_user_features())
+    if not chunks:
         raise RuntimeError("No users found in DB to cluster.")
+    return pd.concat(chunks, ignore_index=True)
+
+
+def get_user_features_from_parquet(path: str = "data/clean_users.parquet") -> pd.DataFrame:
+    """
+    Read the feature columns straight from the cleaning pipeline's Parquet
+    output; no other columns are loaded.
+    """
+    df = pd.read_parquet(path, columns=["user_id"] + FEATURE_COLS)
+    if df.empty:
+        raise RuntimeError(f"No users found in {path} to cluster.")
     return df
 
 
@@ -54,9 +97,7 @@ def prepare_features(df: pd.DataFrame) -> tuple[pd.DataFrame, StandardScaler]:
     """
     Select and scale numeric features. Returns scaled array and scaler.
     """
-    feature_cols = ["monthly_income", "monthly_spending", "savings",
-                    "credit_score", "spending_ratio", "avg_transaction",
-                    "transaction_count", "account_balance"]
+    feature_cols = FEATURE_COLS
     # ensure columns exist
     for c in feature_cols:
         if c not in df.columns:
@@ -77,9 +118,28 @@ def train_kmeans(X_scaled: np.ndarray, n_clusters: int = 4) -> KMeans:
 def save_model_and_scaler(model: KMeans, scaler: StandardScaler):
     joblib.dump(model, MODEL_PATH)
     joblib.dump(scaler, SCALER_PATH)
+    export_scoring_artifacts(model, scaler)
     print("Saved model to", MODEL_PATH)
 
 
+def export_scoring_artifacts(model: KMeans, scaler: StandardScaler):
+    """
+    Write scaler mean/scale and centroids as one .npy matrix (plus a small
+    JSON sidecar) that the API memory-maps for sklearn-free scoring.
+    Both go through a temp file and os.replace, so a worker starting
+    meanwhile never maps a half-written matrix.
+    """
+    from .scoring import SCORING_PATH, SCORING_META_PATH
+    packed = np.vstack([scaler.mean_, scaler.scale_, model.cluster_centers_]).astype(np.float64)
+    with open(SCORING_PATH + ".tmp", "wb") as f:
+        np.save(f, packed)
+    with open(SCORING_META_PATH + ".tmp", "w") as f:
+        json.dump({"version": model_version(model), "features": FEATURE_COLS,
+                   "n_clusters": int(model.n_clusters)}, f)
+    os.replace(SCORING_PATH + ".tmp", SCORING_PATH)
+    os.replace(SCORING_META_PATH + ".tmp", SCORING_META_PATH)
+
+
 def load_model_and_scaler():
     if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH):
         return None, None
@@ -88,34 +148,146 @@ def load_model_and_scaler():
     return model, scaler
 
 
-def assign_clusters_to_db(df: pd.DataFrame, labels: np.ndarray, column_name: str = "cluster_id"):
+def model_version(model: KMeans) -> str:
+    """Short, stable id for a trained model, derived from its centroids."""
+    digest = hashlib.sha1(np.ascontiguousarray(model.cluster_centers_).tobytes()).hexdigest()
+    return f"kmeans{model.n_clusters}-{digest[:10]}"
+
+
+def assign_clusters_to_db(df: pd.DataFrame, labels: np.ndarray, version: str,
+                          distances: np.ndarray = None, chunk_size: int = WRITE_CHUNK_SIZE):
     """
-    Add labels as a textual column in users table (re-using loan_status or add new property).
-    For simplicity we will write cluster id into user's loan_status prefixed with 'cluster:'.
-    You can change to a dedicated column if you prefer (requires DB migration).
+    Upsert cluster labels into user_clusters, one executemany statement per
+    chunk, tagged with the model version that produced them.
     """
-    session = SessionLocal()
-    for uid, lab in zip(df["user_id"].tolist(), labels.tolist()):
-        user = session.query(User).filter(User.user_id == int(uid)).first()
-        if user:
-            # store cluster info safely; change this line if you have a dedicated column
-            user.loan_status = f"cluster:{int(lab)}"
-    session.commit()
-    session.close()
-    print("Cluster labels saved to DB (in users.loan_status).")
+    user_ids = df["user_id"].to_numpy()
+    if distances is None:
+        distances = np.full(len(user_ids), np.nan)
+    scored_at = datetime.datetime.utcnow()
+    table = UserCluster.__table__
+    for start in range(0, len(user_ids), chunk_size):
+        end = start + chunk_size
+        rows = [
+            {"user_id": int(uid), "cluster_id": int(lab),
+             "distance": None if np.isnan(dist) else float(dist),
+             "model_version": version, "scored_at": scored_at}
+            for uid, lab, dist in zip(user_ids[start:end], labels[start:end], distances[start:end])
+        ]
+        with engine.begin() as conn:
+            upsert_rows(conn, table, rows, "user_id")
+    print(f"Cluster labels saved to DB (user_clusters, {len(user_ids):,} users, {version}).")
 
 
-def run_training(n_clusters: int = 4):
-    df = get_user_features_df()
+def run_training(n_clusters: int = 4, features_path: str = None):
+    df = get_user_features_from_parquet(features_path) if features_path else get_user_features_df()
     X_scaled, scaler = prepare_features(df)
     model = train_kmeans(X_scaled, n_clusters=n_clusters)
     labels = model.predict(X_scaled)
+    distances = model.transform(X_scaled).min(axis=1)
     df["cluster"] = labels
     save_model_and_scaler(model, scaler)
-    assign_clusters_to_db(df, labels)
+    assign_clusters_to_db(df, labels, model_version(model), distances)
     return df, model, scaler
 
 
+def _load_checkpoint(path: str, n_clusters: int):
+    if not os.path.exists(path):
+        return None
+    state = joblib.load(path)
+    if state["n_clusters"] != n_clusters:
+        print(f"⚠️ Ignoring checkpoint for {state['n_clusters']} clusters: {path}")
+        return None
+    print(f"↩️ Resuming {state['phase']} pass after user_id {state['last_user_id']:,}")
+    return state
+
+
+def _save_checkpoint(path: str, state: dict):
+    """Write atomically so a crash mid-dump never leaves a corrupt checkpoint."""
+    tmp = path + ".tmp"
+    joblib.dump(state, tmp)
+    os.replace(tmp, path)
+
+
+def train_incremental(n_clusters: int = 4, chunk_size: int = TRAIN_CHUNK_SIZE,
+                      checkpoint_path: str = CHECKPOINT_PATH, resume: bool = True):
+    """
+    Fit the scaler and a MiniBatchKMeans without loading all users at once.
+    Pass 1 streams every chunk through StandardScaler.partial_fit; pass 2
+    streams them again, scaled, through MiniBatchKMeans.partial_fit. State is
+    checkpointed after each chunk (keyed on the last user_id seen).
+    """
+    state = _load_checkpoint(checkpoint_path, n_clusters) if resume else None
+    if state is None:
+        state = {
+            "n_clusters": n_clusters, "phase": "scaler", "last_user_id": 0, "rows": 0,
+            "scaler": StandardScaler(),
+            "model": MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3),
+        }
+
+    for phase in ("scaler", "kmeans"):
+        if phase == "scaler" and state["phase"] != "scaler":
+            continue
+        for df in iter_user_features(chunk_size, state["last_user_id"]):
+            X = df[FEATURE_COLS].to_numpy()
+            if phase == "scaler":
+                state["scaler"].partial_fit(X)
+            else:
+                X_scaled = state["scaler"].transform(X)
+                if not hasattr(state["model"], "cluster_centers_") and len(X_scaled) < n_clusters:
+                    raise RuntimeError(f"First chunk has fewer than {n_clusters} users; raise chunk_size.")
+                state["model"].partial_fit(X_scaled)
+            state["last_user_id"] = int(df["user_id"].iloc[-1])
+            state["rows"] += len(df)
+            _save_checkpoint(checkpoint_path, state)
+            print(f"   {phase}: {state['rows']:,} users")
+        if state["rows"] == 0:
+            raise RuntimeError("No users found in DB to cluster.")
+        if phase == "scaler":
+            state.update(phase="kmeans", last_user_id=0, rows=0)
+            _save_checkpoint(checkpoint_path, state)
+
+    model, scaler = state["model"], state["scaler"]
+    save_model_and_scaler(model, scaler)
+    os.remove(checkpoint_path)
+    return model, scaler
+
+
+def assign_clusters_streaming(model, scaler, chunk_size: int = TRAIN_CHUNK_SIZE) -> int:
+    """
+    Score users chunk by chunk and upsert their labels. Returns the number
+    scored. Chunks are read as keyset pages rather than one streamed cursor,
+    so no read stays open while labels are written (SQLite would lock).
+    """
+    version, total, last_user_id = model_version(model), 0, 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(feature_query(last_user_id).limit(chunk_size)).all()
+        if not rows:
+            return total
+        df = pd.DataFrame(rows, columns=["user_id"] + FEATURE_COLS)
+        X_scaled = scaler.transform(df[FEATURE_COLS].to_numpy(dtype=float))
+        distances = model.transform(X_scaled)
+        assign_clusters_to_db(df, distances.argmin(axis=1), version, distances.min(axis=1))
+        total += len(df)
+        last_user_id = int(df["user_id"].iloc[-1])
+
+
+def run_incremental_training(n_clusters: int = 4, chunk_size: int = TRAIN_CHUNK_SIZE, resume: bool = True):
+    model, scaler = train_incremental(n_clusters, chunk_size, resume=resume)
+    total = assign_clusters_streaming(model, scaler, chunk_size)
+    print(f"✅ Incremental clustering done: {total:,} users, {model_version(model)}")
+    return model, scaler
+
+
+def run_export_scoring():
+    """Export the scoring artifacts from the saved joblib model (no retraining)."""
+    model, scaler = load_model_and_scaler()
+    if model is None:
+        raise RuntimeError("No trained model found. Run training first.")
+    export_scoring_artifacts(model, scaler)
+    print(f"✅ Exported cluster scoring artifacts ({model_version(model)})")
+
+
 def run_predict_and_save():
     """Load model+scaler and score current users, then save labels to DB."""
     model, scaler = load_model_and_scaler()
@@ -123,19 +295,35 @@ def run_predict_and_save():
         raise RuntimeError("No trained model found. Run training first.")
     df = get_user_features_df()
     # prepare features but use existing scaler
-    feature_cols = ["monthly_income", "monthly_spending", "savings",
-                    "credit_score", "spending_ratio", "avg_transaction",
-                    "transaction_count", "account_balance"]
+    feature_cols = FEATURE_COLS
     X = df[feature_cols].fillna(0.0).astype(float)
     X_scaled = scaler.transform(X)
     labels = model.predict(X_scaled)
+    distances = model.transform(X_scaled).min(axis=1)
     df["cluster"] = labels
-    assign_clusters_to_db(df, labels)
+    assign_clusters_to_db(df, labels, model_version(model), distances)
     return df
 
 
 if __name__ == "__main__":
-    # Default behavior: train model and persist labels
+    parser = argparse.ArgumentParser(description="Cluster users and persist labels")
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--incremental", action="store_true",
+                        help="stream users from the DB with MiniBatchKMeans (resumable)")
+    parser.add_argument("--chunk-size", type=int, default=TRAIN_CHUNK_SIZE)
+    parser.add_argument("--no-resume", action="store_true", help="ignore any existing checkpoint")
+    parser.add_argument("--export-scoring", action="store_true",
+                        help="only write the API's scoring artifacts from the saved model")
+    args = parser.parse_args()
+
+    if args.export_scoring:
+        run_export_scoring()
+        raise SystemExit(0)
+
     print("Clustering users and persisting labels...")
-    df, model, scaler = run_training(n_clusters=4)
-    print(df[["user_id", "cluster"]].head())
\ No newline at end of file
+    if args.incremental:
+        run_incremental_training(args.clusters, args.chunk_size, resume=not args.no_resume)
+    else:
+        # Default behavior: train model and persist labels
+        df, model, scaler = run_training(n_clusters=args.clusters)
+        print(df[["user_id", "cluster"]].head())
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+In-process cluster scoring for the request path.
+
+The trained scaler and KMeans centroids are exported to a plain .npy matrix
+(see cluster.export_scoring_artifacts) and memory-mapped once at startup.
+Scoring is nearest-centroid math in NumPy, so sklearn is never imported
+while serving requests and nothing is written to the DB.
+"""
+import json
+import os
+
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
+SCORING_PATH = os.path.join(MODEL_DIR, "cluster_scoring.npy")
+SCORING_META_PATH = os.path.join(MODEL_DIR, "cluster_scoring.json")
+
+# Same order as cluster.FEATURE_COLS
+FEATURE_COLS = ["monthly_income", "monthly_spending", "savings",
+                "credit_score", "spending_ratio", "avg_transaction",
+                "transaction_count", "account_balance"]
+
+# Value used when a feature is NULL in the DB
+FEATURE_DEFAULTS = {"credit_score": 650}
+
+
+class ClusterScorer:
+    """Standardise a feature vector and return its nearest centroid."""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray, centroids: np.ndarray, version: str):
+        self.mean = mean
+        self.scale = scale
+        self.centroids = centroids
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str = SCORING_PATH, meta_path: str = SCORING_META_PATH):
+        """Memory-map exported artifacts. Returns None when nothing has been exported."""
+        if not os.path.exists(path) or not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("features") != FEATURE_COLS:
+            print(f"⚠️ Cluster scoring artifacts use different features; ignoring {path}")
+            return None
+        packed = np.load(path, mmap_mode="r")
+        # row 0: scaler mean, row 1: scaler scale, remaining rows: centroids
+        return cls(packed[0], packed[1], packed[2:], meta["version"])
+
+    def score_many(self, features: np.ndarray):
+        """Score an (n, d) matrix. Returns (cluster ids, distances)."""
+        scaled = (np.asarray(features, dtype=np.float64) - self.mean) / self.scale
+        dists = np.sqrt(((scaled[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2))
+        labels = dists.argmin(axis=1)
+        return labels, dists[np.arange(len(labels)), labels]
+
+    def score(self, features) -> tuple:
+        """Score one feature vector. Returns (cluster id, distance)."""
+        labels, dists = self.score_many(np.asarray(features, dtype=np.float64)[None, :])
+        return int(labels[0]), float(dists[0])
+
+
+_scorer = None
+
+
+def load_scorer():
+    """
+    Load the shared scorer (call once at startup). Artifacts are only written
+    by training or `python -m src.ml.cluster --export-scoring`; without them
+    profiles carry no cluster and /user/{id}/cluster answers 503.
+    """
+    global _scorer
+    scorer = ClusterScorer.load()
+    _scorer = scorer
+    if scorer is not None:
+        print(f"✅ Cluster scorer loaded ({scorer.version}, {len(scorer.centroids)} clusters).")
+    else:
+        print(f"⚠️ No cluster scoring artifacts in {MODEL_DIR}: clustering disabled. "
+              f"Run `python -m src.ml.cluster --export-scoring` (or train) to create them.")
+    return scorer
+
+
+def get_scorer():
+    """The scorer loaded at startup, or None when no model is available."""
+    return _scorer
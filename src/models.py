@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, Text
 from sqlalchemy.orm import relationship
 from .db import Base
 import datetime
@@ -18,6 +18,11 @@ class Recommendation(Base):
 
     user = relationship("User", back_populates="recommendations")
 
+    __table_args__ = (
+        # per-user history, newest first; rec_id breaks created_at ties for keyset paging
+        Index("ix_recommendations_user_id_created_at", "user_id", "created_at", "rec_id"),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -40,13 +45,16 @@ class User(Base):
     loans = relationship("Loan", back_populates="user", cascade="all, delete-orphan")
     transactions = relationship("Transaction", back_populates="user", cascade="all, delete-orphan")
     recommendations = relationship("Recommendation", back_populates="user", cascade="all, delete-orphan")
+    cluster = relationship("UserCluster", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    transaction_features = relationship("UserTransactionFeatures", back_populates="user", uselist=False,
+                                        cascade="all, delete-orphan")
 
 class Transaction(Base):
     __tablename__ = "transactions"
 
     transaction_id = Column(String, primary_key=True)  # ✅ was Integer before
-    user_id = Column(Integer, ForeignKey("users.user_id"))
-    date = Column(Date)
+    user_id = Column(Integer, ForeignKey("users.user_id"), index=True)
+    date = Column(Date, index=True)
     type = Column(String)
     amount = Column(Float)
     category = Column(String)
@@ -54,6 +62,7 @@ class Transaction(Base):
     merchant = Column(String)
     location = Column(String)
     balance_after = Column(Float)
+    loaded_at = Column(DateTime, index=True, default=datetime.datetime.utcnow)   # last written by a loader
 
     user = relationship("User", back_populates="transactions")
 
@@ -61,7 +70,8 @@ class Transaction(Base):
 class Loan(Base):
     __tablename__ = "loans"
 
-    loan_id = Column(Integer, primary_key=True, autoincrement=True)
+    # hash of the loan's content (see load_data); Integer on SQLite keeps it the rowid
+    loan_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
     loan_amount = Column(Float)
     interest_rate = Column(Float)
@@ -70,4 +80,49 @@ class Loan(Base):
     loan_status = Column(String)
     start_date = Column(String)
 
-    user = relationship("User", back_populates="loans")
\ No newline at end of file
+    user = relationship("User", back_populates="loans")
+
+
+class UserCluster(Base):
+    __tablename__ = "user_clusters"
+
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    cluster_id = Column(Integer, nullable=False, index=True)
+    distance = Column(Float)                        # distance to the assigned centroid (scaled space)
+    model_version = Column(String, nullable=False)  # which trained model produced the label
+    scored_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    user = relationship("User", back_populates="cluster")
+
+
+class UserTransactionFeatures(Base):
+    """Per-user transaction aggregates maintained by src.feature_store."""
+    __tablename__ = "user_transaction_features"
+
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    as_of = Column(Date, nullable=False)            # end date of the 30/90-day windows
+    transaction_count = Column(Integer, nullable=False)
+    avg_transaction = Column(Float)
+    debit_total = Column(Float)
+    credit_total = Column(Float)
+    spend_30d = Column(Float)
+    spend_90d = Column(Float)
+    avg_daily_spend_30d = Column(Float)
+    avg_daily_spend_90d = Column(Float)
+    spend_volatility_90d = Column(Float)            # std dev of daily spend over the 90-day window
+    category_spend_90d = Column(Text)               # JSON {category: debit total}
+    last_transaction_date = Column(Date)
+    refreshed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    user = relationship("User", back_populates="transaction_features")
+
+
+class FeatureRefreshState(Base):
+    """Watermark of the last feature-store refresh."""
+    __tablename__ = "feature_refresh_state"
+
+    name = Column(String, primary_key=True)
+    watermark = Column(Date)        # latest transaction date processed
+    loaded_through = Column(DateTime)   # latest transactions.loaded_at processed
+    as_of = Column(Date)            # window end date used by that refresh
+    refreshed_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -0,0 +1,333 @@
+"""
+Opt-in request profiler (PROFILING_ENABLED=1).
+
+ProfilingMiddleware traces every request while it runs:
+- the SQL statements it executes, with timings (capped at PROFILE_MAX_SQL);
+- the prompts it builds (template, estimated tokens, characters);
+- a wall-clock stack profile. A sampler thread wakes every PROFILE_INTERVAL
+  seconds. A request running on the event loop contributes its real stack
+  ([cpu]); a suspended one contributes the chain of coroutines it is awaiting
+  ([await]). Stacks are collected from the start for a PROFILE_SAMPLE_RATE
+  share of requests. For all other requests they start once the request is
+  older than half of PROFILE_SLOW_MS, so slow requests still show where the
+  time went.
+
+When a request finishes, its trace is kept if it was sampled or took at
+least PROFILE_SLOW_MS; otherwise it is dropped. Kept traces go into a ring
+buffer of PROFILE_BUFFER_SIZE entries. The buffer is served by the
+/admin/profiles endpoints (basic auth); stacks use the folded format read by
+flamegraph tools.
+
+When profiling is disabled, nothing is installed: no middleware, SQL hooks
+or thread. record_prompt() then costs only a contextvar lookup.
+"""
+import asyncio
+import collections
+import contextvars
+import datetime
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse, Response
+
+from .security import basic_auth
+
+load_dotenv()
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))   # share of requests profiled from the start
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "2000"))           # always keep requests at least this slow
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))        # seconds between stack samples
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "100"))      # traces kept for download
+PROFILE_MAX_SQL = int(os.getenv("PROFILE_MAX_SQL", "200"))              # statements recorded per request
+MAX_STATEMENT_LENGTH = 500
+EXCLUDED_PREFIXES = ("/admin/profiles", "/metrics")
+
+# Trace of the request being handled, None outside requests (and always when disabled)
+_current = contextvars.ContextVar("profiling_trace", default=None)
+_ids = itertools.count(1)
+
+
+class Trace:
+    def __init__(self, scope: dict, sampled: bool, frame, task):
+        self.id = next(_ids)
+        self.scope = scope
+        self.sampled = sampled
+        self.frame = frame          # the middleware frame: root of the request's stacks
+        self.task = task
+        self.started = time.perf_counter()
+        self.started_at = datetime.datetime.utcnow()
+        self.stacks = collections.Counter()
+        self.profile_from_ms = 0.0 if sampled else None
+        self.sql = []
+        self.sql_total = 0
+        self.sql_ms = 0.0
+        self.prompts = []
+        self.status = None
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def record(self, duration_ms: float) -> dict:
+        route = self.scope.get("route")
+        return {
+            "id": self.id,
+            "method": self.scope["method"],
+            "path": self.scope["path"],
+            "endpoint": getattr(route, "path", None),
+            "status": self.status,
+            "started_at": self.started_at.isoformat(timespec="milliseconds") + "Z",
+            "duration_ms": round(duration_ms, 2),
+            "reason": "slow" if duration_ms >= PROFILE_SLOW_MS else "sampled",
+            "profile_from_ms": self.profile_from_ms,
+            "samples": sum(self.stacks.values()),
+            "interval_ms": PROFILE_INTERVAL * 1000,
+            "stacks": dict(self.stacks.most_common()),
+            "sql": {"count": self.sql_total, "total_ms": round(self.sql_ms, 2), "statements": self.sql},
+            "prompts": self.prompts,
+        }
+
+
+# ---------------------------------------------------------------
+# Ring buffer
+# ---------------------------------------------------------------
+class RingBuffer:
+    def __init__(self, size: int):
+        self._items = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, item: dict):
+        with self._lock:
+            self._items.append(item)
+
+    def items(self) -> list:
+        with self._lock:
+            return list(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+buffer = RingBuffer(PROFILE_BUFFER_SIZE)
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------
+# Stack sampler
+# ---------------------------------------------------------------
+def _label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+def _running_stack(leaf, root) -> list:
+    """Frames from root down to leaf if root is on leaf's call stack, else None."""
+    frames = []
+    frame = leaf
+    while frame is not None:
+        frames.append(frame)
+        if frame is root:
+            return frames[::-1]
+        frame = frame.f_back
+    return None
+
+
+def _awaiting_stack(task, root) -> list:
+    """Frames of the coroutines a suspended task is awaiting, from root down."""
+    frames, seen_root = [], False
+    awaitable = task.get_coro() if task is not None else None
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "ag_frame", None) \
+            or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        seen_root = seen_root or frame is root
+        if seen_root:
+            frames.append(frame)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "ag_await", None) \
+            or getattr(awaitable, "gi_yieldfrom", None)
+    return frames
+
+
+class Sampler(threading.Thread):
+    def __init__(self, loop_thread_id: int, interval: float = PROFILE_INTERVAL):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with _inflight_lock:
+                traces = list(_inflight.values())
+            if traces:
+                self.sample(traces)
+
+    def sample(self, traces: list):
+        leaf = sys._current_frames().get(self.loop_thread_id)
+        watch_after = PROFILE_SLOW_MS / 2
+        for trace in traces:
+            if trace.profile_from_ms is None:
+                elapsed = trace.elapsed_ms()
+                if elapsed < watch_after:
+                    continue
+                trace.profile_from_ms = round(elapsed, 2)
+            try:
+                frames = _running_stack(leaf, trace.frame)
+                kind = "[cpu]"
+                if frames is None:
+                    frames, kind = _awaiting_stack(trace.task, trace.frame), "[await]"
+                trace.stacks[";".join([kind] + [_label(f) for f in frames])] += 1
+            except (AttributeError, RuntimeError, ValueError):
+                # the request finished or switched while we looked; skip this sample
+                continue
+
+
+_sampler = None
+
+
+# ---------------------------------------------------------------
+# Hooks
+# ---------------------------------------------------------------
+def record_prompt(rendered):
+    """Note a built prompt on the current trace (no-op outside a profiled request)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.prompts.append({
+            "template": rendered.tag, "tokens": rendered.tokens, "chars": len(rendered.text),
+            "trimmed": list(rendered.trimmed),
+        })
+
+
+def install_sql_hooks(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        trace = _current.get()
+        if trace is None or not conn.info.get("profiling_started"):
+            return
+        ms = (time.perf_counter() - conn.info["profiling_started"].pop()) * 1000
+        trace.sql_total += 1
+        trace.sql_ms += ms
+        if len(trace.sql) < PROFILE_MAX_SQL:
+            trace.sql.append({
+                "statement": " ".join(statement.split())[:MAX_STATEMENT_LENGTH],
+                "ms": round(ms, 3),
+                "at_ms": round(trace.elapsed_ms() - ms, 2),
+                "executemany": executemany,
+            })
+
+
+class ProfilingMiddleware:
+    """ASGI middleware tracing requests; keeps sampled and slow ones."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        global _sampler
+        if _sampler is None:
+            _sampler = Sampler(threading.get_ident())
+            _sampler.start()
+
+        trace = Trace(scope, random.random() < PROFILE_SAMPLE_RATE, sys._getframe(), asyncio.current_task())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+            await send(message)
+
+        token = _current.set(trace)
+        with _inflight_lock:
+            _inflight[trace.id] = trace
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            with _inflight_lock:
+                del _inflight[trace.id]
+            _current.reset(token)
+            duration_ms = trace.elapsed_ms()
+            trace.frame = trace.task = None
+            if trace.sampled or duration_ms >= PROFILE_SLOW_MS:
+                buffer.add(trace.record(duration_ms))
+
+
+def install(app, engine):
+    """Add the middleware and SQL hooks when PROFILING_ENABLED=1; otherwise do nothing."""
+    if not PROFILING_ENABLED:
+        return
+    app.add_middleware(ProfilingMiddleware)
+    install_sql_hooks(engine)
+    print(f"🔬 Request profiling on (sample {PROFILE_SAMPLE_RATE:.1%}, slow >= {PROFILE_SLOW_MS:g}ms)")
+
+
+def shutdown():
+    global _sampler
+    if _sampler is not None:
+        _sampler.stopped.set()
+        _sampler = None
+
+
+# ---------------------------------------------------------------
+# Admin endpoints
+# ---------------------------------------------------------------
+router = APIRouter(prefix="/admin/profiles", dependencies=[Depends(basic_auth)])
+
+
+def _summary(record: dict) -> dict:
+    return {key: record[key] for key in ("id", "method", "path", "status", "started_at", "duration_ms", "reason")} | {
+        "samples": record["samples"], "sql_count": record["sql"]["count"], "sql_ms": record["sql"]["total_ms"],
+    }
+
+
+@router.get("")
+async def list_profiles():
+    return {
+        "enabled": PROFILING_ENABLED,
+        "config": {"sample_rate": PROFILE_SAMPLE_RATE, "slow_ms": PROFILE_SLOW_MS,
+                   "interval_ms": PROFILE_INTERVAL * 1000, "buffer_size": PROFILE_BUFFER_SIZE},
+        "profiles": [_summary(record) for record in reversed(buffer.items())],
+    }
+
+
+@router.get("/download")
+async def download_profiles():
+    """Every trace in the buffer as one JSON file."""
+    body = json.dumps({"generated_at": datetime.datetime.utcnow().isoformat() + "Z", "profiles": buffer.items()})
+    filename = f"profiles-{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    return Response(body, media_type="application/json",
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.get("/{profile_id}/folded", response_class=PlainTextResponse)
+async def folded_stacks(profile_id: int):
+    """One trace's stacks in folded format ('frame;frame;... count' per line) for flamegraph tools."""
+    for record in buffer.items():
+        if record["id"] == profile_id:
+            return "".join(f"{stack} {count}\n" for stack, count in record["stacks"].items())
+    raise HTTPException(status_code=404, detail="Profile not found (it may have left the buffer)")
+
+
+@router.delete("")
+async def clear_profiles():
+    buffer.clear()
+    return {"cleared": True}
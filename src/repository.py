@@ -0,0 +1,178 @@
+# src/repository.py
+"""
+Read-side queries: UserProfile assembly and recommendation history.
+
+A profile is built in one round trip: the user's columns, an aggregate of
+their loans (count of all loans, as /recommend has always reported, and the
+monthly repayment on active ones) and their row in the transaction feature
+store, read as plain rows rather than ORM instances.
+When a cluster model is loaded the profiles are scored in memory as they are
+built.
+"""
+import base64
+import datetime
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .advisor_engine import UserProfile
+from .feature_store import top_categories, user_feature_column
+from .models import User, Loan, Recommendation, UserTransactionFeatures
+from .ml.scoring import FEATURE_COLS, FEATURE_DEFAULTS, get_scorer
+
+ACTIVE_LOAN_STATUS = "active"
+
+
+def profile_query(user_ids: list):
+    """SELECT for the profile rows of the given users."""
+    loans = (
+        select(
+            Loan.user_id,
+            # every loan counts, as len(user.loans) did; repayments only for active ones
+            func.count(Loan.loan_id).label("active_loans"),
+            func.sum(case((Loan.loan_status == ACTIVE_LOAN_STATUS, Loan.monthly_repayment))).label("loan_repayment"),
+        )
+        .group_by(Loan.user_id)
+        .subquery()
+    )
+    features = UserTransactionFeatures
+    return (
+        select(
+            User.user_id,
+            User.name,
+            User.occupation,
+            # profile figures and cluster features, NULLs defaulted as in training
+            *[user_feature_column(c, FEATURE_DEFAULTS.get(c, 0)) for c in FEATURE_COLS],
+            func.coalesce(loans.c.active_loans, 0).label("active_loans"),
+            func.coalesce(loans.c.loan_repayment, 0.0).label("loan_repayment"),
+            features.spend_30d,
+            features.spend_90d,
+            features.spend_volatility_90d,
+            features.category_spend_90d,
+        )
+        .outerjoin(loans, loans.c.user_id == User.user_id)
+        .outerjoin(features, features.user_id == User.user_id)
+        .where(User.user_id.in_(user_ids))
+    )
+
+
+def _rounded(value):
+    return None if value is None else round(value)
+
+
+def _to_profile(row, financial_goals: str) -> UserProfile:
+    return UserProfile(
+        user_id=row.user_id,
+        name=row.name,
+        user_type=row.occupation or "salary_earner",
+        monthly_income=row.monthly_income,
+        monthly_spending=row.monthly_spending,
+        savings_balance=row.savings,
+        credit_score=row.credit_score,
+        active_loans=int(row.active_loans),
+        financial_goals=financial_goals,
+        monthly_loan_repayment=float(row.loan_repayment),
+        spend_30d=_rounded(row.spend_30d),
+        spend_90d=_rounded(row.spend_90d),
+        spend_volatility=_rounded(row.spend_volatility_90d),
+        top_categories=top_categories(row.category_spend_90d),
+    )
+
+
+def _build_profiles(rows: list, financial_goals: str) -> dict:
+    profiles = {row.user_id: _to_profile(row, financial_goals) for row in rows}
+    scorer = get_scorer()
+    if scorer is not None and rows:
+        labels, distances = scorer.score_many([[getattr(row, c) for c in FEATURE_COLS] for row in rows])
+        for row, label, distance in zip(rows, labels, distances):
+            profiles[row.user_id].cluster_id = int(label)
+            profiles[row.user_id].cluster_distance = round(float(distance), 4)
+    return profiles
+
+
+async def get_profiles(db: AsyncSession, user_ids: list, financial_goals: str = "") -> dict:
+    """Return {user_id: UserProfile} for the users that exist."""
+    result = await db.execute(profile_query(user_ids))
+    return _build_profiles(result.all(), financial_goals)
+
+
+async def get_profile(db: AsyncSession, user_id: int, financial_goals: str = ""):
+    profiles = await get_profiles(db, [user_id], financial_goals)
+    return profiles.get(user_id)
+
+
+def get_profile_sync(session: Session, user_id: int, financial_goals: str = ""):
+    """Blocking variant for scripts and offline jobs."""
+    rows = session.execute(profile_query([user_id])).all()
+    return _build_profiles(rows, financial_goals).get(user_id)
+
+
+# ---------------------------------------------------------------
+# Recommendation history (keyset pagination, newest first)
+# ---------------------------------------------------------------
+HISTORY_FIELDS = ("rec_id", "created_at", "request_type", "model", "note", "prompt", "response")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime.datetime, rec_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{rec_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, rec_id = raw.split("|")
+        return datetime.datetime.fromisoformat(created_at), int(rec_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+
+def history_query(user_id: int, fields=HISTORY_FIELDS, request_type: str = None,
+                  since: datetime.datetime = None, until: datetime.datetime = None, cursor: str = None):
+    """
+    SELECT of only the requested columns (plus created_at/rec_id for the
+    cursor), served by the (user_id, created_at, rec_id) index.
+    """
+    columns = {name: getattr(Recommendation, name) for name in ("rec_id", "created_at", *fields)}
+    query = select(*columns.values()).where(Recommendation.user_id == user_id)
+    if request_type:
+        query = query.where(Recommendation.request_type == request_type)
+    if since:
+        query = query.where(Recommendation.created_at >= since)
+    if until:
+        query = query.where(Recommendation.created_at < until)
+    if cursor:
+        created_at, rec_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Recommendation.created_at < created_at,
+            and_(Recommendation.created_at == created_at, Recommendation.rec_id < rec_id),
+        ))
+    return query.order_by(Recommendation.created_at.desc(), Recommendation.rec_id.desc())
+
+
+def history_item(row, fields) -> dict:
+    item = {name: getattr(row, name) for name in fields}
+    if "created_at" in item and item["created_at"] is not None:
+        item["created_at"] = item["created_at"].isoformat()
+    return item
+
+
+async def user_exists(db: AsyncSession, user_id: int) -> bool:
+    result = await db.execute(select(User.user_id).where(User.user_id == user_id))
+    return result.first() is not None
+
+
+async def get_recommendation_page(db: AsyncSession, user_id: int, limit: int, fields=HISTORY_FIELDS, **filters) -> dict:
+    """One page of history: {"items": [...], "next_cursor": str | None}."""
+    result = await db.execute(history_query(user_id, fields, **filters).limit(limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].rec_id)
+    return {"items": [history_item(row, fields) for row in rows], "next_cursor": next_cursor}
@@ -0,0 +1,277 @@
+"""
+Overload protection for the LLM backend.
+
+- AdaptiveLimiter: caps concurrent upstream calls with AIMD. Each call that
+  finishes under the target latency raises the limit by 1/limit (about +1
+  per limit-full of calls); a slow call, timeout or error halves it, at most
+  once per window: calls that started before the last decrease were already
+  in flight at the old limit and do not shrink it again. The target is
+  LLM_TARGET_LATENCY seconds, or with "auto" (default) LLM_TARGET_FACTOR
+  times the median of recent successful calls, kept separately for whole
+  calls and for time to first streamed token. Until enough calls have been
+  seen, only timeouts and errors shrink the limit.
+- CircuitBreaker: after LLM_BREAKER_FAILURES consecutive failures the
+  breaker opens and calls fail immediately for LLM_BREAKER_RESET seconds,
+  then a single probe call decides whether it closes again.
+
+Both are shared by threads and the event loop, so state sits behind a
+threading.Lock and waiting for a slot polls briefly instead of blocking.
+"""
+import asyncio
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))                  # per-call deadline, seconds
+LLM_TARGET_LATENCY = os.getenv("LLM_TARGET_LATENCY", "auto")        # seconds, or "auto"; slower calls shrink the limit
+LLM_TARGET_FACTOR = float(os.getenv("LLM_TARGET_FACTOR", "2"))       # auto target = factor x recent median
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))     # successful calls the median is taken over
+LLM_LATENCY_MIN_SAMPLES = 20
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "16"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "2"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))      # seconds open before a probe
+# What callers do when the LLM is unavailable: "fallback" (canned answer, marked) or "fail" (HTTP 503)
+LLM_ON_UNAVAILABLE = os.getenv("LLM_ON_UNAVAILABLE", "fallback")
+
+_POLL_MIN, _POLL_MAX = 0.005, 0.05
+
+
+class LLMUnavailable(Exception):
+    """The LLM call was not made or did not complete. reason: circuit_open, overloaded, timeout or error."""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int = LLM_CONCURRENCY_INITIAL, min_limit: int = LLM_CONCURRENCY_MIN,
+                 max_limit: int = LLM_CONCURRENCY_MAX, target_latency=LLM_TARGET_LATENCY,
+                 target_factor: float = LLM_TARGET_FACTOR, window: int = LLM_LATENCY_WINDOW):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        # None = derived from recent latencies
+        self.target_latency = None if str(target_latency) == "auto" else float(target_latency)
+        self.target_factor = target_factor
+        self.latencies = {"call": collections.deque(maxlen=window), "first_token": collections.deque(maxlen=window)}
+        self.last_decrease = float("-inf")
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def target(self, kind: str = "call"):
+        """Latency above which a call counts as slow, or None while there is too little data."""
+        if self.target_latency is not None:
+            return self.target_latency
+        samples = self.latencies[kind]
+        if len(samples) < LLM_LATENCY_MIN_SAMPLES:
+            return None
+        return self.target_factor * sorted(samples)[len(samples) // 2]
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: float):
+        """Blocking acquire; raises LLMUnavailable('overloaded') after timeout."""
+        deadline, pause = time.monotonic() + timeout, _POLL_MIN
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                raise LLMUnavailable("overloaded", f"no LLM slot within {timeout:g}s")
+            time.sleep(pause)
+            pause = min(pause * 2, _POLL_MAX)
+
+    async def acquire_async(self, timeout: float):
+        deadline, pause = time.monotonic() + timeout, _POLL_MIN
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                raise LLMUnavailable("overloaded", f"no LLM slot within {timeout:g}s")
+            await asyncio.sleep(pause)
+            pause = min(pause * 2, _POLL_MAX)
+
+    def release(self, began: float, latency: float, ok, kind: str = "call"):
+        """
+        began: time.monotonic() when the call started. ok=None (call cancelled
+        by our caller) frees the slot without adjusting the limit.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if ok is None:
+                return
+            target = self.target(kind)
+            if ok:
+                self.latencies[kind].append(latency)
+            if ok and (target is None or latency <= target):
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif began >= self.last_decrease:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self.last_decrease = time.monotonic()
+
+    def status(self) -> dict:
+        target = self.target()
+        return {"limit": int(self.limit), "in_flight": self.in_flight,
+                "target_latency": round(target, 3) if target is not None else None}
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise LLMUnavailable('circuit_open') unless a call may go through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # this caller is the probe; another one may go if it never reports back
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return
+            self.rejected += 1
+        raise LLMUnavailable("circuit_open", "LLM backend marked unavailable")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"⚠️ LLM circuit breaker opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def status(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class Guard:
+    """Breaker + limiter + deadline around one upstream call."""
+
+    def __init__(self, limiter: AdaptiveLimiter = None, breaker: CircuitBreaker = None, timeout: float = LLM_TIMEOUT):
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        """Threads that run blocking calls, created on first use; at most one per possible slot."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.limiter.max_limit, thread_name_prefix="llm-call")
+            return self._executor
+
+    def _finish(self, began: float, ok):
+        self.limiter.release(began, time.monotonic() - began, ok)
+        if ok:
+            self.breaker.record_success()
+        elif ok is not None:
+            self.breaker.record_failure()
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Run a blocking call on the guard's threads and wait for it until the
+        deadline. fn also gets the remaining time as timeout=; a call that
+        ignores it is abandoned at the deadline, so the caller and the slot
+        are freed, and only its thread stays busy until it returns.
+        """
+        self.breaker.allow()
+        started = time.monotonic()
+        self.limiter.acquire(self.timeout)
+        remaining = max(self.timeout - (time.monotonic() - started), 0.1)
+        began, ok = time.monotonic(), False
+        try:
+            future = self._pool().submit(fn, *args, timeout=remaining, **kwargs)
+            result = future.result(timeout=remaining)
+            ok = True
+            return result
+        except FutureTimeoutError as e:
+            future.cancel()     # still queued behind abandoned calls: never start it
+            raise LLMUnavailable("timeout", f"no response within {self.timeout:g}s") from e
+        except Exception as e:
+            reason = "timeout" if "deadline" in type(e).__name__.lower() else "error"
+            raise LLMUnavailable(reason, str(e)) from e
+        finally:
+            self._finish(began, ok)
+
+    async def call_async(self, coro_fn, *args, **kwargs):
+        self.breaker.allow()
+        started = time.monotonic()
+        await self.limiter.acquire_async(self.timeout)
+        remaining = max(self.timeout - (time.monotonic() - started), 0.1)
+        began, ok = time.monotonic(), False
+        try:
+            result = await asyncio.wait_for(coro_fn(*args, **kwargs), remaining)
+            ok = True
+            return result
+        except asyncio.CancelledError:
+            ok = None
+            raise
+        except asyncio.TimeoutError as e:
+            raise LLMUnavailable("timeout", f"no response within {self.timeout:g}s") from e
+        except Exception as e:
+            raise LLMUnavailable("error", str(e)) from e
+        finally:
+            self._finish(began, ok)
+
+    async def stream(self, open_stream, *args, **kwargs):
+        """
+        Async generator over a streamed call. The deadline applies to the
+        first chunk (time to first token is what the limiter samples); the
+        slot is held until the stream ends.
+        """
+        self.breaker.allow()
+        started = time.monotonic()
+        await self.limiter.acquire_async(self.timeout)
+        remaining = max(self.timeout - (time.monotonic() - started), 0.1)
+        began, ok, first_latency = time.monotonic(), False, None
+        try:
+            chunks = (await asyncio.wait_for(open_stream(*args, **kwargs), remaining)).__aiter__()
+            first = await asyncio.wait_for(chunks.__anext__(), max(remaining - (time.monotonic() - began), 0.1))
+            first_latency = time.monotonic() - began
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            ok = True
+        except StopAsyncIteration:
+            ok = True
+        except (asyncio.CancelledError, GeneratorExit):
+            ok = None
+            raise
+        except asyncio.TimeoutError as e:
+            raise LLMUnavailable("timeout", f"no response within {self.timeout:g}s") from e
+        except Exception as e:
+            raise LLMUnavailable("error", str(e)) from e
+        finally:
+            self.limiter.release(began, first_latency if first_latency is not None else time.monotonic() - began, ok,
+                                 "first_token")
+            if ok:
+                self.breaker.record_success()
+            elif ok is not None:
+                self.breaker.record_failure()
+
+    def status(self) -> dict:
+        return {"limiter": self.limiter.status(), "breaker": self.breaker.status()}
@@ -28,6 +28,20 @@ class RecommendRequest(BaseModel):
 class RecommendResponse(BaseModel):
     products: List[dict] 
 
+class BatchAdviceRequest(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1)   # capped at BATCH_CONCURRENCY
+
+class ClusterResponse(BaseModel):
+    user_id: int
+    cluster_id: int
+    distance: float
+    model_version: str
+
+class RecommendationPage(BaseModel):
+    items: List[dict]
+    next_cursor: Optional[str] = None
+
 class UserBase(BaseModel):
     name: str
     email: EmailStr
@@ -0,0 +1,126 @@
+"""
+Fixed-size prompt summaries of transaction lists.
+
+Accepts TransactionIn models, dicts, ORM Transaction objects or DB rows and
+reduces them in one vectorized pass to inflow/outflow, category totals, top
+merchants, a spending trend and the largest outliers. The rendered block has
+a bounded number of lines and items whatever the input size, so large
+payloads cost a bounded number of prompt tokens.
+"""
+import os
+from operator import attrgetter
+
+import numpy as np
+import pandas as pd
+
+TX_SUMMARY_TOP_N = int(os.getenv("TX_SUMMARY_TOP_N", "5"))   # categories listed
+TX_SUMMARY_MERCHANTS = 3
+TX_SUMMARY_OUTLIERS = 3
+MAX_LABEL_LENGTH = 24
+OUTLIER_THRESHOLD = 3.5  # robust z-score (median/MAD) above which a debit is unusual
+
+FIELDS = ("date", "type", "amount", "category", "merchant")
+
+
+def _records(transactions) -> list:
+    """(date, type, amount, category, merchant) tuples; the accessor is picked once, not per row."""
+    first = transactions[0]
+    if isinstance(first, dict):
+        return [tuple(tx.get(name) for name in FIELDS) for tx in transactions]
+    if hasattr(first, "_mapping"):   # SQLAlchemy Row
+        return [tuple(tx._mapping.get(name) for name in FIELDS) for tx in transactions]
+    get = attrgetter(*FIELDS)          # TransactionIn or ORM Transaction
+    return [get(tx) for tx in transactions]
+
+
+def to_frame(transactions) -> pd.DataFrame:
+    """Columns date, credit, amount, category, merchant from any supported input."""
+    if isinstance(transactions, pd.DataFrame):
+        df = transactions.reindex(columns=list(FIELDS))
+    else:
+        df = pd.DataFrame.from_records(_records(transactions), columns=list(FIELDS))
+    return pd.DataFrame({
+        "date": pd.to_datetime(df["date"], errors="coerce"),
+        "credit": df["type"].astype(str).str.lower().eq("credit").to_numpy(),
+        "amount": pd.to_numeric(df["amount"], errors="coerce").fillna(0.0).abs(),
+        "category": df["category"].fillna("Unknown").astype(str).str.slice(0, MAX_LABEL_LENGTH),
+        "merchant": df["merchant"].fillna("Unknown").astype(str).str.slice(0, MAX_LABEL_LENGTH),
+    })
+
+
+def _money(value: float) -> str:
+    return f"{value:,.0f}"
+
+
+def _trend(debits: pd.DataFrame):
+    """Change in spending between the first and second half of the period, or None."""
+    dated = debits.dropna(subset=["date"])
+    if dated.empty:
+        return None
+    start, end = dated["date"].min(), dated["date"].max()
+    if (end - start).days < 2:
+        return None
+    late = (dated["date"] > start + (end - start) / 2).to_numpy()
+    first, second = dated["amount"].to_numpy()[~late].sum(), dated["amount"].to_numpy()[late].sum()
+    if first == 0:
+        return None
+    change = (second - first) / first * 100
+    if abs(change) < 1:
+        return "flat across the period"
+    direction = "up" if change >= 0 else "down"
+    return f"{direction} {abs(change):.0f}% in the second half of the period"
+
+
+def _outliers(debits: pd.DataFrame) -> pd.DataFrame:
+    amounts = debits["amount"].to_numpy()
+    if len(amounts) < 5:
+        return debits.iloc[:0]
+    median = np.median(amounts)
+    mad = np.median(np.abs(amounts - median))
+    if mad == 0:
+        return debits.iloc[:0]
+    score = 0.6745 * (amounts - median) / mad
+    return debits[score > OUTLIER_THRESHOLD].nlargest(TX_SUMMARY_OUTLIERS, "amount")
+
+
+def _describe(row) -> str:
+    when = "" if pd.isna(row.date) else f"{row.date:%Y-%m-%d} "
+    return f"{when}{row.category} at {row.merchant}: {_money(row.amount)}"
+
+
+def summarise_transactions(transactions, top_n: int = TX_SUMMARY_TOP_N) -> str:
+    """Render a bounded-size transaction summary block ('' when there are none)."""
+    if transactions is None or len(transactions) == 0:
+        return ""
+    df = to_frame(transactions)
+    debits = df[~df["credit"]]
+    inflow = df["amount"].to_numpy()[df["credit"].to_numpy()].sum()
+    outflow = debits["amount"].sum()
+
+    period = ""
+    if df["date"].notna().any():
+        period = f", {df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d}"
+    lines = [
+        f"Transaction summary ({len(df):,} transactions{period}):",
+        f"- Inflow: {_money(inflow)} | Outflow: {_money(outflow)} | Net: {_money(inflow - outflow)}",
+    ]
+
+    if outflow > 0:
+        by_category = debits.groupby("category", sort=False)["amount"].sum().nlargest(top_n)
+        lines.append("- Spending by category: " + ", ".join(
+            f"{name} {_money(total)} ({total / outflow:.0%})" for name, total in by_category.items()
+        ))
+        by_merchant = debits.groupby("merchant", sort=False)["amount"].sum().nlargest(TX_SUMMARY_MERCHANTS)
+        lines.append("- Top merchants: " + ", ".join(
+            f"{name} {_money(total)}" for name, total in by_merchant.items()
+        ))
+
+    trend = _trend(debits)
+    if trend:
+        lines.append(f"- Spending trend: {trend}")
+
+    outliers = _outliers(debits)
+    if not outliers.empty:
+        lines.append("- Largest unusual debits: " + "; ".join(_describe(row) for row in outliers.itertuples()))
+
+    return "\n".join(lines)
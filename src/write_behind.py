@@ -0,0 +1,379 @@
+"""
+Write-behind queue for recommendation rows.
+
+Request handlers hand finished recommendations to `recommendation_writer`
+and return without waiting for the DB. A single background task inserts
+them in batches of WRITE_BATCH_SIZE rows or every WRITE_FLUSH_INTERVAL
+seconds, whichever comes first, in submission order (so per-user order is
+kept).
+
+When the in-memory queue is full (DB slow or down) rows are appended to a
+JSONL spill file of at most WRITE_SPILL_MAX_BYTES; once spilling starts all
+new rows go to the file until it has been drained, which keeps ordering.
+If the spill file is full too, submit() waits for room. On shutdown the
+queue is flushed; rows that still cannot be written stay in the spill file
+and are replayed on the next start.
+
+Each worker process spills to its own file (WRITE_SPILL_PATH with the pid
+inserted before the extension), so workers never read or remove each
+other's rows. At start a worker claims the files of processes that are no
+longer running by renaming them, which only one claimant can win, and
+replays them before its own.
+
+Errors that retrying cannot fix (IntegrityError, DataError: a deleted user,
+a value the column rejects) fail the batch once; its rows are then written
+one at a time and those that still fail go to the WRITE_DEAD_LETTER_PATH
+JSONL file with the error, so one bad row never blocks the rows behind it.
+"""
+import asyncio
+import datetime
+import glob
+import json
+import os
+import re
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy.exc import DataError, IntegrityError
+
+from .crud import save_recommendations_bulk
+from .db import AsyncSessionLocal
+from . import metrics
+
+load_dotenv()
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "1") == "1"
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "200"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "0.5"))       # seconds
+WRITE_QUEUE_MAX = int(os.getenv("WRITE_QUEUE_MAX", "10000"))
+WRITE_SPILL_PATH = os.getenv("WRITE_SPILL_PATH", ".cache/recommendations_spill.jsonl")
+WRITE_SPILL_MAX_BYTES = int(os.getenv("WRITE_SPILL_MAX_BYTES", str(64 * 1024 * 1024)))
+WRITE_DEAD_LETTER_PATH = os.getenv("WRITE_DEAD_LETTER_PATH", ".cache/recommendations_dead_letter.jsonl")
+WRITE_SHUTDOWN_TIMEOUT = float(os.getenv("WRITE_SHUTDOWN_TIMEOUT", "10"))  # seconds
+RETRY_MAX_DELAY = 5.0
+PERMANENT_ERRORS = (IntegrityError, DataError)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SpillFile:
+    """Append-only JSONL buffer of one process, read back from a moving offset."""
+
+    def __init__(self, base_path: str, max_bytes: int, pid: int = None):
+        self.base_path = base_path
+        self.pid = pid or os.getpid()
+        self.root, self.ext = os.path.splitext(base_path)
+        self.path = f"{self.root}.{self.pid}{self.ext}"
+        self.max_bytes = max_bytes
+        self.offset = 0
+
+    def _orphans(self) -> list:
+        """Spill files left by processes that are gone (or by an earlier process with our pid)."""
+        pattern = re.compile(re.escape(self.root) + r"\.(\d+)(?:\.claim-\d+)?" + re.escape(self.ext) + "$")
+        orphans = [self.base_path] if os.path.exists(self.base_path) else []   # pre-pid single file
+        for path in glob.glob(f"{glob.escape(self.root)}.*{glob.escape(self.ext)}"):
+            match = pattern.match(path)
+            if not match or path == self.path:
+                continue
+            owner = int(match.group(1))
+            if owner == self.pid or not _pid_alive(owner):
+                orphans.append(path)
+        stamped = []
+        for path in orphans:
+            try:
+                stamped.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue    # claimed by another worker since the glob
+        return [path for _, path in sorted(stamped)]
+
+    def claim_orphans(self) -> int:
+        """Move rows of dead processes' spill files into ours; returns the number of files claimed."""
+        claimed = 0
+        for orphan in self._orphans():
+            claim = orphan
+            if not orphan.startswith(f"{self.root}.{self.pid}.claim-"):
+                claim = f"{self.root}.{self.pid}.claim-{time.time_ns()}{self.ext}"
+                try:
+                    os.rename(orphan, claim)     # atomic: a worker racing us for the same file gets ENOENT
+                except FileNotFoundError:
+                    continue
+            with open(claim, "r", encoding="utf-8") as f:
+                self.append(f.readlines())
+            os.remove(claim)
+            claimed += 1
+        return claimed
+
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def pending(self) -> bool:
+        return self.size() > self.offset
+
+    def has_room(self, line: str) -> bool:
+        return self.size() + len(line) <= self.max_bytes
+
+    def append(self, lines: list):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    def read(self, limit: int) -> list:
+        """Up to limit lines from the current offset (the offset is advanced by commit())."""
+        lines = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            f.seek(self.offset)
+            for line in f:
+                lines.append(line)
+                if len(lines) >= limit:
+                    break
+        return lines
+
+    def prepend(self, lines: list):
+        """Put lines before everything still unread (used at shutdown)."""
+        rest = self.read_all() if self.pending() else []
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.writelines(lines + rest)
+        self.offset = 0
+
+    def read_all(self) -> list:
+        with open(self.path, "r", encoding="utf-8") as f:
+            f.seek(self.offset)
+            return f.readlines()
+
+    def commit(self, lines: list):
+        self.offset += sum(len(line.encode("utf-8")) for line in lines)
+        if self.offset >= self.size():
+            os.remove(self.path)
+            self.offset = 0
+
+
+def _encode(row: dict) -> str:
+    return json.dumps({**row, "created_at": row["created_at"].isoformat()}) + "\n"
+
+
+def _decode(line: str) -> dict:
+    row = json.loads(line)
+    row["created_at"] = datetime.datetime.fromisoformat(row["created_at"])
+    return row
+
+
+class RecommendationWriter:
+    def __init__(self, batch_size: int = WRITE_BATCH_SIZE, flush_interval: float = WRITE_FLUSH_INTERVAL,
+                 queue_max: int = WRITE_QUEUE_MAX, spill_path: str = WRITE_SPILL_PATH,
+                 spill_max_bytes: int = WRITE_SPILL_MAX_BYTES, enabled: bool = WRITE_BEHIND_ENABLED,
+                 dead_letter_path: str = WRITE_DEAD_LETTER_PATH):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_max = queue_max
+        self.spill = SpillFile(spill_path, spill_max_bytes)
+        self.enabled = enabled
+        self.dead_letter_path = dead_letter_path
+        self.queue = None
+        self.task = None
+        self.room = None
+        self.closing = False
+        self.inflight = []
+        self.stats = {"submitted": 0, "written": 0, "spilled": 0, "batches": 0, "failures": 0, "dead_lettered": 0}
+
+    # -----------------------------------------------------------
+    # Producer side
+    # -----------------------------------------------------------
+    async def submit(self, user_id: int, prompt: str, response: str, request_type: str = "analyze",
+                     model: str = "gemini", note: str = None):
+        """Queue one recommendation. created_at is the submit time, not the insert time."""
+        row = {
+            "user_id": user_id, "prompt": prompt, "response": response, "request_type": request_type,
+            "model": model, "note": note, "created_at": datetime.datetime.utcnow(),
+        }
+        self.stats["submitted"] += 1
+        if not self.enabled or self.task is None:
+            await self._write([row])
+            return
+        # once rows are on disk, newer rows follow them there so ordering holds
+        if not self.spill.pending():
+            try:
+                self.queue.put_nowait(row)
+                return
+            except asyncio.QueueFull:
+                pass
+        line = _encode(row)
+        while not self.spill.has_room(line) and not self.closing:
+            self.room.clear()
+            await self.room.wait()
+        self.spill.append([line])
+        self.stats["spilled"] += 1
+
+    # -----------------------------------------------------------
+    # Flusher
+    # -----------------------------------------------------------
+    async def _write(self, rows: list):
+        with metrics.stage("recommendation_commit"):
+            async with AsyncSessionLocal() as session:
+                await save_recommendations_bulk(session, rows)
+
+    def _dead_letter(self, row: dict, error: Exception):
+        error = getattr(error, "orig", None) or error     # the driver's message, without the SQL
+        os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+        line = json.dumps({**json.loads(_encode(row)), "error": f"{type(error).__name__}: {error}"}) + "\n"
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(line)
+        self.stats["dead_lettered"] += 1
+        print(f"☠️ Recommendation for user {row['user_id']} moved to {self.dead_letter_path}: {error}")
+
+    async def _write_rows_singly(self, rows: list, attempts: int = None) -> int:
+        """After a permanent error: write rows one by one, dead-lettering those that fail for good."""
+        for done, row in enumerate(rows):
+            try:
+                await self._write([row])
+                self.stats["written"] += 1
+            except PERMANENT_ERRORS as e:
+                self._dead_letter(row, e)
+            except Exception:
+                # transient again: retry this row like any batch
+                if not await self._write_with_retry([row], attempts):
+                    return done
+        return len(rows)
+
+    async def _write_with_retry(self, rows: list, attempts: int = None) -> int:
+        """
+        Retry transient errors with backoff until written, the writer is closing,
+        or attempts run out. Returns how many leading rows were written or
+        dead-lettered; the caller keeps the rest.
+        """
+        delay, attempt = 0.1, 0
+        while True:
+            attempt += 1
+            try:
+                await self._write(rows)
+                self.stats["written"] += len(rows)
+                self.stats["batches"] += 1
+                return len(rows)
+            except PERMANENT_ERRORS as e:
+                self.stats["failures"] += 1
+                print(f"⚠️ Recommendation write rejected ({len(rows)} rows), writing them one by one: {e}")
+                if len(rows) == 1:
+                    self._dead_letter(rows[0], e)
+                    return 1
+                return await self._write_rows_singly(rows, attempts)
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"⚠️ Recommendation write failed ({len(rows)} rows): {e}")
+                if self.closing or (attempts and attempt >= attempts):
+                    return 0
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    async def _next_batch(self) -> list:
+        """Wait up to flush_interval for a first row, then collect until batch_size or the deadline."""
+        loop = asyncio.get_running_loop()
+        try:
+            batch = [await asyncio.wait_for(self.queue.get(), self.flush_interval)]
+        except asyncio.TimeoutError:
+            return []
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _drain_spill(self, attempts: int = None) -> bool:
+        while self.spill.pending():
+            lines = self.spill.read(self.batch_size)
+            done = await self._write_with_retry([_decode(line) for line in lines], attempts)
+            self.spill.commit(lines[:done])
+            self.room.set()
+            if done < len(lines):
+                return False
+        return True
+
+    async def _run(self):
+        while not self.closing:
+            # queued rows are always older than spilled ones, so the queue goes first
+            if self.queue.empty() and self.spill.pending():
+                await self._drain_spill()
+                continue
+            self.inflight = await self._next_batch()
+            if self.inflight:
+                del self.inflight[:await self._write_with_retry(self.inflight)]
+
+    # -----------------------------------------------------------
+    # Lifecycle
+    # -----------------------------------------------------------
+    def start(self):
+        if not self.enabled or self.task is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_max)
+        self.room = asyncio.Event()
+        self.closing = False
+        self.inflight = []
+        if self.spill.pid != os.getpid():
+            # created before a fork: spill to this worker's own file
+            self.spill = SpillFile(self.spill.base_path, self.spill.max_bytes)
+        claimed = self.spill.claim_orphans()
+        if claimed:
+            print(f"↩️ Claimed {claimed} spill file(s) left by stopped workers")
+        if self.spill.pending():
+            print(f"↩️ Replaying spilled recommendations from {self.spill.path}")
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = WRITE_SHUTDOWN_TIMEOUT):
+        """
+        Flush everything that is queued, in order. Rows that cannot be
+        written are put back at the head of the spill file for the next start.
+        """
+        if self.task is None:
+            return
+        self.closing = True
+        self.room.set()
+        try:
+            # lets an in-progress write finish; a failing one gives up at the next retry
+            await asyncio.wait_for(asyncio.shield(self.task), timeout)
+        except asyncio.TimeoutError:
+            self.task.cancel()
+        self.task = None
+
+        rows = list(self.inflight)
+        while not self.queue.empty():
+            rows.append(self.queue.get_nowait())
+        written = 0
+        while written < len(rows):
+            batch = rows[written:written + self.batch_size]
+            done = await self._write_with_retry(batch, attempts=1)
+            written += done
+            if done < len(batch):
+                break
+        rows = rows[written:]
+        if rows:
+            self.spill.prepend([_encode(row) for row in rows])
+            print(f"⚠️ {len(rows)} recommendations kept in {self.spill.path} for the next start")
+        elif not await self._drain_spill(attempts=1):
+            print(f"⚠️ Spilled recommendations kept in {self.spill.path} for the next start")
+
+    def status(self) -> dict:
+        return {
+            **self.stats,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "spill_bytes": self.spill.size(),
+        }
+
+
+recommendation_writer = RecommendationWriter()
@@ -0,0 +1,93 @@
+"""
+Test settings. They must be in the environment before any src module is
+imported: load_dotenv() never overrides them, so .env's Postgres URL and
+API key are not used.
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+_work_dir = tempfile.mkdtemp(prefix="advisor-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_work_dir, 'test.db')}"
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["LLM_CACHE_ENABLED"] = "0"
+os.environ["FAKE_LLM_LATENCY"] = "fixed:0"
+os.environ["FAKE_LLM_TOKEN_RATE"] = "0"
+os.environ["WRITE_SPILL_PATH"] = os.path.join(_work_dir, "spill.jsonl")
+os.environ["WRITE_DEAD_LETTER_PATH"] = os.path.join(_work_dir, "dead_letter.jsonl")
+
+
+_TABLES = ("recommendations", "feature_refresh_state", "user_transaction_features", "user_clusters", "transactions", "loans", "users")
+
+
+@pytest.fixture
+def database():
+    """
+    Migrated, empty SQLite database. The async engine is disposed after each
+    test: its pool belongs to that test's event loop.
+    """
+    from sqlalchemy import text
+    from src.db import async_engine, engine, init_db
+    init_db()
+    with engine.begin() as conn:
+        for table in _TABLES:
+            conn.execute(text(f"DELETE FROM {table}"))
+    yield engine
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def users(database):
+    """
+    Two users. Ada (1) has an active and a repaid loan, Ben (2) has none.
+    """
+    from src.models import Loan, User
+    with database.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"user_id": 1, "name": "Ada", "email": "ada@example.com", "occupation": "salary_earner",
+             "monthly_income": 400000.0, "monthly_spending": 200000.0, "savings": 90000.0, "credit_score": 700},
+            {"user_id": 2, "name": "Ben", "email": "ben@example.com", "occupation": "student",
+             "monthly_income": 50000.0, "monthly_spending": 45000.0, "savings": 2000.0, "credit_score": 610},
+        ])
+        conn.execute(Loan.__table__.insert(), [
+            {"loan_id": 1, "user_id": 1, "loan_amount": 500000.0, "monthly_repayment": 20000.0, "loan_status": "active"},
+            {"loan_id": 2, "user_id": 1, "loan_amount": 100000.0, "monthly_repayment": 9000.0, "loan_status": "repaid"},
+        ])
+    return database
+
+
+@pytest.fixture
+def client(users):
+    """TestClient with the app started (writer, fake LLM) and API credentials set."""
+    from fastapi.testclient import TestClient
+    from src.app import app
+    from src.security import API_PASS, API_USER
+    with TestClient(app) as client:
+        client.auth = (API_USER, API_PASS)
+        yield client
+
+
+@pytest.fixture
+def llm_backend():
+    """
+    Install a FakeBackend with the given options for one test:
+    llm_backend(error_rate=1). The test also gets a fresh Guard, so breaker
+    state does not leak between tests.
+    """
+    from src import llm_service
+    from src.llm_backends import FakeBackend
+    from src.resilience import Guard
+    previous, previous_guard = llm_service.get_backend(), llm_service.guard
+    llm_service.guard = Guard()
+
+    def install(**options):
+        backend = FakeBackend(**{"latency": "fixed:0", "token_rate": 0, **options})
+        llm_service.set_backend(backend)
+        return backend
+
+    yield install
+    llm_service.set_backend(previous)
+    llm_service.guard = previous_guard
@@ -0,0 +1,54 @@
+import json
+
+from sqlalchemy import text
+
+
+def _lines(response) -> list:
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_recommend_batch_streams_one_line_per_distinct_user(client, users, llm_backend):
+    backend = llm_backend()
+    response = client.post("/recommend/batch", json={"user_ids": [1, 99, 1, 2]})
+    assert response.status_code == 200
+    lines = _lines(response)
+
+    # unknown ids are reported first, then results in completion order
+    assert lines[0] == {"user_id": 99, "status": "not_found"}
+    assert sorted(line["user_id"] for line in lines[1:]) == [1, 2]
+    assert all(line["status"] == "ok" and line["products"][0]["rationale"] for line in lines[1:])
+    assert backend.calls == 2
+
+
+def test_batch_results_are_saved_through_the_writer(users, llm_backend):
+    from fastapi.testclient import TestClient
+    from src.app import app
+    from src.security import API_PASS, API_USER
+
+    llm_backend()
+    with TestClient(app) as client:
+        client.post("/analyze/batch", json={"user_ids": [2, 1]}, auth=(API_USER, API_PASS))
+    # shutdown drains the write-behind queue
+    with users.connect() as conn:
+        rows = conn.execute(text("SELECT user_id, request_type FROM recommendations ORDER BY user_id")).all()
+    assert [tuple(row) for row in rows] == [(1, "analyze"), (2, "analyze")]
+
+
+def test_failed_llm_calls_are_flagged_as_fallback(client, llm_backend):
+    llm_backend(error_rate=1)
+    lines = _lines(client.post("/analyze/batch", json={"user_ids": [1, 2]}))
+    assert {line["status"] for line in lines} == {"fallback"}
+    assert all(line["recommendations"] for line in lines)
+
+
+def test_oversized_batches_are_rejected(client, monkeypatch):
+    from src import app as app_module
+    monkeypatch.setattr(app_module, "BATCH_MAX_USERS", 2)
+    response = client.post("/recommend/batch", json={"user_ids": [1, 2, 3]})
+    assert response.status_code == 400
+
+
+def test_batch_requires_credentials(client):
+    response = client.post("/recommend/batch", json={"user_ids": [1]}, auth=("nobody", "wrong"))
+    assert response.status_code == 401
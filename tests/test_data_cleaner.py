@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from sqlalchemy import create_engine, text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _raw_files(raw_dir):
+    raw_dir.mkdir()
+    (raw_dir / "users.csv").write_text(textwrap.dedent("""\
+        user_id,name,email,occupation,monthly_income,monthly_spending,savings,credit_score
+        1, Ada ,ada@example.com,salary_earner,400000,200000,90000,700
+        2,Ben,ben@example.com,student,50000,45000,2000,610
+        2,Ben,ben@example.com,student,50000,45000,2000,610
+    """))
+    (raw_dir / "transactions.csv").write_text(textwrap.dedent("""\
+        transaction_id,user_id,date,type,amount,category,merchant
+        t1,1,2026-01-02,debit,1200,Food,Shop
+        t2,1,2026-01-03,debit,800,,
+        t3,9,2026-01-03,debit,100,Food,Shop
+    """))
+    # the duplicate loan falls in the next chunk (chunk size 2)
+    (raw_dir / "loans.csv").write_text(textwrap.dedent("""\
+        user_id,loan_amount,interest_rate,tenure_months,monthly_repayment,loan_status,start_date
+        1,500000,12.5,24,20000,active,2025-01-01
+        2,,,,,repaid,
+        1,500000,12.5,24,20000,active,2025-01-01
+    """))
+
+
+def test_pipeline_runs_against_its_target_without_database_url(tmp_path):
+    _raw_files(tmp_path / "raw")
+    target = f"sqlite:///{tmp_path / 'clean.db'}"
+    script = "import sys; from src.dev.data_cleaner import run_pipeline; run_pipeline(*sys.argv[1:4], chunk_size=2)"
+    env = {**os.environ, "DATABASE_URL": "", "PYTHONPATH": ROOT}
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(tmp_path / "raw"), str(tmp_path / "out"), target],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+
+    with create_engine(target).connect() as conn:
+        count = lambda table: conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+        assert (count("users"), count("transactions"), count("loans")) == (2, 2, 2)
+        assert conn.execute(text("SELECT name FROM users WHERE user_id = 1")).scalar() == "Ada"
+        assert conn.execute(text("SELECT category FROM transactions WHERE transaction_id = 't2'")).scalar() == "Unknown"
+        assert count("user_transaction_features") == 1
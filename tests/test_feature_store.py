@@ -0,0 +1,61 @@
+import datetime
+
+import pandas as pd
+from sqlalchemy import text
+
+from src.dev.load_data import load_table
+from src.feature_store import refresh_features
+from src.models import Transaction
+
+AS_OF = datetime.date(2026, 3, 10)
+
+
+def _load(*rows):
+    df = pd.DataFrame(rows, columns=["transaction_id", "user_id", "date", "type", "amount", "category"])
+    load_table(Transaction.__table__, None, "transaction_id", chunks=[df])
+
+
+def _features(engine) -> list:
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text(
+            "SELECT user_id, transaction_count, debit_total, spend_30d, spend_90d, category_spend_90d "
+            "FROM user_transaction_features ORDER BY user_id"
+        ))]
+
+
+def test_incremental_refresh_picks_up_back_dated_transactions(users):
+    _load(("t1", 1, "2026-03-05", "debit", 100.0, "Food"))
+    assert refresh_features(AS_OF) == 1
+
+    # loaded after the refresh, but dated before its watermark
+    _load(("t2", 2, "2026-02-01", "debit", 40.0, "Transport"),
+          ("t3", 1, "2026-03-01", "debit", 25.0, "Food"))
+    assert refresh_features(AS_OF) == 2
+    incremental = _features(users)
+
+    refresh_features(AS_OF, full=True)
+    assert _features(users) == incremental
+    assert [row[:3] for row in incremental] == [(1, 2, 125.0), (2, 1, 40.0)]
+
+
+def test_amended_transactions_are_recomputed(users):
+    _load(("t1", 1, "2026-03-05", "debit", 100.0, "Food"))
+    refresh_features(AS_OF)
+    _load(("t1", 1, "2026-03-05", "debit", 150.0, "Food"))
+    assert refresh_features(AS_OF) == 1
+    assert _features(users)[0][2] == 150.0
+
+
+def test_nothing_new_recomputes_nobody(users):
+    _load(("t1", 1, "2026-03-05", "debit", 100.0, "Food"))
+    refresh_features(AS_OF)
+    assert refresh_features(AS_OF) == 0
+
+
+def test_transactions_sliding_out_of_a_window_are_recomputed(users):
+    _load(("t1", 1, "2026-03-05", "debit", 100.0, "Food"),
+          ("t2", 2, "2026-03-09", "debit", 10.0, "Food"))
+    refresh_features(AS_OF)
+    # t1 is 30 days old on April 4th; t2 is still inside the window
+    assert refresh_features(datetime.date(2026, 4, 4)) == 1
+    assert _features(users)[0][3] == 0.0
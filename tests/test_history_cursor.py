@@ -0,0 +1,55 @@
+import asyncio
+import base64
+import datetime
+
+import pytest
+
+from src.crud import save_recommendations_bulk
+from src.db import AsyncSessionLocal
+from src.repository import InvalidCursor, decode_cursor, encode_cursor, get_recommendation_page
+
+
+@pytest.mark.parametrize("created_at", [
+    datetime.datetime(2026, 3, 1, 9, 30),
+    datetime.datetime(2026, 3, 1, 9, 30, 0, 123456),
+])
+def test_cursor_round_trip(created_at):
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"2026-03-01T09:30:00").decode(),          # no rec_id
+    base64.urlsafe_b64encode(b"2026-03-01T09:30:00|x").decode(),        # rec_id not a number
+    base64.urlsafe_b64encode(b"yesterday|3").decode(),                  # not a timestamp
+    base64.urlsafe_b64encode(b"2026-03-01T09:30:00|1|2").decode(),      # extra part
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),                   # not UTF-8
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_history_once_newest_first_with_timestamp_ties(database):
+    # pairs of rows share a created_at, so the rec_id tie-breaker decides page boundaries
+    base = datetime.datetime(2026, 3, 1, 9, 0)
+    rows = [
+        {"user_id": 1, "prompt": "p", "response": f"r{i}", "created_at": base + datetime.timedelta(minutes=i // 2)}
+        for i in range(7)
+    ]
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await save_recommendations_bulk(session, rows)
+        seen, cursor = [], None
+        async with AsyncSessionLocal() as session:
+            while True:
+                page = await get_recommendation_page(session, 1, 2, ("rec_id", "response"), cursor=cursor)
+                seen.extend(item["response"] for item in page["items"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    return seen
+
+    assert asyncio.run(run()) == [f"r{i}" for i in (6, 5, 4, 3, 2, 1, 0)]
@@ -0,0 +1,64 @@
+import asyncio
+import random
+
+import pytest
+
+from src.llm_backends import FakeBackend, FakeBackendError, FakeDeadlineExceeded, create_backend, parse_distribution
+
+
+def _fake(**options) -> FakeBackend:
+    return FakeBackend(**{"latency": "fixed:0", "token_rate": 0, "error_rate": 0, "hang_rate": 0, **options})
+
+
+def test_answers_depend_only_on_the_prompt():
+    a, b = _fake(seed=1), _fake(seed=2)
+    assert a.generate("prompt", 0.6) == b.generate("prompt", 0.1)
+    assert a.text_for("prompt") != a.text_for("another prompt")
+    assert len(a.text_for("prompt").split()) == a.response_tokens
+
+
+def test_streamed_pieces_join_to_the_whole_answer():
+    backend = _fake(response_tokens=30)
+
+    async def run():
+        return "".join([piece async for piece in await backend.open_stream("prompt", 0.6)])
+
+    assert asyncio.run(run()) == backend.text_for("prompt")
+    assert backend.calls == 1
+
+
+def test_same_seed_gives_the_same_failures_and_latencies():
+    def plan(seed):
+        backend = _fake(latency="lognormal:0.8,0.5", error_rate=0.3, hang_rate=0.1, seed=seed)
+        return [backend._plan() for _ in range(50)]
+
+    assert plan(7) == plan(7)
+    assert plan(7) != plan(8)
+    outcomes = {outcome for _, outcome in plan(7)}
+    assert outcomes == {"ok", "error", "hang"}
+
+
+def test_injected_errors_and_hangs_raise():
+    with pytest.raises(FakeBackendError):
+        _fake(error_rate=1).generate("prompt", 0.6)
+    with pytest.raises(FakeDeadlineExceeded):
+        _fake(hang_rate=1).generate("prompt", 0.6, timeout=0.01)
+
+
+@pytest.mark.parametrize("spec, low, high", [
+    ("fixed:0.5", 0.5, 0.5),
+    ("uniform:1,2", 1, 2),
+    ("normal:0.1,5", 0, float("inf")),
+    ("lognormal:0.8,0.5", 0, float("inf")),
+])
+def test_latency_distributions(spec, low, high):
+    sample, rng = parse_distribution(spec), random.Random(0)
+    assert all(low <= sample(rng) <= high for _ in range(200))
+
+
+def test_unknown_names_are_rejected():
+    with pytest.raises(ValueError):
+        parse_distribution("poisson:3")
+    with pytest.raises(ValueError):
+        create_backend("gpt")
+    assert isinstance(create_backend(" Fake "), FakeBackend)
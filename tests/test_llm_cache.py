@@ -0,0 +1,54 @@
+import time
+
+from src.llm_cache import DiskCache, LRUCache, TieredCache, make_key
+
+
+def test_key_depends_on_model_and_temperature():
+    key = make_key("prompt", "model-a", 0.2)
+    assert key == make_key("prompt", "model-a", 0.2)
+    assert key != make_key("prompt", "model-b", 0.2)
+    assert key != make_key("prompt", "model-a", 0.3)
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")                     # "b" is now the oldest
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_their_ttl(tmp_path):
+    memory = LRUCache(max_entries=10, ttl=60)
+    disk = DiskCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    memory.set("k", "v", ttl=0.01)
+    disk.set("k", "v", ttl=0.01)
+    time.sleep(0.02)
+    assert memory.get("k") is None and disk.get("k") is None
+    assert memory.expirations == 1 and disk.expirations == 1
+    assert disk.purge_expired() == 1
+
+
+def test_disk_hits_are_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache(LRUCache(), DiskCache(path)).set("k", "advice")
+
+    # a second worker shares the disk tier but starts with an empty memory tier
+    other = TieredCache(LRUCache(), DiskCache(path))
+    assert other.get("k") == "advice"
+    assert other.get("k") == "advice"
+    assert other.get("missing") is None
+    stats = other.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["memory_entries"] == 1
+
+
+def test_memory_only_cache_counts_misses():
+    cache = TieredCache(LRUCache())
+    assert cache.get("k") is None
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+    assert cache.stats()["misses"] == 1
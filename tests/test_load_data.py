@@ -0,0 +1,67 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+from src.dev.data_cleaner import content_hash
+from src.dev.load_data import iter_chunks, load_table
+from src.models import Loan
+
+LOAN_COLUMNS = ["user_id", "loan_amount", "interest_rate", "tenure_months", "monthly_repayment", "loan_status",
+                "start_date"]
+
+
+def _loans_csv(tmp_path) -> str:
+    path = tmp_path / "loans.csv"
+    path.write_text(
+        ",".join(LOAN_COLUMNS) + "\n"
+        "1,1500,12.5,24,75,active,2025-01-01\n"
+        "2,900,9,12,,repaid,\n"
+    )
+    return str(path)
+
+
+def _loans_parquet(tmp_path) -> str:
+    # the same two loans as the CSV, with the dtypes a Parquet writer typically picks
+    table = pa.table({
+        "user_id": pa.array([1, 2], pa.int32()),
+        "loan_amount": pa.array([1500.0, 900.0]),
+        "interest_rate": pa.array([12.5, 9.0]),
+        "tenure_months": pa.array([24, 12], pa.int64()),
+        "monthly_repayment": pa.array([75, None], pa.int64()),
+        "loan_status": pa.array(["active", "repaid"]).dictionary_encode(),
+        "start_date": pa.array(["2025-01-01", None]).dictionary_encode(),
+    })
+    path = tmp_path / "loans.parquet"
+    pq.write_table(table, path)
+    return str(path)
+
+
+def _read(path: str) -> pd.DataFrame:
+    return pd.concat(iter_chunks(path, Loan.__table__), ignore_index=True)
+
+
+def test_same_loan_hashes_the_same_from_csv_and_parquet(tmp_path):
+    from_csv = _read(_loans_csv(tmp_path))
+    from_parquet = _read(_loans_parquet(tmp_path))
+    assert from_csv.dtypes.to_dict() != from_parquet.dtypes.to_dict()
+    assert content_hash(from_csv, LOAN_COLUMNS).tolist() == content_hash(from_parquet, LOAN_COLUMNS).tolist()
+
+
+def test_timestamps_at_midnight_hash_like_date_strings():
+    as_text = pd.DataFrame({"start_date": ["2025-01-01", None]})
+    as_timestamps = pd.DataFrame({"start_date": pd.to_datetime(["2025-01-01", None])})
+    assert content_hash(as_text).tolist() == content_hash(as_timestamps).tolist()
+
+
+def test_hash_still_tells_different_loans_apart():
+    df = pd.DataFrame({"user_id": [1, 1, 1], "loan_amount": [1500.0, 1500.5, None]})
+    assert content_hash(df).nunique() == 3
+
+
+def test_reloading_from_another_format_does_not_duplicate_loans(tmp_path, users):
+    load_table(Loan.__table__, _loans_csv(tmp_path), "loan_id")
+    load_table(Loan.__table__, _loans_parquet(tmp_path), "loan_id")
+    with users.connect() as conn:
+        rows = conn.execute(text("SELECT user_id, loan_status FROM loans WHERE loan_id > 2 ORDER BY user_id")).all()
+    assert [tuple(row) for row in rows] == [(1, "active"), (2, "repaid")]
@@ -0,0 +1,73 @@
+import re
+
+from src.metrics import Histogram, Registry
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+
+def _samples(text: str) -> dict:
+    """{'name{labels}': value} of an exposition; fails on any line that is not valid."""
+    samples, declared = {}, set()
+    for line in text.splitlines():
+        if line.startswith("# HELP ") or line.startswith("# TYPE "):
+            declared.add(line.split()[2])
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"not a valid sample line: {line!r}"
+        name = match.group(1)
+        family = re.sub(r"_(bucket|sum|count)$", "", name)
+        assert name in declared or family in declared, f"{name} has no HELP/TYPE"
+        samples[name + (match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, "a")
+    text = "\n".join(histogram.render())
+    assert text.startswith("# HELP demo_seconds Demo.\n# TYPE demo_seconds histogram\n")
+    assert _samples(text) == {
+        'demo_seconds_bucket{stage="a",le="0.1"}': 1,
+        'demo_seconds_bucket{stage="a",le="1"}': 3,
+        'demo_seconds_bucket{stage="a",le="+Inf"}': 4,
+        'demo_seconds_sum{stage="a"}': 4.25,
+        'demo_seconds_count{stage="a"}': 4,
+    }
+
+
+def test_label_values_are_escaped():
+    histogram = Histogram("demo_seconds", "Demo.", ("path",), buckets=(1,))
+    histogram.observe(0.5, 'say "hi"\\\n')
+    assert 'path="say \\"hi\\"\\\\\\n"' in "\n".join(histogram.render())
+
+
+def test_a_failing_collector_does_not_break_the_scrape():
+    registry = Registry()
+
+    @registry.collector
+    def broken():
+        raise RuntimeError("down")
+
+    @registry.collector
+    def working():
+        return [("demo_up", "gauge", "Demo.", [({"kind": "x"}, 1)])]
+
+    assert _samples(registry.render()) == {'demo_up{kind="x"}': 1}
+
+
+def test_metrics_endpoint_reports_requests_by_route_template(client, llm_backend):
+    llm_backend()
+    assert client.post("/recommend", json={"user_id": 1}).status_code == 200
+    client.get("/user/2/cluster")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = _samples(response.text)
+    assert samples['advisor_request_duration_seconds_count{endpoint="/recommend",method="POST",status="200"}'] >= 1
+    assert any(key.startswith('advisor_request_duration_seconds_count{endpoint="/user/{user_id}/cluster"')
+               for key in samples)
+    stages = {re.search(r'stage="([^"]+)"', key).group(1) for key in samples
+              if key.startswith('advisor_stage_duration_seconds_count{endpoint="/recommend"')}
+    assert {"profile_query", "prompt_build", "llm_call", "save_enqueue"} <= stages
+    assert "advisor_llm_concurrency_limit" in samples and 'advisor_writes_total{outcome="submitted"}' in samples
@@ -0,0 +1,63 @@
+from dataclasses import replace
+
+from src.advisor_engine import ProfileBucketer, UserProfile, personalise_response
+
+bucketer = ProfileBucketer.from_spec()
+
+
+def _profile(**overrides) -> UserProfile:
+    base = UserProfile(
+        user_id=1, name="Ada", user_type="salary_earner", monthly_income=412345.0,
+        monthly_spending=201234.0, savings_balance=90123.0, credit_score=700,
+        active_loans=1, financial_goals="Buy a house",
+    )
+    return replace(base, **overrides)
+
+
+def test_near_identical_profiles_share_a_bucket():
+    a, vector_a = bucketer.bucket(_profile())
+    b, vector_b = bucketer.bucket(_profile(user_id=2, monthly_income=413999.0, credit_score=704))
+    assert vector_a == vector_b
+    assert (a.monthly_income, a.credit_score) == (b.monthly_income, b.credit_score)
+
+
+def test_distant_profiles_do_not_share_a_bucket():
+    _, vector_a = bucketer.bucket(_profile())
+    _, vector_b = bucketer.bucket(_profile(monthly_income=600000.0))
+    assert vector_a != vector_b
+
+
+def test_bucketing_is_idempotent():
+    bucketed, vector = bucketer.bucket(_profile())
+    again, vector_again = bucketer.bucket(bucketed)
+    assert vector_again == vector
+    assert again == bucketed
+
+
+def test_int_and_float_values_render_the_same_centre():
+    assert bucketer.bucket_value("monthly_income", 336000) == bucketer.bucket_value("monthly_income", 336000.0)
+
+
+def test_missing_fields_are_left_alone():
+    bucketed, vector = bucketer.bucket(_profile(spend_30d=None))
+    assert bucketed.spend_30d is None
+    assert None in vector
+
+
+def test_personalise_writes_exact_figures_back():
+    exact = _profile()
+    bucketed, _ = bucketer.bucket(exact)
+    advice = (f"With an income of {bucketed.monthly_income:,.0f} and savings of "
+              f"{bucketed.savings_balance:.0f}, aim to save 20,000 a month.")
+    personalised = personalise_response(advice, bucketed, exact)
+    assert "412,345" in personalised
+    assert "90123" in personalised
+    # amounts the model derived itself are not bucket centres and stay as written
+    assert "20,000" in personalised
+
+
+def test_personalise_leaves_ambiguous_centres():
+    # income and spending share the centre 100,000 but differ exactly: no safe swap
+    exact = _profile(monthly_income=101000.0, monthly_spending=100500.0)
+    bucketed = replace(exact, monthly_income=100000.0, monthly_spending=100000.0)
+    assert personalise_response("Spend under 100,000.", bucketed, exact) == "Spend under 100,000."
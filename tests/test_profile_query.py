@@ -0,0 +1,51 @@
+import asyncio
+
+from sqlalchemy.orm import Session
+
+from src.db import AsyncSessionLocal
+from src.models import Loan, User
+from src.repository import get_profile_sync, get_profiles
+
+
+def test_every_loan_is_counted_but_only_active_ones_are_repaid(users):
+    with Session(users) as session:
+        profile = get_profile_sync(session, 1, "Buy a house")
+    assert profile.active_loans == 2
+    assert profile.monthly_loan_repayment == 20000.0
+    assert (profile.name, profile.monthly_income, profile.financial_goals) == ("Ada", 400000.0, "Buy a house")
+
+
+def test_users_without_loans_or_features_get_zeros(users):
+    with Session(users) as session:
+        profile = get_profile_sync(session, 2)
+    assert (profile.active_loans, profile.monthly_loan_repayment) == (0, 0.0)
+    assert profile.spend_30d is None and profile.top_categories == ""
+
+
+def test_only_repaid_loans_still_count(users):
+    with users.begin() as conn:
+        conn.execute(Loan.__table__.insert(), [
+            {"loan_id": 3, "user_id": 2, "monthly_repayment": 4000.0, "loan_status": "repaid"},
+        ])
+    with Session(users) as session:
+        profile = get_profile_sync(session, 2)
+    assert (profile.active_loans, profile.monthly_loan_repayment) == (1, 0.0)
+
+
+def test_missing_columns_fall_back_to_training_defaults(users):
+    with users.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"user_id": 3, "name": "Cy"}])
+    with Session(users) as session:
+        profile = get_profile_sync(session, 3)
+    assert profile.user_type == "salary_earner"
+    assert profile.credit_score == 650 and profile.monthly_income == 0
+
+
+def test_batch_lookup_returns_only_existing_users(users):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            return await get_profiles(session, [2, 1, 99], "Improve savings")
+
+    profiles = asyncio.run(run())
+    assert sorted(profiles) == [1, 2]
+    assert profiles[1].active_loans == 2 and profiles[2].active_loans == 0
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from src import profiling
+from src.advisor_engine import RenderedPrompt
+from src.security import API_PASS, API_USER
+
+
+@pytest.fixture
+def profiled_client(monkeypatch):
+    """A small app with the profiler installed the way profiling.install() does it."""
+    engine = create_engine("sqlite://")
+    profiling.install_sql_hooks(engine)
+    app = FastAPI()
+    app.add_middleware(profiling.ProfilingMiddleware)
+    app.include_router(profiling.router)
+
+    @app.get("/work/{n}")
+    async def work(n: int):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT :n"), {"n": n})
+        profiling.record_prompt(RenderedPrompt("x" * 40, "savings", "abcd1234", 10, ("activity",)))
+        await asyncio.sleep(0.05)
+        return {"n": n}
+
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    profiling.buffer.clear()
+    with TestClient(app) as client:
+        client.auth = (API_USER, API_PASS)
+        yield client
+    profiling.shutdown()
+    profiling.buffer.clear()
+
+
+def test_sampled_requests_are_listed_with_sql_prompts_and_stacks(profiled_client):
+    profiled_client.get("/work/7")
+    listing = profiled_client.get("/admin/profiles").json()
+    assert len(listing["profiles"]) == 1     # the admin request itself is not traced
+    summary = listing["profiles"][0]
+    assert (summary["path"], summary["status"], summary["reason"], summary["sql_count"]) == ("/work/7", 200, "sampled", 1)
+    assert summary["samples"] > 0
+
+    download = profiled_client.get("/admin/profiles/download")
+    assert download.headers["content-disposition"].startswith('attachment; filename="profiles-')
+    record = download.json()["profiles"][0]
+    assert record["endpoint"] == "/work/{n}"
+    assert record["sql"]["statements"][0]["statement"] == "SELECT ?"
+    assert record["prompts"] == [{"template": "savings@abcd1234", "tokens": 10, "chars": 40, "trimmed": ["activity"]}]
+
+
+def test_folded_stacks_are_served_per_profile(profiled_client):
+    profiled_client.get("/work/1")
+    profile_id = profiled_client.get("/admin/profiles").json()["profiles"][0]["id"]
+    folded = profiled_client.get(f"/admin/profiles/{profile_id}/folded").text.splitlines()
+    assert folded
+    for line in folded:
+        stack, count = line.rsplit(" ", 1)
+        assert stack.split(";")[0] in ("[cpu]", "[await]") and int(count) > 0
+    assert profiled_client.get(f"/admin/profiles/{profile_id + 1000}/folded").status_code == 404
+
+
+def test_fast_unsampled_requests_are_dropped(profiled_client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.0)
+    profiled_client.get("/work/1")
+    assert profiled_client.get("/admin/profiles").json()["profiles"] == []
+
+    monkeypatch.setattr(profiling, "PROFILE_SLOW_MS", 10)
+    profiled_client.get("/work/2")
+    assert [p["reason"] for p in profiled_client.get("/admin/profiles").json()["profiles"]] == ["slow"]
+
+
+def test_buffer_can_be_cleared_and_requires_credentials(profiled_client):
+    profiled_client.get("/work/1")
+    assert profiled_client.get("/admin/profiles", auth=("nobody", "wrong")).status_code == 401
+    assert profiled_client.delete("/admin/profiles").json() == {"cleared": True}
+    assert profiled_client.get("/admin/profiles").json()["profiles"] == []
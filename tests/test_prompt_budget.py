@@ -0,0 +1,66 @@
+from dataclasses import replace
+
+import pytest
+
+from src.advisor_engine import AdvisorEngine, CompiledTemplate, UserProfile, estimate_tokens
+
+
+def _profile(**overrides) -> UserProfile:
+    base = UserProfile(
+        user_id=1, name="Ada", user_type="salary_earner", monthly_income=400000.0,
+        monthly_spending=200000.0, savings_balance=90000.0, credit_score=700,
+        active_loans=1, financial_goals="Buy a house",
+        spend_30d=180000, spend_90d=560000, spend_volatility=4200, top_categories="Food, Transport",
+    )
+    return replace(base, **overrides)
+
+
+def test_a_zero_budget_keeps_every_section():
+    rendered = AdvisorEngine(token_budget=0).render(_profile(), "savings", sections=(("summary", "S" * 40, 50),))
+    assert rendered.trimmed == ()
+    # caller sections first, then the profile's activity
+    assert rendered.text.index("S" * 40) < rendered.text.index("Food, Transport")
+    assert rendered.tag.startswith("savings@")
+
+
+def test_lowest_priority_sections_go_first_and_order_is_kept():
+    engine = AdvisorEngine(token_budget=0)
+    low, high = ("low", "L" * 400, 5), ("high", "H" * 400, 50)
+    body = engine.render(_profile(spend_90d=None), "savings").text
+
+    # room for the body and one section only: the low-priority one is dropped
+    engine.token_budget = estimate_tokens("\n\n".join([body, high[1]]))
+    rendered = engine.render(_profile(spend_90d=None), "savings", sections=(low, high))
+    assert rendered.trimmed == ("low",)
+    assert rendered.text == "\n\n".join([body, high[1]])
+    assert rendered.tokens <= engine.token_budget
+
+
+def test_activity_section_is_trimmed_before_higher_priority_sections():
+    engine = AdvisorEngine(token_budget=0)
+    full = engine.render(_profile(), "savings", sections=(("summary", "S" * 40, 50),))
+    engine.token_budget = full.tokens - 1
+    rendered = engine.render(_profile(), "savings", sections=(("summary", "S" * 40, 50),))
+    assert rendered.trimmed == ("activity",)
+    assert "Food, Transport" not in rendered.text and rendered.text.endswith("S" * 40)
+
+
+def test_main_template_is_never_cut():
+    engine = AdvisorEngine(token_budget=1)
+    rendered = engine.render(_profile(), "loan", sections=(("summary", "S" * 40, 50),))
+    assert set(rendered.trimmed) == {"summary", "activity"}
+    assert rendered.text == AdvisorEngine(token_budget=0).render(_profile(spend_90d=None), "loan").text
+    assert rendered.tokens > engine.token_budget
+
+
+def test_template_version_follows_its_text():
+    a = CompiledTemplate("t", "  Income: {monthly_income:,.0f}\n\n\n\n  Goal: {financial_goals}  ")
+    b = CompiledTemplate("t", "Income: {monthly_income:,.0f}\n\nGoal: {financial_goals}")
+    assert a.text == b.text and a.version == b.version
+    assert a.render({"monthly_income": 1234.5, "financial_goals": "x"}) == "Income: 1,234\n\nGoal: x"
+    assert CompiledTemplate("t", "Income: {monthly_income}").version != a.version
+
+
+def test_unknown_request_type_is_rejected():
+    with pytest.raises(ValueError):
+        AdvisorEngine().render(_profile(), "mortgage")
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.resilience import AdaptiveLimiter, CircuitBreaker, Guard, LLMUnavailable
+
+
+# ---------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+        breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(LLMUnavailable) as raised:
+        breaker.allow()
+    assert raised.value.reason == "circuit_open"
+    assert breaker.status()["rejected"] == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_probe_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    breaker.allow()                    # this caller is the probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(LLMUnavailable):
+        breaker.allow()                # everyone else waits for the probe
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.allow()
+
+
+def test_half_open_probe_reopens_on_failure():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.01)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.02)
+    breaker.allow()
+    breaker.record_failure()           # a single failed probe is enough
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(LLMUnavailable):
+        breaker.allow()
+
+
+# ---------------------------------------------------------------
+# Adaptive limiter
+# ---------------------------------------------------------------
+def test_limit_grows_by_about_one_per_window_of_fast_calls():
+    limiter = AdaptiveLimiter(initial=4, target_latency=1)
+    for _ in range(4):
+        assert limiter.try_acquire()
+        limiter.release(time.monotonic(), 0.1, True)
+    assert 4.9 < limiter.limit < 5
+
+
+def test_calls_beyond_the_limit_are_refused():
+    limiter = AdaptiveLimiter(initial=2, min_limit=1, target_latency=1)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    with pytest.raises(LLMUnavailable) as raised:
+        limiter.acquire(timeout=0.02)
+    assert raised.value.reason == "overloaded"
+
+
+def test_a_window_of_slow_calls_halves_the_limit_once():
+    limiter = AdaptiveLimiter(initial=16, min_limit=2, target_latency=1)
+    began = time.monotonic()
+    for _ in range(16):
+        limiter.try_acquire()
+    for _ in range(16):
+        limiter.release(began, 5, True)
+    assert limiter.limit == 8
+    # calls started after the decrease count again
+    limiter.try_acquire()
+    limiter.release(time.monotonic(), 5, False)
+    assert limiter.limit == 4
+
+
+def test_cancelled_calls_do_not_move_the_limit():
+    limiter = AdaptiveLimiter(initial=4, target_latency=1)
+    limiter.try_acquire()
+    limiter.release(time.monotonic(), 30, None)
+    assert limiter.limit == 4 and limiter.in_flight == 0
+
+
+def test_auto_target_follows_recent_latency():
+    limiter = AdaptiveLimiter(initial=8, target_latency="auto", target_factor=2)
+    assert limiter.target() is None
+    limiter.try_acquire()
+    limiter.release(time.monotonic(), 40, True)    # no data yet: slow but successful is not penalised
+    assert limiter.limit > 8
+    for _ in range(30):
+        limiter.try_acquire()
+        limiter.release(time.monotonic(), 20, True)
+    assert limiter.target() == 40
+    assert limiter.target("first_token") is None    # streams are judged on their own samples
+
+
+# ---------------------------------------------------------------
+# Guard
+# ---------------------------------------------------------------
+def test_guard_turns_timeouts_and_errors_into_llm_unavailable():
+    guard = Guard(AdaptiveLimiter(initial=4, target_latency=1), CircuitBreaker(failure_threshold=2), timeout=0.05)
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    async def boom():
+        raise RuntimeError("500")
+
+    async def run():
+        reasons = []
+        for fn in (hang, boom, boom):
+            try:
+                await guard.call_async(fn)
+            except LLMUnavailable as e:
+                reasons.append(e.reason)
+        return reasons
+
+    assert asyncio.run(run()) == ["timeout", "error", "circuit_open"]
+    assert guard.limiter.in_flight == 0
+
+
+def test_sync_calls_that_ignore_the_deadline_are_abandoned():
+    guard = Guard(AdaptiveLimiter(initial=4, target_latency=1), CircuitBreaker(failure_threshold=5), timeout=0.05)
+    release = threading.Event()
+
+    def ignores_timeout(prompt, timeout=None):
+        release.wait(5)
+        return "late"
+
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailable) as raised:
+        guard.call(ignores_timeout, "prompt")
+    assert raised.value.reason == "timeout"
+    assert time.monotonic() - started < 1
+    assert guard.limiter.in_flight == 0 and guard.breaker.failures == 1
+    release.set()
+
+    # calls still get the remaining deadline (at least 0.1s) to honour themselves
+    assert guard.call(lambda prompt, timeout=None: (prompt, timeout), "answer") == ("answer", 0.1)
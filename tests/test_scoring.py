@@ -0,0 +1,66 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.ml import scoring
+from src.ml.scoring import FEATURE_COLS, ClusterScorer
+
+
+@pytest.fixture
+def artifacts(tmp_path, monkeypatch):
+    """A small KMeans model exported to tmp_path, as training does."""
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+    from src.ml.cluster import export_scoring_artifacts
+
+    monkeypatch.setattr(scoring, "SCORING_PATH", str(tmp_path / "cluster_scoring.npy"))
+    monkeypatch.setattr(scoring, "SCORING_META_PATH", str(tmp_path / "cluster_scoring.json"))
+    rng = np.random.default_rng(0)
+    features = rng.normal(loc=[300000, 150000, 50000, 680, 0.5, 2000, 40, 80000],
+                          scale=[90000, 40000, 30000, 60, 0.1, 500, 10, 20000], size=(300, len(FEATURE_COLS)))
+    scaler = StandardScaler().fit(features)
+    model = KMeans(n_clusters=4, n_init=3, random_state=0).fit(scaler.transform(features))
+    export_scoring_artifacts(model, scaler)
+    return model, scaler, features
+
+
+def _load() -> ClusterScorer:
+    return ClusterScorer.load(scoring.SCORING_PATH, scoring.SCORING_META_PATH)
+
+
+def test_scorer_agrees_with_sklearn(artifacts):
+    model, scaler, features = artifacts
+    scorer = _load()
+    labels, distances = scorer.score_many(features)
+    scaled = scaler.transform(features)
+    assert (labels == model.predict(scaled)).all()
+    assert np.allclose(distances, model.transform(scaled).min(axis=1))
+    assert scorer.score(features[0]) == (int(labels[0]), pytest.approx(float(distances[0])))
+
+
+def test_export_leaves_no_temp_files(artifacts, tmp_path):
+    assert sorted(os.listdir(tmp_path)) == ["cluster_scoring.json", "cluster_scoring.npy"]
+    meta = json.loads((tmp_path / "cluster_scoring.json").read_text())
+    assert meta["features"] == FEATURE_COLS and meta["n_clusters"] == 4
+
+
+def test_missing_or_mismatched_artifacts_disable_scoring(artifacts, tmp_path):
+    meta_path = tmp_path / "cluster_scoring.json"
+    meta = json.loads(meta_path.read_text())
+    meta_path.write_text(json.dumps({**meta, "features": FEATURE_COLS[::-1]}))
+    assert _load() is None
+    meta_path.unlink()
+    assert _load() is None
+
+
+def test_profiles_and_cluster_route_use_the_loaded_scorer(artifacts, client, monkeypatch):
+    monkeypatch.setattr(scoring, "_scorer", None)
+    assert client.get("/user/1/cluster").status_code == 503
+
+    monkeypatch.setattr(scoring, "_scorer", _load())
+    body = client.get("/user/1/cluster").json()
+    assert body["model_version"] == scoring.get_scorer().version
+    assert 0 <= body["cluster_id"] < 4 and body["distance"] >= 0
+    assert client.get("/user/99/cluster").status_code == 404
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_threads_share_one_call():
+    flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow, 21)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", slow, 21))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    while flight.coalesced < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert results == [42] * 5
+    assert calls == [21]
+    assert flight.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_threads_waiting_on_a_failed_call_get_the_same_error():
+    flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("k", failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    while flight.coalesced < 1:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_nothing_is_remembered_after_a_call():
+    flight, calls = SingleFlight(), []
+    flight.do("k", calls.append, 1)
+    flight.do("k", calls.append, 2)
+    assert calls == [1, 2]
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_different_keys_do_not_coalesce():
+    async def run():
+        flight = AsyncSingleFlight()
+
+        async def echo(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        results = await asyncio.gather(flight.do("a", echo, 1), flight.do("b", echo, 2), flight.do("a", echo, 3))
+        return results, flight.stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [1, 2, 1]        # the third call joined the first
+    assert stats == {"calls": 2, "coalesced": 1, "in_flight": 0}
+
+
+def test_async_errors_reach_every_waiter():
+    async def run():
+        flight = AsyncSingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        return await asyncio.gather(*(flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert all(isinstance(e, RuntimeError) for e in errors)
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def run():
+        flight, finished = AsyncSingleFlight(), []
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            finished.append(True)
+            return "advice"
+
+        first = asyncio.ensure_future(flight.do("k", slow))
+        second = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()                 # e.g. the leader's client disconnected
+        result = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return result, finished, flight.stats()
+
+    result, finished, stats = asyncio.run(run())
+    assert result == "advice"
+    assert finished == [True]
+    assert stats["in_flight"] == 0
+
+
+@pytest.fixture
+def fake_backend():
+    from src import llm_service
+    from src.llm_backends import FakeBackend
+    previous = llm_service.get_backend()
+    backend = FakeBackend(latency="fixed:0.2", token_rate=0, response_tokens=12, error_rate=0, hang_rate=0)
+    llm_service.set_backend(backend)
+    yield backend
+    llm_service.set_backend(previous)
+
+
+def test_identical_async_llm_requests_make_one_upstream_call(fake_backend):
+    from src.llm_service import query_llm_async
+
+    async def run():
+        return await asyncio.gather(*(query_llm_async("same prompt") for _ in range(5)), query_llm_async("other"))
+
+    answers = asyncio.run(run())
+    assert len(set(answers[:5])) == 1 and answers[5] != answers[0]
+    assert fake_backend.calls == 2
+
+
+def test_identical_threaded_llm_requests_make_one_upstream_call(fake_backend):
+    from concurrent.futures import ThreadPoolExecutor
+    from src.llm_service import query_llm
+
+    with ThreadPoolExecutor(5) as pool:
+        answers = list(pool.map(query_llm, ["same prompt"] * 5))
+    assert len(set(answers)) == 1
+    assert fake_backend.calls == 1
@@ -0,0 +1,81 @@
+import json
+
+from sqlalchemy import text
+
+from src.llm_backends import FakeBackend, FakeBackendError
+
+
+class BreaksMidStream(FakeBackend):
+    """Fake backend whose stream fails after a few pieces."""
+
+    async def open_stream(self, prompt: str, temperature: float):
+        pieces = await super().open_stream(prompt, temperature)
+
+        async def broken():
+            sent = 0
+            async for piece in pieces:
+                if sent == 3:
+                    raise FakeBackendError("connection reset")
+                sent += 1
+                yield piece
+        return broken()
+
+
+def _events(response) -> list:
+    """[(event, data)] of a text/event-stream body; event is None for plain data messages."""
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event"), json.loads(fields["data"])))
+    return events
+
+
+def test_stream_sends_deltas_then_done(client, llm_backend):
+    llm_backend(response_tokens=20)
+    events = _events(client.post("/recommend/stream", json={"user_id": 1}))
+    deltas = [data["delta"] for event, data in events[:-1]]
+    assert len(deltas) == 20 and all(event is None for event, _ in events[:-1])
+    assert events[-1] == ("done", {"length": len("".join(deltas).strip()), "note": None})
+
+
+def test_broken_stream_ends_with_a_truncated_done_event(users, llm_backend):
+    from fastapi.testclient import TestClient
+    from src import llm_service
+    from src.app import app
+    from src.security import API_PASS, API_USER
+
+    llm_backend()
+    llm_service.set_backend(BreaksMidStream(latency="fixed:0", token_rate=0))
+    with TestClient(app) as client:
+        events = _events(client.post("/analyze/stream", json={"user_id": 1}, auth=(API_USER, API_PASS)))
+    assert len(events) == 4
+    assert events[-1][0] == "done" and events[-1][1]["note"] == "truncated:error"
+
+    # the partial answer is still saved, flagged with the note
+    with users.connect() as conn:
+        row = conn.execute(text("SELECT response, note FROM recommendations")).one()
+    assert row.note == "truncated:error"
+    assert row.response == "".join(data["delta"] for _, data in events[:-1]).strip()
+
+
+def test_stream_that_never_starts_falls_back(client, llm_backend):
+    from src.llm_service import FALLBACK_RESPONSE
+    llm_backend(error_rate=1)
+    events = _events(client.post("/recommend/stream", json={"user_id": 2}))
+    assert events == [
+        (None, {"delta": FALLBACK_RESPONSE}),
+        ("done", {"length": len(FALLBACK_RESPONSE.strip()), "note": "fallback:error"}),
+    ]
+
+
+def test_stream_that_never_starts_reports_an_error_event(client, llm_backend, monkeypatch):
+    from src import app as app_module
+    monkeypatch.setattr(app_module, "LLM_ON_UNAVAILABLE", "fail")
+    llm_backend(error_rate=1)
+    events = _events(client.post("/recommend/stream", json={"user_id": 2}))
+    assert [event for event, _ in events] == ["error"]
+
+
+def test_unknown_user_is_a_404_before_streaming(client):
+    assert client.post("/recommend/stream", json={"user_id": 99}).status_code == 404
@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+import json
+import os
+
+from sqlalchemy import text
+
+from src.write_behind import RecommendationWriter, SpillFile, _encode
+
+DEAD_PID = 2 ** 22 + 12345     # above the default pid_max, so never a live process
+
+
+def _row(user_id: int, response: str = "advice") -> dict:
+    return {
+        "user_id": user_id, "prompt": "prompt", "response": response, "request_type": "analyze",
+        "model": "fake-llm", "note": None, "created_at": datetime.datetime(2026, 1, 1, 12, 0, 0),
+    }
+
+
+def _writer(tmp_path, **options) -> RecommendationWriter:
+    return RecommendationWriter(
+        flush_interval=0.01, spill_path=str(tmp_path / "spill.jsonl"),
+        dead_letter_path=str(tmp_path / "dead.jsonl"), enabled=True, **options,
+    )
+
+
+def _stored(engine) -> list:
+    with engine.connect() as conn:
+        return [tuple(r) for r in conn.execute(text("SELECT user_id, response FROM recommendations ORDER BY rec_id"))]
+
+
+def test_spill_file_reads_from_offset_and_is_removed_once_drained(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.jsonl"), max_bytes=1024)
+    spill.append(["a\n", "b\n", "c\n"])
+    first = spill.read(2)
+    assert first == ["a\n", "b\n"]
+    spill.commit(first)
+    assert spill.pending()
+    assert spill.read(10) == ["c\n"]
+    spill.commit(["c\n"])
+    assert not spill.pending()
+    assert not os.path.exists(spill.path)
+
+
+def test_spill_file_respects_max_bytes(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.jsonl"), max_bytes=4)
+    assert spill.has_room("abc\n")
+    spill.append(["abc\n"])
+    assert not spill.has_room("d\n")
+
+
+def test_spill_files_are_per_process_and_orphans_are_claimed(tmp_path):
+    base = tmp_path / "spill.jsonl"
+    (tmp_path / f"spill.{DEAD_PID}.jsonl").write_text("dead\n")
+    (tmp_path / f"spill.{os.getppid()}.jsonl").write_text("alive\n")    # a running process keeps its file
+    base.write_text("legacy\n")
+
+    spill = SpillFile(str(base), max_bytes=1024)
+    assert spill.path == str(tmp_path / f"spill.{os.getpid()}.jsonl")
+    assert spill.claim_orphans() == 2
+    assert sorted(spill.read(10)) == ["dead\n", "legacy\n"]
+    assert sorted(os.listdir(tmp_path)) == sorted([f"spill.{os.getppid()}.jsonl", os.path.basename(spill.path)])
+
+
+def test_orphans_claimed_by_another_worker_meanwhile_are_skipped(tmp_path, monkeypatch):
+    from src import write_behind
+    for pid in (DEAD_PID, DEAD_PID + 1):
+        (tmp_path / f"spill.{pid}.jsonl").write_text(f"{pid}\n")
+    real_glob = write_behind.glob.glob
+
+    def glob_then_lose_one(pattern):
+        paths = real_glob(pattern)
+        os.rename(tmp_path / f"spill.{DEAD_PID}.jsonl", tmp_path / "taken-by-another-worker")
+        return paths
+
+    monkeypatch.setattr(write_behind.glob, "glob", glob_then_lose_one)
+    spill = SpillFile(str(tmp_path / "spill.jsonl"), max_bytes=1024)
+    assert spill.claim_orphans() == 1
+    assert spill.read(10) == [f"{DEAD_PID + 1}\n"]
+
+
+def test_writer_replays_a_dead_workers_spill_file(tmp_path, database):
+    (tmp_path / f"spill.{DEAD_PID}.jsonl").write_text("".join(_encode(_row(7, f"r{i}")) for i in range(5)))
+
+    async def run():
+        writer = _writer(tmp_path)
+        writer.start()
+        await writer.submit(8, "prompt", "after")
+        await asyncio.sleep(0.2)
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(run())
+    # rows submitted while the claimed file is pending go behind it
+    assert _stored(database) == [(7, f"r{i}") for i in range(5)] + [(8, "after")]
+    assert writer.status()["spill_bytes"] == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_full_queue_spills_and_drains_in_order(tmp_path, database):
+    async def run():
+        writer = _writer(tmp_path, queue_max=2, batch_size=3)
+        writer.start()
+        for i in range(10):
+            await writer.submit(1, "prompt", f"r{i}")
+        spilled = writer.stats["spilled"]
+        await asyncio.sleep(0.3)
+        await writer.stop()
+        return spilled
+
+    assert asyncio.run(run()) > 0
+    assert _stored(database) == [(1, f"r{i}") for i in range(10)]
+
+
+def test_rows_that_cannot_be_written_are_dead_lettered(tmp_path, database):
+    async def run():
+        writer = _writer(tmp_path)
+        writer.start()
+        for user_id in (1, None, 2):     # user_id is NOT NULL: an IntegrityError retrying cannot fix
+            await writer.submit(user_id, "prompt", "advice")
+        await asyncio.sleep(0.2)
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(run())
+    assert _stored(database) == [(1, "advice"), (2, "advice")]
+    assert writer.status()["dead_lettered"] == 1
+    dead = [json.loads(line) for line in (tmp_path / "dead.jsonl").read_text().splitlines()]
+    assert dead[0]["user_id"] is None and "IntegrityError" in dead[0]["error"]